@@ -0,0 +1,69 @@
+"""Compares the HTML parser backends on the Quip document fixtures.
+
+    PYTHONPATH=. python benchmarks/bench_html_parsers.py --repeat 200
+
+Each fixture in benchmarks/fixtures is repeated `--repeat` times to build a
+large document. Backends that cannot parse a fixture (the strict `xml`
+parser on malformed HTML) or are not installed are reported as skipped.
+Runs offline; no access token is needed.
+"""
+
+import argparse
+import os
+import time
+
+from quipclient.parsers import PARSERS, lxml_available
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "fixtures")
+
+
+def load_fixtures(repeat):
+    fixtures = {}
+    for name in sorted(os.listdir(FIXTURES)):
+        if name.endswith(".html"):
+            with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+                fixtures[name[:-5]] = f.read() * repeat
+    return fixtures
+
+
+def timed(func, html, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(html)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200,
+                        help="copies of each fixture per document")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="runs per backend; the fastest is reported")
+    options = parser.parse_args()
+
+    backends = sorted(PARSERS)
+    print("%-12s %10s  %s" % ("fixture", "size", "  ".join(
+        "%12s" % b for b in backends)))
+    for name, html in load_fixtures(options.repeat).items():
+        size = len(html.encode("utf-8"))
+        results = []
+        for backend in backends:
+            if backend == "lxml" and not lxml_available():
+                results.append("not installed")
+                continue
+            try:
+                seconds = timed(PARSERS[backend], html, options.runs)
+            except Exception:
+                results.append("fails")
+                continue
+            results.append("%7.1f MB/s" % (size / seconds / 1e6))
+        print("%-12s %9.1fK  %s" % (name, size / 1024.0, "  ".join(
+            "%12s" % r for r in results)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Compares columnar spreadsheet extraction with the row-dict representation.
+
+    PYTHONPATH=. python benchmarks/bench_spreadsheet_columns.py --rows 50000
+
+Runs offline; no access token is needed.
+"""
+
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+from quipclient import QuipClient
+
+
+def spreadsheet_html(rows, columns=6):
+    header = "".join("<th id='H%d'>Col%d</th>" % (c, c) for c in range(columns))
+    body = []
+    for r in range(rows):
+        cells = "".join(
+            "<td id='R%dC%d' style='background-color:#00FF00;'>%d\u200b</td>"
+            % (r, c, r * c) for c in range(columns))
+        body.append("<tr id='R%d'>%s</tr>" % (r, cells))
+    return ("<table id='TABLE' title='Bench'><thead><tr id='HEAD'>%s</tr>"
+            "</thead><tbody>%s</tbody></table>" % (header, "".join(body)))
+
+
+def row_dicts_to_columns(client, html):
+    spreadsheet = client.parse_spreadsheet_contents(
+        client.get_first_spreadsheet(document_html=html))
+    columns = dict((h, []) for h in spreadsheet["headers"])
+    for row in spreadsheet["rows"]:
+        for header, cell in row["cells"].items():
+            columns[header].append(cell["content"])
+    return columns
+
+
+def columnar(client, html):
+    return client.get_spreadsheet_columns(document_html=html).columns
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+",
+                        default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    client = QuipClient(cache_dir=tempfile.mkdtemp())
+    print("%8s  %-12s %10s %12s" % ("rows", "method", "seconds", "peak MB"))
+    for rows in args.rows:
+        html = spreadsheet_html(rows)
+        for name, func in (("row-dicts", row_dicts_to_columns),
+                           ("columnar", columnar)):
+            elapsed, peak = measure(func, client, html)
+            print("%8d  %-12s %10.3f %12.1f"
+                  % (rows, name, elapsed, peak / 1024.0 / 1024.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""Benchmarks the client's hot paths offline against a fake transport.
+
+    PYTHONPATH=. python benchmarks/run_benchmarks.py
+    PYTHONPATH=. python benchmarks/run_benchmarks.py --full --json out.json
+    PYTHONPATH=. python benchmarks/run_benchmarks.py --only thread_html_v2
+
+Covers `_cached_get` (through `get_threads`), `_fetch_json`, the paginated
+`get_thread_html_v2` assembly, `parse_document_html` and
+`parse_spreadsheet_contents`, with cold and warm caches where a cache is
+involved. Each case reports the best time of `--runs` runs, its throughput,
+the peak memory traced during a separate run, and the number of requests
+the fake transport answered. The default scales finish in seconds; `--full`
+adds 100k entities and 50MB documents.
+
+Documents are built by repeating benchmarks/fixtures/document.html;
+spreadsheets use the generator in bench_spreadsheet_columns.py. No access
+token or network is needed.
+"""
+
+import argparse
+import json
+import shutil
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+from bench_html_parsers import load_fixtures
+from bench_spreadsheet_columns import spreadsheet_html
+from quipclient import QuipClient
+
+SMALL = {
+    "entities": [10, 1000],
+    "document_bytes": [10 * 1024, 1024 * 1024],
+    "rows": [10, 1000],
+}
+FULL = {
+    "entities": [10, 1000, 100000],
+    "document_bytes": [10 * 1024, 1024 * 1024, 50 * 1024 * 1024],
+    "rows": [10, 1000, 100000],
+}
+
+
+class FakeResponse:
+
+    def __init__(self, data):
+        self.code = 200
+        self.headers = {}
+        self._body = json.dumps(data).encode()
+
+    def read(self):
+        return self._body
+
+
+class FakeTransport:
+    """Stands in for `urlopen`, answering user, thread and paginated thread
+    HTML requests with synthetic data and counting them.
+
+    Pages hold 64KB of HTML, like the emulator's, so documents of the
+    default scales are assembled from several pages.
+    """
+
+    def __init__(self, page_bytes=64 * 1024):
+        self.page_bytes = page_bytes
+        self.documents = {}
+        self.requests = 0
+
+    def thread(self, thread_id):
+        return {
+            "thread": {"id": thread_id, "title": "Thread %s" % thread_id,
+                       "type": "document", "updated_usec": 1},
+            "user_ids": ["BENCH_USER"],
+            "shared_folder_ids": [],
+            "html": "<p id='%s-p'>Body of %s</p>" % (thread_id, thread_id),
+        }
+
+    def __call__(self, request, timeout=None):
+        self.requests += 1
+        url = urlparse(request.full_url)
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        parts = url.path.lstrip("/").split("/")
+        if parts[1:] == ["users", "current"]:
+            return FakeResponse({"id": "BENCH_USER", "name": "Bench"})
+        if parts[1:] == ["threads", ""]:
+            return FakeResponse(dict(
+                (i, self.thread(i)) for i in query["ids"].split(",")))
+        if parts[0] == "2" and parts[-1] == "html":
+            html = self.documents[parts[2]]
+            start = int(query.get("cursor", 0))
+            end = start + self.page_bytes
+            return FakeResponse({
+                "html": html[start:end],
+                "response_metadata": {
+                    "next_cursor": str(end) if end < len(html) else ""},
+            })
+        if parts[1] == "threads":
+            return FakeResponse(self.thread(parts[2]))
+        raise ValueError("Unexpected request %s" % request.full_url)
+
+
+class Bench:
+    """Creates clients on temporary cache directories for one case."""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self._clients = []
+
+    def client(self):
+        client = QuipClient(access_token="bench-token",
+                            cache_dir=tempfile.mkdtemp(prefix="quipbench"))
+        self._clients.append(client)
+        return client
+
+    def cleanup(self):
+        for client in self._clients:
+            client._cache.close()
+            shutil.rmtree(client._cache.directory, ignore_errors=True)
+        self._clients = []
+
+
+def document_html(size):
+    """Returns a document of about `size` bytes."""
+    fixture = load_fixtures(1)["document"]
+    return fixture * max(size // len(fixture.encode("utf-8")), 1)
+
+
+def cached_get_cases(scales):
+    for count in scales["entities"]:
+        ids = ["T%07d" % i for i in range(count)]
+
+        def run(client, ids=ids):
+            client.get_threads(ids)
+            return len(ids)
+
+        yield "cached_get", "%d threads" % count, "threads", run
+
+
+def fetch_json_cases(scales):
+    for count in scales["entities"]:
+        ids = ["T%07d" % i for i in range(count)]
+
+        def run(client, ids=ids):
+            for thread_id in ids:
+                client._fetch_json("threads/" + thread_id,
+                                   cache_ttl=client.ONE_DAY)
+            return len(ids)
+
+        yield "fetch_json", "%d calls" % count, "calls", run
+
+
+def thread_html_cases(scales, transport):
+    for size in scales["document_bytes"]:
+        thread_id = "DOC%d" % size
+        transport.documents[thread_id] = document_html(size)
+
+        def run(client, thread_id=thread_id):
+            html = client.get_thread_html_v2(thread_id)["html"]
+            return len(html.encode("utf-8")) / 1e6
+
+        yield "thread_html_v2", _size_label(size), "MB", run
+
+
+def parse_cases(scales):
+    for size in scales["document_bytes"]:
+        html = document_html(size)
+
+        def run(client, html=html):
+            client.parse_document_html(html)
+            return len(html.encode("utf-8")) / 1e6
+
+        yield "parse_document_html", _size_label(size), "MB", run
+
+    for rows in scales["rows"]:
+        html = spreadsheet_html(rows)
+
+        def run(client, html=html, rows=rows):
+            client.parse_spreadsheet_contents(
+                client.get_first_spreadsheet(document_html=html))
+            return rows
+
+        yield "parse_spreadsheet_contents", "%d rows" % rows, "rows", run
+
+
+def _size_label(size):
+    if size >= 1024 * 1024:
+        return "%dMB" % (size // (1024 * 1024))
+    return "%dKB" % (size // 1024)
+
+
+def measure(bench, run, warm, runs, memory):
+    """Returns the best seconds, units, peak bytes and requests of `run`."""
+    best = None
+    for _ in range(runs):
+        client = bench.client()
+        if warm:
+            run(client)
+        bench.transport.requests = 0
+        start = time.perf_counter()
+        units = run(client)
+        elapsed = time.perf_counter() - start
+        requests = bench.transport.requests
+        best = elapsed if best is None else min(best, elapsed)
+        bench.cleanup()
+
+    peak = None
+    if memory:
+        client = bench.client()
+        if warm:
+            run(client)
+        tracemalloc.start()
+        run(client)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        bench.cleanup()
+    return best, units, peak, requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--full", action="store_true",
+                        help="include 100k entities and 50MB documents")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="runs per case; the fastest is reported")
+    parser.add_argument("--only", nargs="+",
+                        help="benchmarks to run, e.g. fetch_json")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the traced run measuring peak memory")
+    parser.add_argument("--json", help="also write the results to this file")
+    options = parser.parse_args()
+
+    scales = FULL if options.full else SMALL
+    transport = FakeTransport()
+    cases = []
+    for case in list(cached_get_cases(scales)) + \
+            list(fetch_json_cases(scales)) + \
+            list(thread_html_cases(scales, transport)):
+        cases += [case + (False,), case + (True,)]
+    cases += [case + (None,) for case in parse_cases(scales)]
+
+    results = []
+    print("%-27s %-13s %-5s %10s %18s %9s %9s" % (
+        "benchmark", "scale", "cache", "seconds", "throughput", "peak MB",
+        "requests"))
+    with patch("quipclient.base.urlopen", transport):
+        bench = Bench(transport)
+        for name, scale, unit, run, warm in cases:
+            if options.only and name not in options.only:
+                continue
+            seconds, units, peak, requests = measure(
+                bench, run, warm, options.runs, not options.no_memory)
+            cache = "-" if warm is None else ("warm" if warm else "cold")
+            result = {
+                "benchmark": name, "scale": scale, "cache": cache,
+                "seconds": seconds, "unit": unit,
+                "throughput": units / seconds if seconds else None,
+                "peak_bytes": peak, "requests": requests,
+            }
+            results.append(result)
+            print("%-27s %-13s %-5s %10.4f %12.1f %-5s %9s %9d" % (
+                name, scale, cache, seconds, result["throughput"] or 0,
+                unit + "/s", "-" if peak is None else
+                "%.1f" % (peak / 1024.0 / 1024.0), requests))
+
+    if options.json:
+        with open(options.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,15 @@
 # quipclient/quip/__init__.py
-from quipclient.base import BaseQuipClient, QuipError
+from quipclient.base import BaseQuipClient, CacheMissError, QuipError
 from quipclient.quip import QuipClient
+from quipclient.documents import DocumentCache, ParsedDocument
+from quipclient.export import WorkspaceExporter
+from quipclient.graph import MembershipIndex
+from quipclient.loader import BatchLoader, EntityLoader
+from quipclient.metrics import RequestMetrics
+from quipclient.mirror import SQLiteMirror
+from quipclient.search import SearchIndex
 
-__all__ = ['BaseQuipClient', 'QuipClient', 'QuipError']
+__all__ = ['BaseQuipClient', 'BatchLoader', 'CacheMissError', 'DocumentCache',
+           'EntityLoader', 'MembershipIndex', 'ParsedDocument', 'QuipClient',
+           'QuipError', 'RequestMetrics', 'SQLiteMirror', 'SearchIndex',
+           'WorkspaceExporter']
@@ -1,15 +1,24 @@
 """Base client implementation for Quip API."""
 
+import collections
+import copy
 import datetime
+import hashlib
 import json
 import logging
 import os
+import queue
+import random
+import re
 import ssl
 import sys
+import threading
 import time
 import zlib
 from diskcache import Cache
 
+from .metrics import RequestMetrics
+
 PY3 = sys.version_info > (3,)
 
 if PY3:
@@ -21,6 +30,7 @@ if PY3:
     urlencode = urllib.parse.urlencode
     urlopen = urllib.request.urlopen
     HTTPError = urllib.error.HTTPError
+    URLError = urllib.error.URLError
 
     iteritems = dict.items
 
@@ -32,10 +42,31 @@ else:
     urlencode = urllib.urlencode
     urlopen = urllib2.urlopen
     HTTPError = urllib2.HTTPError
+    URLError = urllib2.URLError
 
     iteritems = dict.iteritems
 
 
+def _cache_tag(written, expires):
+    """Returns the tag stored with a cache entry: its write time and, if it
+    expires, its expiry time."""
+    if expires is None:
+        return repr(written)
+    return "%r %r" % (written, expires)
+
+
+def _parse_cache_tag(tag):
+    """Returns the `(written, expires)` times of a cache entry's tag.
+
+    Entries written before expiry times were tagged have a bare float tag
+    and were stored with a diskcache expiry instead.
+    """
+    if tag is None or isinstance(tag, (int, float)):
+        return tag, None
+    times = [float(t) for t in tag.split()]
+    return times[0], times[1] if len(times) > 1 else None
+
+
 class QuipError(Exception):
     def __init__(self, code, message, http_error):
         Exception.__init__(self, "%d: %s" % (code, message))
@@ -43,6 +74,46 @@ class QuipError(Exception):
         self.http_error = http_error
 
 
+class CacheMissError(QuipError):
+    """Raised in offline mode for a request that cannot be served from the
+    cache. `keys` lists the missing cache keys."""
+
+    def __init__(self, keys):
+        QuipError.__init__(
+            self, 0, "Not in the cache: %s" % ", ".join(keys), None)
+        self.keys = keys
+
+
+class _InFlightRequest:
+    """A GET request shared by concurrent callers."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+_ACTION_SEGMENT_RE = re.compile(r"^[a-z_-]*$")
+
+
+def endpoint_family(path):
+    """Returns the API path with IDs replaced by "{id}", e.g.
+    "2/threads/{id}/html" for "2/threads/AbC123/html", so requests can be
+    grouped by endpoint."""
+    return "/".join(
+        s if _ACTION_SEGMENT_RE.match(s) or s == "2" else "{id}"
+        for s in path.split("/"))
+
+
+def _is_folder_member(user_id, data):
+    """Access check for shared folder entries: the user must be a direct
+    member of every folder in the entry."""
+    folders = [data] if "folder" in data else data.values()
+    return all(isinstance(f, dict) and user_id in f.get("member_ids", ())
+               for f in folders)
+
+
 class BaseQuipClient:
     """Base class for Quip API clients"""
     
@@ -55,9 +126,31 @@ class BaseQuipClient:
     MAX_USERS_PER_REQUEST = 100
     MAX_FOLDERS_PER_REQUEST = 100  
     MAX_THREADS_PER_REQUEST = 10
+    MAX_MESSAGES_PER_REQUEST = 100
+
+    # Cache partition by path prefix; the longest matching prefix wins and
+    # unmatched paths are "user". "user" entries are only read back for the
+    # user that wrote them, "shared" entries by every client sharing the
+    # cache directory. User profiles stay "user": the caller's own profile
+    # holds its private, desktop and shared folder IDs
+    DEFAULT_CACHE_PARTITIONS = {
+        "folders/": "shared",
+    }
+
+    # Checks a shared entry must pass, as `check(user_id, data)`, before it
+    # is served; entries failing the check are refetched with the caller's
+    # own credentials
+    DEFAULT_CACHE_ACCESS_CHECKS = {
+        "folders/": _is_folder_member,
+    }
+
+    # Instrumentation events; see `add_hook`
+    HOOK_EVENTS = ("before_request", "after_response", "cache_hit",
+                   "cache_miss", "rate_limit_wait", "retry")
 
     def __init__(self, access_token=None, client_id=None, client_secret=None,
-                 base_url=None, request_timeout=None, cache_dir=None):
+                 base_url=None, request_timeout=None, cache_dir=None,
+                 transport=None, offline=False, offline_retention=False):
         """Initialize the base client.
         
         Args:
@@ -67,6 +160,14 @@ class BaseQuipClient:
             base_url: Base URL for API requests
             request_timeout: Request timeout in seconds
             cache_dir: Directory for caching responses
+            transport: Function called as `transport(request, timeout=...)`
+                instead of `urlopen`, e.g. a `RecordingTransport` or
+                `ReplayTransport`
+            offline: Whether to serve every request from the cache; see
+                `set_offline`
+            offline_retention: Whether to keep cached responses past their
+                TTL, until the cache evicts them by size, for offline reads
+                with `ignore_ttl`
         """
         # Rate limit tracking
         self._rate_limit = None  # Requests per minute limit
@@ -82,6 +183,7 @@ class BaseQuipClient:
         self.client_secret = client_secret
         self.base_url = base_url if base_url else "https://platform.quip.com"
         self.request_timeout = request_timeout if request_timeout else 10
+        self.transport = transport
         
         if cache_dir is None:
             cache_dir = os.path.join(os.getcwd(), '.cache')
@@ -91,6 +193,41 @@ class BaseQuipClient:
         self._cache.stats(enable=True)
         self._user_id = None
 
+        # Concurrent identical GETs share a single request
+        self.coalesce_requests = True
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._coalesce_stats = {"requests": 0, "coalesced": 0}
+
+        # Stale-while-revalidate: path prefix -> soft TTL in seconds
+        self.soft_ttls = {}
+        # Fraction by which TTLs are randomly shortened, so entries cached
+        # together do not all expire together
+        self.cache_ttl_jitter = 0.1
+        self._refresh_queue = queue.Queue()
+        self._refresh_pending = set()
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+
+        self.cache_partitions = dict(self.DEFAULT_CACHE_PARTITIONS)
+        # Offline mode; see `set_offline`
+        self.offline = offline
+        self.offline_ignore_ttl = False
+        self.offline_retention = offline_retention
+        self._offline_misses = collections.OrderedDict()
+        self._offline_lock = threading.Lock()
+        self.cache_access_checks = dict(self.DEFAULT_CACHE_ACCESS_CHECKS)
+
+        # Called with every successful API response, and those in
+        # `_cached_response_observers` with cache hits too; see
+        # `add_response_observer`
+        self._response_observers = []
+        self._cached_response_observers = []
+        # Instrumentation hooks by event; see `add_hook`
+        self._hooks = dict((event, []) for event in self.HOOK_EVENTS)
+        # Built-in aggregation of the hooks; see `enable_metrics`
+        self.metrics = None
+
     def get_authorization_url(self, redirect_uri, state=None):
         """Returns the URL the user should be redirected to to sign in."""
         return self._url(
@@ -116,7 +253,7 @@ class BaseQuipClient:
         return self._fetch_json("users/current", cache=cache, cache_ttl=cache_ttl)
 
     def _fetch_json(self, path, post_data=None, cache=True, cache_ttl=None, 
-                   paginate=False, **args):
+                   paginate=False, soft_ttl=None, cache_status=None, **args):
         """Fetches JSON from the API, handling pagination if requested.
         
         Args:
@@ -125,6 +262,12 @@ class BaseQuipClient:
             cache: Whether to use caching
             cache_ttl: Cache TTL in seconds
             paginate: Whether to automatically handle pagination
+            soft_ttl: Age in seconds after which a cached response is
+                still returned but refreshed in the background. Defaults
+                to the matching entry in `soft_ttls`
+            cache_status: Cache outcome reported in the request events when
+                the caller looked up the cache itself, e.g. "miss" for
+                entities `_cached_get` did not find. Defaults to "bypass"
             **args: Additional URL parameters
             
         Returns:
@@ -132,27 +275,122 @@ class BaseQuipClient:
             otherwise returns single page response.
         """
         url = self._url(path, **args)
+        if self.offline:
+            return self._fetch_offline(url, path, post_data)
+        timing = {"started": time.time(), "wait": 0.0,
+                  "cache": cache_status or "bypass"}
 
         # Check if we need to wait for rate limits
-        now = time.time()
+        now = timing["started"]
         if self._rate_limit_reset and now < self._rate_limit_reset and self._rate_limit_remaining == 0:
             sleep_time = self._rate_limit_reset - now
+            self._emit("rate_limit_wait", path, scope="user",
+                       seconds=sleep_time)
             time.sleep(sleep_time)
+            timing["wait"] = sleep_time
         elif (self._company_retry_after and now < self._company_rate_limit_reset and 
               (self._company_rate_limit_remaining == 0 or self._company_rate_limit_remaining is None)):
             sleep_time = self._company_rate_limit_reset - now
+            self._emit("rate_limit_wait", path, scope="company",
+                       seconds=sleep_time)
             time.sleep(sleep_time)
+            timing["wait"] = sleep_time
 
         # Check cache if enabled and this is a GET request
         if cache and not post_data and cache_ttl:
-            cache_key = f"{self._user_id or '_'}:{url}"
-            cached_data = self._cache.get(cache_key)
-            if cached_data:
-                data = json.loads(zlib.decompress(cached_data).decode())
+            cache_key = self._cache_key(url)
+            data, written = self._cache_load_entry(cache_key)
+            if data:
+                stale = self._is_stale(path, cache_key, written, soft_ttl)
+                self._emit("cache_hit", path, stale=stale,
+                           seconds=time.time() - timing["started"])
                 if isinstance(data, dict) and data.get("error"):
                     raise QuipError(data["code"], data["message"], None)
+                self._notify_response(path, args, None, data, cached=True)
+                if stale:
+                    self._schedule_refresh(
+                        cache_key, self._coalesce, (cache_key, paginate),
+                        self._request_json, url, path, None, cache,
+                        cache_ttl, paginate, args, {"cache": "refresh"})
                 return data
+            self._emit("cache_miss", path)
+            timing["cache"] = "miss"
+
+        # Paginated and single-page requests for the same URL differ
+        if not post_data and self.coalesce_requests:
+            return self._coalesce(
+                (self._cache_key(url), paginate), self._request_json, url,
+                path, post_data, cache, cache_ttl, paginate, args, timing)
+        return self._request_json(url, path, post_data, cache, cache_ttl,
+                                  paginate, args, timing)
+
+    def _fetch_offline(self, url, path, post_data):
+        """Serves `_fetch_json` from the cache alone, whatever the request's
+        cache settings. Writes are never served."""
+        cache_key = self._cache_key(url)
+        data = None if post_data else self._cache_load(cache_key)
+        if data is None:
+            self._emit("cache_miss", path)
+            raise self._offline_miss([cache_key])
+        self._emit("cache_hit", path, stale=False, seconds=0.0)
+        if isinstance(data, dict) and data.get("error"):
+            raise QuipError(data["code"], data["message"], None)
+        self._notify_response(path, {}, None, data, cached=True)
+        return data
+
+    def set_offline(self, offline=True, ignore_ttl=False):
+        """Serves every read from the cache alone, without network requests
+        or rate limit usage.
+
+        Reads not in the cache, and all writes, raise `CacheMissError`
+        instead; `offline_report` lists the missing keys. Cache settings
+        passed to individual calls (`cache=False`, `cache_ttl`) are
+        ignored, and background refreshes are not scheduled.
 
+        Args:
+            offline: Whether to enable offline mode
+            ignore_ttl: Whether to also serve entries past their TTL that
+                the cache has not evicted yet. Expired entries are only kept
+                if they were written with `offline_retention` enabled
+        """
+        self.offline = offline
+        self.offline_ignore_ttl = ignore_ttl
+
+    def offline_report(self):
+        """Returns `{"misses": n, "missing_keys": [...]}` for the requests
+        that missed the cache in offline mode, keys in the order first
+        missed."""
+        with self._offline_lock:
+            return {
+                "misses": sum(self._offline_misses.values()),
+                "missing_keys": list(self._offline_misses),
+            }
+
+    def reset_offline_report(self):
+        with self._offline_lock:
+            self._offline_misses.clear()
+
+    def _offline_miss(self, keys):
+        """Records missing cache keys and returns the error to raise."""
+        with self._offline_lock:
+            for key in keys:
+                self._offline_misses[key] = \
+                    self._offline_misses.get(key, 0) + 1
+        return CacheMissError(keys)
+
+    def _request_json(self, url, path, post_data, cache, cache_ttl, paginate,
+                      args, timing=None):
+        """Sends the request for `_fetch_json` and caches the response.
+
+        `timing` holds when `_fetch_json` was called, how long it waited
+        for rate limits and the cache outcome, for the "after_response"
+        event.
+        """
+        timing = timing or {}
+        sent = time.time()
+        method = "POST" if post_data else "GET"
+        self._emit("before_request", path, method=method, url=url,
+                   cache=timing.get("cache", "bypass"))
         request = Request(url=url)
         if post_data:
             post_data = dict((k, v) for k, v in post_data.items()
@@ -167,7 +405,7 @@ class BaseQuipClient:
             request.add_header("Authorization", "Bearer " + self.access_token)
             
         try:
-            response = urlopen(request, timeout=self.request_timeout)
+            response = self._urlopen(request)
             
             # Update rate limit tracking from response headers
             self._rate_limit = int(response.headers.get('X-RateLimit-Limit')) if 'X-RateLimit-Limit' in response.headers else None
@@ -179,17 +417,15 @@ class BaseQuipClient:
             self._company_rate_limit_reset = float(response.headers.get('X-Company-RateLimit-Reset')) if 'X-Company-RateLimit-Reset' in response.headers else None
             self._company_retry_after = int(response.headers.get('X-Company-Retry-After')) if 'X-Company-Retry-After' in response.headers else None
             
-            response_data = response.read().decode()
-            result = json.loads(response_data)
+            raw = response.read()
+            received = time.time()
+            result = json.loads(raw.decode())
+            self._emit_response(path, method, timing, sent, received,
+                                getattr(response, "code", 200), len(raw))
             
             # Cache successful GET responses if caching is enabled
             if cache and not post_data and cache_ttl:
-                cache_key = f"{self._user_id or '_'}:{url}"
-                self._cache.set(
-                    cache_key,
-                    zlib.compress(json.dumps(result).encode()),
-                    cache_ttl
-                )
+                self._cache_store(self._cache_key(url), result, cache_ttl)
             
             # Handle pagination if requested
             if paginate and not post_data:
@@ -208,35 +444,211 @@ class BaseQuipClient:
                     if "response_metadata" not in result:
                         result["response_metadata"] = {}
                     result["response_metadata"]["next_cursor"] = ""
-                        
+
+            self._notify_response(path, args, post_data, result)
             return result
 
         except HTTPError as error:
             try:
                 error_data = error.read().decode()
+                self._emit_response(path, method, timing, sent, time.time(),
+                                    error.code, len(error_data))
                 if error_data:
                     error_json = json.loads(error_data)
                     message = error_json["error_description"]
                 else:
                     message = error.reason
                     
-                if cache and not post_data and cache_ttl:
-                    cache_key = f"{self._user_id or '_'}:{url}"
+                # Errors depend on the caller's access, so they are never
+                # cached in the shared partition
+                if cache and not post_data and cache_ttl and \
+                        self._cache_partition(path) == "user":
                     error_cache = {
                         "error": True,
                         "code": error.code,
                         "message": message
                     }
-                    self._cache.set(
-                        cache_key,
-                        zlib.compress(json.dumps(error_cache).encode()),
-                        cache_ttl
-                    )
+                    self._cache_store(self._cache_key(url), error_cache,
+                                      cache_ttl)
             except Exception:
                 raise error
-            raise QuipError(error.code, message, error)
+            quip_error = QuipError(error.code, message, error)
+            quip_error.path = path
+            raise quip_error
+
+    def close(self):
+        """Closes the response cache. The client must not be used after."""
+        self._cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def add_response_observer(self, observer, cached=False):
+        """Registers `observer(path, args, post_data, response)` to be called
+        with every successful API response, including background refreshes.
+
+        Responses served from the cache are only observed if `cached` is
+        set. Entities served by `_cached_get` are then observed together,
+        as if from one request to the bulk endpoint. Exceptions raised by
+        observers are logged and never fail the request.
+        """
+        self._response_observers.append(observer)
+        if cached:
+            self._cached_response_observers.append(observer)
+
+    def remove_response_observer(self, observer):
+        self._response_observers.remove(observer)
+        if observer in self._cached_response_observers:
+            self._cached_response_observers.remove(observer)
+
+    def _notify_response(self, path, args, post_data, response,
+                         cached=False):
+        observers = self._cached_response_observers if cached \
+            else self._response_observers
+        for observer in observers:
+            try:
+                observer(path, args, post_data, response)
+            except Exception as e:
+                logging.getLogger(__name__).warning(
+                    "Response observer for %s failed: %s", path, e)
+
+    def add_hook(self, event, hook):
+        """Registers `hook(info)` to be called on an instrumentation event.
+
+        Every event's `info` dictionary has `event`, `path` and `endpoint`,
+        the path with IDs replaced by "{id}". The events are:
+
+        - "before_request": `method`, `url` and `cache`, the cache outcome
+          ("miss", "bypass" or "refresh" for background refreshes)
+        - "after_response": `method`, `status`, `bytes`, `cache`, the
+          `queue`, `wait`, `network` and `decode` times and their `total`
+          in seconds, and `rate_limit_remaining` and
+          `company_rate_limit_remaining` from the response headers. Sent
+          for error responses too
+        - "cache_hit": `stale` and `seconds`
+        - "cache_miss"
+        - "rate_limit_wait": `scope` ("user" or "company") and `seconds`
+        - "retry": `attempt`, `code` and `delay`, sent before a failed
+          request is retried
+
+        `queue` is the time between the call and sending the request less
+        the rate limit `wait`; `network` runs until the response body is
+        read. Exceptions raised by hooks are logged and never fail the
+        request.
+        """
+        if event not in self._hooks:
+            raise ValueError("Unknown event %r, expected one of %s" % (
+                event, ", ".join(self.HOOK_EVENTS)))
+        self._hooks[event].append(hook)
+
+    def remove_hook(self, event, hook):
+        self._hooks[event].remove(hook)
+
+    def enable_metrics(self, **kwargs):
+        """Aggregates the client's instrumentation events into per-endpoint
+        latency histograms and counters.
 
-    def _cached_get(self, endpoint, ids, cache_ttl=THIRTY_DAYS, batch_size=100, cache=True):
+            metrics = client.enable_metrics()
+            client.get_thread(thread_id)
+            metrics.summary()["threads/{id}"]["p95"]
+            metrics.to_prometheus()
+
+        Args:
+            **kwargs: Arguments for `RequestMetrics`
+
+        Returns:
+            The `RequestMetrics`
+        """
+        if self.metrics is None:
+            self.metrics = RequestMetrics(self, **kwargs)
+        return self.metrics
+
+    def _emit(self, event, path, **info):
+        hooks = self._hooks[event]
+        if not hooks:
+            return
+        info["event"] = event
+        info["path"] = path
+        info["endpoint"] = endpoint_family(path)
+        for hook in list(hooks):
+            try:
+                hook(info)
+            except Exception as e:
+                logging.getLogger(__name__).warning(
+                    "%s hook for %s failed: %s", event, path, e)
+
+    def _emit_response(self, path, method, timing, sent, received, status,
+                       size):
+        if not self._hooks["after_response"]:
+            return
+        now = time.time()
+        started = timing.get("started", sent)
+        wait = timing.get("wait", 0.0)
+        self._emit("after_response", path, method=method, status=status,
+                   bytes=size, cache=timing.get("cache", "bypass"),
+                   queue=max(sent - started - wait, 0.0), wait=wait,
+                   network=received - sent, decode=now - received,
+                   total=now - started,
+                   rate_limit_remaining=self._rate_limit_remaining,
+                   company_rate_limit_remaining=(
+                       self._company_rate_limit_remaining))
+
+    def _coalesce(self, key, func, *args):
+        """Runs `func(*args)` once for all concurrent callers with the same
+        key.
+
+        The first caller (the leader) sends the request; callers arriving
+        while it is in flight wait for it and receive a copy of its result
+        or its exception, so identical GETs share one network request and
+        one cache write.
+        """
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            if flight is None:
+                flight = _InFlightRequest()
+                self._inflight[key] = flight
+                self._coalesce_stats["requests"] += 1
+                leader = True
+            else:
+                flight.waiters += 1
+                self._coalesce_stats["coalesced"] += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+
+        result = None
+        try:
+            result = func(*args)
+            return result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+                waiters = flight.waiters
+            # The leader's caller owns `result`, so waiters get a snapshot
+            # taken before it can be mutated.
+            if waiters and flight.error is None:
+                flight.result = copy.deepcopy(result)
+            flight.done.set()
+
+    def get_coalescing_stats(self):
+        """Returns counts of GET requests sent and of identical concurrent
+        requests that were coalesced into them instead of being sent."""
+        with self._inflight_lock:
+            return dict(self._coalesce_stats)
+
+    def _cached_get(self, endpoint, ids, cache_ttl=THIRTY_DAYS, batch_size=100, cache=True,
+                    soft_ttl=None):
         """Helper method to handle cached bulk entity fetching.
         
         Args:
@@ -245,53 +657,227 @@ class BaseQuipClient:
             cache_ttl: Cache TTL in seconds
             batch_size: Number of items to fetch per request
             cache: Whether to use caching (default True)
+            soft_ttl: Age in seconds after which cached entities are still
+                returned but refreshed in the background
             
         Returns:
             Dictionary of entity data keyed by ID
         """
+        started = time.time()
         result = {}
+        cached = {}
         uncached_ids = []
+        stale_ids = []
         
         # Check cache for each ID if caching is enabled
-        if cache:
+        if cache or self.offline:
             for entity_id in ids:
-                cache_key = f"{self._user_id or '_'}:{endpoint}/{entity_id}"
-                cached_data = self._cache.get(cache_key)
-                if cached_data:
-                    try:
-                        entity_data = json.loads(zlib.decompress(cached_data).decode())
-                        result.update(entity_data)
-                    except:
-                        uncached_ids.append(entity_id)
+                path = f"{endpoint}/{entity_id}"
+                cache_key = self._cache_key(path)
+                try:
+                    entity_data, written = self._cache_load_entry(cache_key)
+                except:
+                    entity_data = None
+                if entity_data:
+                    cached.update(entity_data)
+                    stale = self._is_stale(path, cache_key, written, soft_ttl)
+                    if stale:
+                        stale_ids.append(entity_id)
+                    self._emit("cache_hit", path, stale=stale,
+                               seconds=time.time() - started)
                 else:
                     uncached_ids.append(entity_id)
+                    self._emit("cache_miss", path)
         else:
             uncached_ids = ids
+        result.update(cached)
+        if cached and self._cached_response_observers:
+            self._notify_response(f"{endpoint}/", {"ids": ",".join(cached)},
+                                  None, cached, cached=True)
         
+        if stale_ids:
+            self._schedule_refresh(
+                self._cache_key(f"{endpoint}/?ids={','.join(stale_ids)}"),
+                self._fetch_entities, endpoint, stale_ids, cache_ttl,
+                batch_size, True, "refresh")
+
+        if uncached_ids and self.offline:
+            raise self._offline_miss([
+                self._cache_key(f"{endpoint}/{i}") for i in uncached_ids])
+
         # Only make API calls if we have uncached IDs
         if uncached_ids:
-            new_data = {}
-            # Process uncached IDs in batches
-            for i in range(0, len(uncached_ids), batch_size):
-                batch = uncached_ids[i:i + batch_size]
-                batch_data = self._fetch_json(f"{endpoint}/", ids=",".join(batch))
-                new_data.update(batch_data)
-            
-            # Cache individual responses if caching is enabled
-            if cache:
-                for entity_id, entity_data in new_data.items():
-                    cache_key = f"{self._user_id or '_'}:{endpoint}/{entity_id}"
-                    entity_cache = {entity_id: entity_data}
-                    self._cache.set(
-                        cache_key,
-                        zlib.compress(json.dumps(entity_cache).encode()),
-                        cache_ttl
-                    )
-            
-            result.update(new_data)
+            result.update(self._fetch_entities(
+                endpoint, uncached_ids, cache_ttl, batch_size, cache,
+                "miss" if cache else "bypass"))
             
         return result
 
+    def _fetch_entities(self, endpoint, ids, cache_ttl, batch_size, cache,
+                        cache_status="bypass"):
+        """Fetches entities in batches for `_cached_get`, caching each one
+        individually if caching is enabled. `cache_status` is the cache
+        outcome reported in the request events."""
+        new_data = {}
+        # Process IDs in batches
+        for i in range(0, len(ids), batch_size):
+            batch = ids[i:i + batch_size]
+            batch_data = self._fetch_json(f"{endpoint}/", ids=",".join(batch),
+                                          cache_status=cache_status)
+            new_data.update(batch_data)
+        
+        # Cache individual responses if caching is enabled
+        if cache:
+            for entity_id, entity_data in new_data.items():
+                self._cache_store(
+                    self._cache_key(f"{endpoint}/{entity_id}"),
+                    {entity_id: entity_data}, cache_ttl)
+        return new_data
+
+    def _cache_path(self, url):
+        """Returns the API path (e.g. "threads/ID" or "2/threads/ID") for a
+        URL or entity path."""
+        for prefix, version in ((self.base_url + "/1/", ""),
+                                (self.base_url + "/2/", "2/")):
+            if url.startswith(prefix):
+                return version + url[len(prefix):]
+        return url
+
+    def _match_prefix(self, rules, path):
+        prefixes = [p for p in rules if path.startswith(p)]
+        return rules[max(prefixes, key=len)] if prefixes else None
+
+    def _cache_partition(self, path):
+        """Returns "user" or "shared" for the given API path."""
+        return self._match_prefix(self.cache_partitions, path) or "user"
+
+    def _cache_key(self, url):
+        """Returns the cache key for the given URL or entity path.
+
+        Shared entries are keyed "*:<url>". User entries are prefixed with
+        the user ID or, until it is known, a hash of the access token, so
+        entries written during construction are still found later.
+        """
+        if self._cache_partition(self._cache_path(url)) == "shared":
+            return f"*:{url}"
+        if self._user_id:
+            return f"{self._user_id}:{url}"
+        if self.access_token:
+            token_hash = hashlib.sha256(
+                self.access_token.encode()).hexdigest()[:16]
+            return f"~{token_hash}:{url}"
+        return f"_:{url}"
+
+    def _cache_load(self, cache_key):
+        """Returns the decompressed JSON stored under `cache_key`, or None."""
+        return self._cache_load_entry(cache_key)[0]
+
+    def _cache_load_entry(self, cache_key):
+        """Like `_cache_load`, but returns a `(data, written)` tuple where
+        `written` is the time the entry was stored, if known.
+
+        Entries past their TTL are treated as missing, unless offline with
+        `ignore_ttl`. Shared entries failing their access check are treated
+        as missing.
+        """
+        cached_data, tag = self._cache.get(cache_key, tag=True)
+        if not cached_data:
+            return None, None
+        written, expires = _parse_cache_tag(tag)
+        if expires is not None and time.time() >= expires and \
+                not (self.offline and self.offline_ignore_ttl):
+            return None, None
+        data = json.loads(zlib.decompress(cached_data).decode())
+        if cache_key.startswith("*:") and isinstance(data, dict):
+            check = self._match_prefix(
+                self.cache_access_checks,
+                self._cache_path(cache_key[len("*:"):]))
+            if check is not None and not check(self._user_id, data):
+                return None, None
+        return data, written
+
+    def _cache_store(self, cache_key, data, cache_ttl):
+        """Stores `data` as compressed JSON. A `cache_ttl` of None never
+        expires; other TTLs are shortened by up to `cache_ttl_jitter`.
+
+        The tag holds the write time and the expiry time. With
+        `offline_retention`, entries are stored without a diskcache expiry,
+        so that expired entries stay readable offline until the cache
+        evicts them; otherwise diskcache culls them once expired.
+        """
+        if cache_ttl and self.cache_ttl_jitter:
+            cache_ttl *= 1 - random.uniform(0, self.cache_ttl_jitter)
+        written = time.time()
+        self._cache.set(
+            cache_key,
+            zlib.compress(json.dumps(data).encode()),
+            expire=None if self.offline_retention else cache_ttl or None,
+            tag=_cache_tag(written, written + cache_ttl if cache_ttl
+                           else None)
+        )
+
+    def set_soft_ttl(self, path_prefix, soft_ttl):
+        """Serves cached responses for paths starting with `path_prefix`
+        (e.g. "threads/" or "2/threads/") without blocking once they are
+        older than `soft_ttl` seconds, refreshing them in the background.
+        A `soft_ttl` of None removes the rule."""
+        if soft_ttl is None:
+            self.soft_ttls.pop(path_prefix, None)
+        else:
+            self.soft_ttls[path_prefix] = soft_ttl
+
+    def _is_stale(self, path, cache_key, written, soft_ttl=None):
+        """Returns whether a cached entry is past its soft TTL.
+
+        The soft TTL is shortened by a stable per-key fraction of
+        `cache_ttl_jitter`, spreading out refreshes of entries that were
+        cached at the same time.
+        """
+        if soft_ttl is None:
+            prefixes = [p for p in self.soft_ttls if path.startswith(p)]
+            if not prefixes:
+                return False
+            soft_ttl = self.soft_ttls[max(prefixes, key=len)]
+        if written is None:
+            return True
+        spread = (zlib.crc32(cache_key.encode()) % 1000) / 1000.0
+        soft_ttl *= 1 - self.cache_ttl_jitter * spread
+        return time.time() - written >= soft_ttl
+
+    def _schedule_refresh(self, key, func, *args):
+        """Queues `func(*args)` on the background refresh worker unless a
+        refresh for `key` is already pending, or offline."""
+        if self.offline:
+            return
+        with self._refresh_lock:
+            if key in self._refresh_pending:
+                return
+            self._refresh_pending.add(key)
+            if self._refresh_thread is None or \
+                    not self._refresh_thread.is_alive():
+                self._refresh_thread = threading.Thread(
+                    target=self._refresh_worker, name="quip-cache-refresh",
+                    daemon=True)
+                self._refresh_thread.start()
+        self._refresh_queue.put((key, func, args))
+
+    def _refresh_worker(self):
+        while True:
+            key, func, args = self._refresh_queue.get()
+            try:
+                func(*args)
+            except Exception as e:
+                logging.getLogger(__name__).warning(
+                    "Background refresh of %s failed: %s", key, e)
+            finally:
+                with self._refresh_lock:
+                    self._refresh_pending.discard(key)
+                self._refresh_queue.task_done()
+
+    def wait_for_refreshes(self):
+        """Blocks until all queued background refreshes have finished."""
+        self._refresh_queue.join()
+
     def _clean(self, **args):
         """Clean and encode parameters for API requests."""
         return dict((k, str(v) if isinstance(v, int) else v.encode("utf-8"))
@@ -315,8 +901,11 @@ class BaseQuipClient:
         return url
 
     def _urlopen(self, request):
-        """Internal method to fetch data using the configured urlopen"""
-        return urlopen(request, timeout=self.request_timeout)
+        """Internal method to fetch data using the configured transport"""
+        if self.offline:
+            raise self._offline_miss([request.get_full_url()])
+        return (self.transport or urlopen)(
+            request, timeout=self.request_timeout)
 
     def get_blob(self, thread_id, blob_id):
         """Returns a file-like object with the contents of the given blob from
@@ -337,10 +926,12 @@ class BaseQuipClient:
                 error_json = json.loads(error_data)
                 message = error_json["error_description"]
                 
-                # Cache 403 errors if caching is enabled
+                # Cache 403 errors if caching is enabled, never in the
+                # shared partition
                 request_url = request.get_full_url()
-                if self._cache and error.code == 403:
-                    cache_key = f"{self._user_id or '_'}:{request_url}"
+                cache_key = self._cache_key(request_url)
+                if self._cache and error.code == 403 and \
+                        not cache_key.startswith("*:"):
                     self._cache.set(
                         cache_key,
                         zlib.compress(error_data.encode()),
@@ -356,6 +947,8 @@ class BaseQuipClient:
 
         blob can be any file-like object. Requires the 'requests' module.
         """
+        if self.offline:
+            raise self._offline_miss([self._url("blob/" + thread_id)])
         import requests
         url = "blob/" + thread_id
         headers = None
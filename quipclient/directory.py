@@ -0,0 +1,180 @@
+"""In-memory user directory with prefix and trigram search."""
+
+import bisect
+import collections
+import copy
+import re
+import threading
+import time
+
+from .base import BaseQuipClient
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _trigrams(text):
+    text = " %s " % text
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+class UserDirectory:
+    """Users and contacts indexed by ID, name and email.
+
+    Names and emails are indexed as a sorted token list for prefix lookups
+    and as trigrams for fuzzy matches, so autocomplete queries never hit the
+    API. Users come from `load` (contacts plus `get_users` batches) and from
+    every user response the client sees; `refresh` refetches only entries
+    older than `refresh_interval`.
+    """
+
+    def __init__(self, client, cache_ttl=BaseQuipClient.THIRTY_DAYS,
+                 refresh_interval=BaseQuipClient.ONE_HOUR):
+        """Initialize the directory.
+
+        Args:
+            client: `QuipClient` used to fetch users
+            cache_ttl: Cache TTL for users fetched by the directory
+            refresh_interval: Age in seconds after which `refresh`
+                refetches a user
+        """
+        self.client = client
+        self.cache_ttl = cache_ttl
+        self.refresh_interval = refresh_interval
+        self._users = {}
+        self._loaded_at = {}
+        self._keys = {}
+        self._tokens = []
+        self._trigrams = collections.defaultdict(set)
+        self._lock = threading.RLock()
+
+    def _index_keys(self, user):
+        name = (user.get("name") or "").lower()
+        tokens = set(_WORD_RE.findall(name))
+        if name:
+            tokens.add(name)
+        texts = [name]
+        for email in user.get("emails") or []:
+            email = email.lower()
+            tokens.add(email)
+            texts.append(email)
+        trigrams = set()
+        for text in texts:
+            if text:
+                trigrams.update(_trigrams(text))
+        return sorted(tokens), trigrams
+
+    def add(self, users):
+        """Adds or updates the given user objects."""
+        now = time.time()
+        with self._lock:
+            for user in users:
+                if not isinstance(user, dict) or "id" not in user:
+                    continue
+                user_id = user["id"]
+                self._unindex(user_id)
+                tokens, trigrams = self._index_keys(user)
+                for token in tokens:
+                    bisect.insort(self._tokens, (token, user_id))
+                for trigram in trigrams:
+                    self._trigrams[trigram].add(user_id)
+                self._keys[user_id] = (tokens, trigrams)
+                self._users[user_id] = copy.deepcopy(user)
+                self._loaded_at[user_id] = now
+
+    def _unindex(self, user_id):
+        keys = self._keys.pop(user_id, None)
+        if keys is None:
+            return
+        tokens, trigrams = keys
+        for token in tokens:
+            i = bisect.bisect_left(self._tokens, (token, user_id))
+            if i < len(self._tokens) and self._tokens[i] == (token, user_id):
+                del self._tokens[i]
+        for trigram in trigrams:
+            ids = self._trigrams.get(trigram)
+            if ids is not None:
+                ids.discard(user_id)
+                if not ids:
+                    del self._trigrams[trigram]
+
+    def load(self, user_ids=()):
+        """Loads the current user's contacts and the given users, fetching
+        users not already in the directory through `get_users` batches."""
+        self.add(self.client.get_contacts())
+        with self._lock:
+            missing = [i for i in user_ids if i not in self._users]
+        if missing:
+            self.add(self.client.get_users(
+                missing, cache_ttl=self.cache_ttl).values())
+
+    def refresh(self):
+        """Refetches the contacts and every user older than
+        `refresh_interval`, bypassing the cache.
+
+        Returns:
+            The number of users refetched
+        """
+        self.add(self.client.get_contacts(cache=False))
+        cutoff = time.time() - self.refresh_interval
+        with self._lock:
+            stale = [i for i, loaded in self._loaded_at.items()
+                     if loaded < cutoff]
+        if stale:
+            self.add(self.client._fetch_entities(
+                "users", stale, self.cache_ttl,
+                self.client.MAX_USERS_PER_REQUEST, True, "refresh").values())
+        return len(stale)
+
+    def get(self, user_id, max_age=None):
+        """Returns a copy of the user, or None if unknown or older than
+        `max_age` seconds."""
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                return None
+            if max_age is not None and \
+                    time.time() - self._loaded_at[user_id] > max_age:
+                return None
+            return copy.deepcopy(user)
+
+    def search(self, query, count=10):
+        """Returns up to `count` users matching `query`.
+
+        Users with a name word, full name or email starting with every
+        word of the query come first, then fuzzy matches sharing most of
+        the query's trigrams.
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+        with self._lock:
+            matches = None
+            for word in set(_WORD_RE.findall(query)) or [query]:
+                ids = set()
+                i = bisect.bisect_left(self._tokens, (word,))
+                while i < len(self._tokens) and \
+                        self._tokens[i][0].startswith(word):
+                    ids.add(self._tokens[i][1])
+                    i += 1
+                matches = ids if matches is None else matches & ids
+            ranked = sorted(matches, key=lambda i: (
+                (self._users[i].get("name") or "").lower(), i))
+
+            if len(ranked) < count and len(query) >= 3:
+                wanted = _trigrams(query)
+                scores = collections.Counter()
+                for trigram in wanted:
+                    for user_id in self._trigrams.get(trigram, ()):
+                        if user_id not in matches:
+                            scores[user_id] += 1
+                threshold = len(wanted) / 2.0
+                ranked.extend(user_id for user_id, score in sorted(
+                    scores.items(), key=lambda s: (-s[1], s[0]))
+                    if score >= threshold)
+            return [copy.deepcopy(self._users[i]) for i in ranked[:count]]
+
+    def __contains__(self, user_id):
+        return user_id in self._users
+
+    def __len__(self):
+        return len(self._users)
@@ -0,0 +1,218 @@
+"""In-memory cache of parsed Quip documents and document helpers."""
+
+import collections
+import html
+import re
+import threading
+
+from .parsers import VOID_TAGS
+
+_TAG_RE = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9]*)\b[^>]*?(/?)>")
+_MARKUP_RE = re.compile(r"<[^>]*>")
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def iter_sections(content, format="html"):
+    """Yields the top-level sections of the given content in order.
+
+    HTML is split between top-level elements, without parsing, and
+    markdown between blank-line separated blocks outside code fences.
+    Joining the sections gives back the content.
+    """
+    if format == "markdown":
+        block = []
+        fenced = False
+        for line in content.splitlines(True):
+            block.append(line)
+            if line.lstrip().startswith("```"):
+                fenced = not fenced
+            elif not fenced and not line.strip() and len(block) > 1:
+                yield "".join(block)
+                block = []
+        if block:
+            yield "".join(block)
+        return
+
+    depth = 0
+    start = 0
+    for match in _TAG_RE.finditer(content):
+        closing, tag, self_closing = match.groups()
+        if closing:
+            depth = max(depth - 1, 0)
+        elif not self_closing and tag.lower() not in VOID_TAGS:
+            depth += 1
+            continue
+        if depth == 0:
+            yield content[start:match.end()]
+            start = match.end()
+    if start < len(content):
+        yield content[start:]
+
+
+def chunk_sections(content, max_bytes, format="html"):
+    """Yields pieces of `content` of at most `max_bytes` UTF-8 bytes, split on
+    section boundaries. A single section larger than `max_bytes` is yielded
+    on its own."""
+    chunk = []
+    size = 0
+    for section in iter_sections(content, format):
+        section_size = len(section.encode("utf-8"))
+        if chunk and size + section_size > max_bytes:
+            yield "".join(chunk)
+            chunk, size = [], 0
+        chunk.append(section)
+        size += section_size
+    if chunk:
+        yield "".join(chunk)
+
+
+def content_words(content, format="html"):
+    """Returns the list of words in the given content, ignoring markup, so
+    content can be compared with the HTML Quip stores it as."""
+    if format != "markdown":
+        content = html.unescape(_MARKUP_RE.sub(" ", content))
+    return _WORD_RE.findall(content)
+
+
+class DocumentCache:
+    """LRU cache of parsed documents keyed by thread ID and `updated_usec`.
+
+    Entries are weighted by the size of the HTML they were parsed from and
+    the least recently used documents are evicted once the total exceeds
+    `max_bytes`. A new `updated_usec` is a new key, so edited documents are
+    reparsed while the stale tree ages out.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """Initialize the cache.
+
+        Args:
+            max_bytes: Maximum total HTML size of the cached documents
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, thread_id, updated_usec):
+        """Returns the cached document, or None."""
+        key = (thread_id, updated_usec)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, thread_id, updated_usec, document, size):
+        """Caches a document, evicting least recently used ones as needed.
+
+        Documents larger than `max_bytes` are not cached.
+        """
+        if size > self.max_bytes:
+            return
+        key = (thread_id, updated_usec)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (document, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def invalidate(self, thread_id):
+        """Drops every cached version of the given thread."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == thread_id]:
+                self._size -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    @property
+    def size(self):
+        """Total HTML size of the cached documents."""
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ParsedDocument:
+    """A parsed document plus lookup indexes built in a single pass.
+
+    Attributes:
+        tree: Root `Element` of the document
+        size: Size of the HTML the document was parsed from
+        sections: Section ID to element
+        parents: Section ID to parent element
+        positions: Section ID to its ordinal position in document order
+        section_ids: Section IDs in document order
+        titles: `title` attribute to the first element carrying it
+        annotations: Annotation ID to the ID of its enclosing section
+    """
+
+    def __init__(self, tree, size=0):
+        self.tree = tree
+        self.size = size
+        self.sections = {}
+        self.parents = {}
+        self.positions = {}
+        self.section_ids = []
+        self.titles = {}
+        self.annotations = {}
+        self._by_tag = {}
+        self._build_index()
+
+    def _build_index(self):
+        stack = [(child, self.tree, None) for child in reversed(self.tree)]
+        while stack:
+            element, parent, section_id = stack.pop()
+            element_id = element.attrib.get("id")
+            if element_id:
+                if element.tag == "annotation":
+                    self.annotations.setdefault(element_id, section_id)
+                elif element_id not in self.sections:
+                    self.sections[element_id] = element
+                    self.parents[element_id] = parent
+                    self.positions[element_id] = len(self.section_ids)
+                    self.section_ids.append(element_id)
+                    section_id = element_id
+                else:
+                    section_id = element_id
+            title = element.attrib.get("title")
+            if title is not None:
+                self.titles.setdefault(title, element)
+            for child in reversed(element):
+                stack.append((child, element, section_id))
+
+    def get_section(self, section_id):
+        """Returns the element with the given ID, or None."""
+        return self.sections.get(section_id)
+
+    def get_parent(self, section_id):
+        """Returns the parent element of the given section, or None."""
+        return self.parents.get(section_id)
+
+    def get_position(self, section_id):
+        """Returns the ordinal position of the given section, or None."""
+        return self.positions.get(section_id)
+
+    def get_annotation_section(self, annotation_id):
+        """Returns the ID of the section enclosing the given annotation."""
+        return self.annotations.get(annotation_id)
+
+    def get_elements(self, tag):
+        """Returns every element with the given tag, in document order."""
+        elements = self._by_tag.get(tag)
+        if elements is None:
+            elements = self._by_tag[tag] = list(self.tree.iter(tag))
+        return elements
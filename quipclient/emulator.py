@@ -0,0 +1,916 @@
+"""Local emulator of the Quip Automation API for load and rate-limit testing.
+
+    emulator = QuipEmulator(latency=lognormal_latency(0.05), rate_limit=50)
+    emulator.populate(threads=1000, token="emulator-token")
+    with emulator:
+        client = QuipClient(access_token="emulator-token",
+                            base_url=emulator.base_url)
+        client.get_threads(emulator.thread_ids())
+
+Or from the command line:
+
+    python -m quipclient.emulator --port 8080 --threads 1000 --latency 0.05
+"""
+
+import argparse
+import collections
+import email.parser
+import email.policy
+import json
+import math
+import random
+import re
+import string
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .base import endpoint_family
+
+# Edit operations, as in `QuipClient`
+APPEND, PREPEND, AFTER_SECTION, BEFORE_SECTION, REPLACE_SECTION, \
+    DELETE_SECTION = range(6)
+
+_SECTION_TAG_RE = re.compile(
+    r"<(p|h1|h2|h3|ul|ol|li|pre|blockquote|div|table|tr|td|th)"
+    r"(?=[\s>/])(?![^>]*\sid=)")
+
+
+def fixed_latency(seconds):
+    """Returns a latency distribution always returning `seconds`."""
+    return lambda rng: seconds
+
+
+def uniform_latency(low, high):
+    """Returns a latency distribution uniform between `low` and `high`."""
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal_latency(median, sigma=0.5):
+    """Returns a log-normal latency distribution, the usual shape of API
+    latencies, with the given median in seconds."""
+    mu = math.log(median)
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+
+class EmulatorError(Exception):
+    """An error response, sent as `{"error_description": message}`."""
+
+    def __init__(self, code, message):
+        Exception.__init__(self, "%d: %s" % (code, message))
+        self.code = code
+        self.message = message
+
+
+class QuipEmulator:
+    """In-memory Quip API served over HTTP.
+
+    Implements the v1 and v2 endpoints `QuipClient` calls: users, contacts,
+    folders, threads (including v2 HTML pagination with cursors and thread
+    folders), messages, blobs and the document, folder and membership
+    mutations. Every user can read everything; access control is not
+    emulated. `websockets/new` answers with an unreachable URL, since the
+    websocket itself is not served.
+
+    Responses are delayed by a latency distribution and carry
+    `X-RateLimit-*` and `X-Company-RateLimit-*` headers. Requests over the
+    per-user or per-company limit in a window get a 503, like the real
+    API. Failures can be injected randomly with `failure_rate` or for
+    matching paths with `inject_failure`. `requests` and `responses` count
+    requests by endpoint family and responses by status.
+    """
+
+    def __init__(self, latency=None, rate_limit=None, company_rate_limit=None,
+                 rate_limit_window=60, failure_rate=0.0, failure_status=503,
+                 page_bytes=64 * 1024, seed=None):
+        """Initialize the emulator.
+
+        Args:
+            latency: Seconds to delay each response, or a distribution
+                called with a `random.Random`, e.g. `lognormal_latency(0.05)`
+            rate_limit: Requests per user per window, or None for no limit
+            company_rate_limit: Requests per window across all users, or
+                None for no limit
+            rate_limit_window: Rate limit window in seconds
+            failure_rate: Fraction of requests randomly failed with
+                `failure_status`
+            failure_status: Status of random failures
+            page_bytes: HTML bytes per page of `2/threads/<id>/html`
+            seed: Seed for IDs, latencies and random failures
+        """
+        if latency is None or isinstance(latency, (int, float)):
+            latency = fixed_latency(latency or 0.0)
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.company_rate_limit = company_rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.page_bytes = page_bytes
+        self.requests = collections.Counter()
+        self.responses = collections.Counter()
+
+        self._rng = random.Random(seed)
+        self._lock = threading.RLock()
+        self._tokens = {}
+        self._users = {}
+        self._folders = {}
+        self._threads = {}
+        self._messages = collections.defaultdict(list)
+        self._blobs = {}
+        self._windows = {}
+        self._failures = []
+        self._server = None
+        self._thread = None
+        self._clock = 0
+
+    # Data
+
+    def _new_id(self):
+        return "".join(self._rng.choice(string.ascii_letters + string.digits)
+                       for _ in range(11))
+
+    def _now_usec(self):
+        # Strictly increasing, so updates are always newer
+        self._clock = max(self._clock + 1, int(time.time() * 1e6))
+        return self._clock
+
+    def add_user(self, name, email=None, token=None):
+        """Adds a user with private, desktop, archive and starred folders.
+
+        Args:
+            name: User name
+            email: Email address; defaults to one derived from the name
+            token: Access token authenticating as the user
+
+        Returns:
+            The user ID
+        """
+        with self._lock:
+            user_id = self._new_id()
+            now = self._now_usec()
+            user = {
+                "id": user_id,
+                "name": name,
+                "emails": [email or "%s@example.com" % re.sub(
+                    r"\W+", ".", name.lower())],
+                "is_robot": False,
+                "affinity": 0.0,
+                "created_usec": now,
+                "shared_folder_ids": [],
+                "group_folder_ids": [],
+            }
+            self._users[user_id] = user
+            for key in ("private_folder_id", "desktop_folder_id",
+                        "archive_folder_id", "starred_folder_id"):
+                user[key] = self._add_folder(
+                    key.split("_")[0].title(), [user_id], None, user_id,
+                    "private")
+            if token:
+                self._tokens[token] = user_id
+            return user_id
+
+    def add_folder(self, title, member_ids=(), parent_id=None,
+                   creator_id=None):
+        """Adds a shared folder and returns its ID."""
+        with self._lock:
+            return self._add_folder(title, list(member_ids), parent_id,
+                                    creator_id, "shared")
+
+    def _add_folder(self, title, member_ids, parent_id, creator_id,
+                    folder_type):
+        folder_id = self._new_id()
+        now = self._now_usec()
+        self._folders[folder_id] = {
+            "folder": {
+                "id": folder_id,
+                "title": title,
+                "color": "manila",
+                "folder_type": folder_type,
+                "creator_id": creator_id,
+                "parent_id": parent_id,
+                "created_usec": now,
+                "updated_usec": now,
+            },
+            "member_ids": list(member_ids),
+            "children": [],
+        }
+        if parent_id:
+            self._folders[parent_id]["children"].append(
+                {"folder_id": folder_id})
+        if folder_type == "shared":
+            for user_id in member_ids:
+                self._users[user_id]["shared_folder_ids"].append(folder_id)
+        return folder_id
+
+    def add_thread(self, title, html="", author_id=None, folder_ids=(),
+                   thread_type="document"):
+        """Adds a document or chat and returns its ID."""
+        with self._lock:
+            thread_id = self._new_id()
+            now = self._now_usec()
+            secret_path = self._new_id()
+            self._threads[thread_id] = {
+                "thread": {
+                    "id": thread_id,
+                    "title": title,
+                    "type": thread_type,
+                    "author_id": author_id,
+                    "link": "https://quip.com/" + secret_path,
+                    "secret_path": secret_path,
+                    "document_id": self._new_id(),
+                    "is_template": False,
+                    "created_usec": now,
+                    "updated_usec": now,
+                },
+                "user_ids": [author_id] if author_id else [],
+                "folder_ids": [],
+                "html": _add_section_ids(html, self._new_id),
+            }
+            self._add_thread_members(thread_id, folder_ids)
+            return thread_id
+
+    def add_message(self, thread_id, text, author_id=None):
+        """Adds a message to a thread and returns it."""
+        with self._lock:
+            now = self._now_usec()
+            author = self._users.get(author_id, {})
+            message = {
+                "id": self._new_id(),
+                "author_id": author_id,
+                "author_name": author.get("name"),
+                "text": text,
+                "created_usec": now,
+                "updated_usec": now,
+                "visible": True,
+            }
+            self._messages[thread_id].append(message)
+            return dict(message)
+
+    def populate(self, users=10, folders=5, threads=100, messages=3,
+                 document_bytes=2048, token=None):
+        """Adds synthetic users, shared folders, documents and messages.
+
+        Every folder is shared with all users and documents are spread
+        over the folders. The first user is the one authenticated by
+        `token`.
+        """
+        user_ids = [self.add_user("User %d" % i, token=token if i == 0
+                                  else None) for i in range(users)]
+        folder_ids = [self.add_folder("Folder %d" % i, user_ids,
+                                      creator_id=user_ids[0])
+                      for i in range(folders)]
+        paragraph = "<p>Lorem ipsum dolor sit amet, consectetur " \
+            "adipiscing elit, sed do eiusmod tempor incididunt.</p>"
+        html = paragraph * max(document_bytes // len(paragraph), 1)
+        for i in range(threads):
+            author_id = user_ids[i % len(user_ids)]
+            thread_id = self.add_thread(
+                "Document %d" % i, html, author_id,
+                [folder_ids[i % len(folder_ids)]] if folder_ids else ())
+            for j in range(messages):
+                self.add_message(thread_id, "Message %d" % j, author_id)
+
+    def user_ids(self):
+        with self._lock:
+            return list(self._users)
+
+    def folder_ids(self):
+        """Returns the IDs of the shared folders."""
+        with self._lock:
+            return [i for i, f in self._folders.items()
+                    if f["folder"]["folder_type"] == "shared"]
+
+    def thread_ids(self):
+        with self._lock:
+            return list(self._threads)
+
+    def inject_failure(self, path_prefix="", status=503, count=1,
+                       message="Service Unavailable"):
+        """Fails the next `count` requests whose path starts with
+        `path_prefix` (e.g. "threads/edit-document" or "2/threads/").
+
+        A `status` of None closes the connection without a response.
+        """
+        with self._lock:
+            self._failures.append([path_prefix, status, count, message])
+
+    # Server
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def start(self, host="127.0.0.1", port=0):
+        """Serves the API on a background thread and returns its base URL.
+        Port 0 picks a free port."""
+        handler = type("Handler", (_Handler,), {"emulator": self})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        if self._server is None:
+            self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # Requests
+
+    def handle(self, method, path, query, form, token):
+        """Handles one API request.
+
+        Args:
+            method: "GET" or "POST"
+            path: API path without the version prefix for v1, e.g.
+                "threads/ID", or "2/threads/ID/html" for v2
+            query: Query parameters
+            form: POST parameters, or `(filename, data)` for blob uploads
+            token: Bearer token, or None
+
+        Returns:
+            `(status, headers, body)`, where body is bytes or a
+            JSON-serializable object. A status of None means the
+            connection should be dropped.
+        """
+        with self._lock:
+            self.requests[endpoint_family(path)] += 1
+            delay = self.latency(self._rng)
+            user_id = self._tokens.get(token)
+            headers = {}
+            status, body = self._check_limits(user_id, headers)
+            if status is None:
+                status, body = self._injected_failure(path)
+            if status == "drop":
+                self.responses["dropped"] += 1
+                return None, headers, None
+            if status is None and user_id is None:
+                status, body = 401, {"error_description": "Invalid access token"}
+            if status is None:
+                try:
+                    status, body = 200, self._dispatch(
+                        method, path, query, form, user_id)
+                except EmulatorError as error:
+                    status, body = error.code, {
+                        "error_description": error.message}
+            self.responses[status] += 1
+        if delay > 0:
+            time.sleep(delay)
+        return status, headers, body
+
+    def _check_limits(self, user_id, headers):
+        now = time.time()
+        window_start = now - now % self.rate_limit_window
+        reset = window_start + self.rate_limit_window
+        over = None
+        for scope, limit, prefix in (
+                (user_id, self.rate_limit, "X-RateLimit-"),
+                ("*company*", self.company_rate_limit,
+                 "X-Company-RateLimit-")):
+            if limit is None:
+                continue
+            start, used = self._windows.get(scope, (window_start, 0))
+            if start != window_start:
+                used = 0
+            used += 1
+            self._windows[scope] = (window_start, used)
+            headers[prefix + "Limit"] = str(limit)
+            headers[prefix + "Remaining"] = str(max(limit - used, 0))
+            headers[prefix + "Reset"] = "%.3f" % reset
+            if used > limit:
+                over = prefix
+                if prefix == "X-Company-RateLimit-":
+                    headers["X-Company-Retry-After"] = str(
+                        int(math.ceil(reset - now)))
+        if over:
+            return 503, {"error_description": "Over Rate Limit"}
+        return None, None
+
+    def _injected_failure(self, path):
+        for failure in self._failures:
+            prefix, status, count, message = failure
+            if path.startswith(prefix):
+                failure[2] -= 1
+                if failure[2] <= 0:
+                    self._failures.remove(failure)
+                if status is None:
+                    return "drop", None
+                return status, {"error_description": message}
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            return self.failure_status, {
+                "error_description": "Service Unavailable"}
+        return None, None
+
+    def _dispatch(self, method, path, query, form, user_id):
+        parts = path.split("/")
+        if method == "POST":
+            if parts[0] == "blob":
+                return self._put_blob(parts[1], form)
+            handler = _POST_ROUTES.get(path)
+            if handler is None:
+                raise EmulatorError(404, "Unknown endpoint %s" % path)
+            return handler(self, form, user_id)
+
+        if parts[0] == "2":
+            return self._get_v2(parts[1:], query)
+        resource, rest = parts[0], parts[1:]
+        if resource == "users":
+            if rest == ["current"]:
+                return self._user(user_id)
+            if rest == ["contacts"]:
+                return [self._user(i) for i in self._users if i != user_id]
+            return self._get_entities(rest, query, self._user)
+        if resource == "folders":
+            return self._get_entities(rest, query, self._folder)
+        if resource == "threads":
+            if rest == ["recent"]:
+                threads = sorted(
+                    self._threads, key=lambda i:
+                    -self._threads[i]["thread"]["updated_usec"])
+                return dict((i, self._thread_response(i)) for i in
+                            threads[:int(query.get("count") or 10)])
+            if rest == ["search"]:
+                words = query.get("query", "").lower()
+                return [self._thread_response(i) for i, t in
+                        self._threads.items()
+                        if words in t["thread"]["title"].lower()][
+                            :int(query.get("count") or 10)]
+            return self._get_entities(rest, query, self._thread_response)
+        if resource == "messages" and len(rest) == 1:
+            return self._get_messages(rest[0], query)
+        if resource == "blob" and len(rest) == 2:
+            blob = self._blobs.get(tuple(rest))
+            if blob is None:
+                raise EmulatorError(404, "Blob not found")
+            return blob
+        if resource == "teams" and rest == ["current"]:
+            return []
+        if resource == "websockets" and rest == ["new"]:
+            return {"url": "ws://emulator.invalid/websocket",
+                    "user_id": user_id}
+        raise EmulatorError(404, "Unknown endpoint %s" % path)
+
+    def _get_entities(self, rest, query, getter):
+        if rest == [""]:
+            ids = [i for i in query.get("ids", "").split(",") if i]
+            result = {}
+            for entity_id in ids:
+                try:
+                    result[entity_id] = getter(entity_id)
+                except EmulatorError:
+                    pass
+            return result
+        if len(rest) == 1:
+            return getter(rest[0])
+        raise EmulatorError(404, "Unknown endpoint")
+
+    def _get_v2(self, parts, query):
+        if parts[0] != "threads":
+            raise EmulatorError(404, "Unknown endpoint")
+        if parts[1:] == [""]:
+            return dict((i, self._thread_response(i)["thread"])
+                        for i in query.get("ids", "").split(",")
+                        if self._find_thread(i))
+        thread_id = self._find_thread(parts[1])
+        if thread_id is None:
+            raise EmulatorError(404, "Thread not found")
+        thread = self._threads[thread_id]
+        if len(parts) == 2:
+            return {"thread": dict(thread["thread"])}
+        if parts[2] == "html":
+            html = thread["html"]
+            start = int(query.get("cursor") or 0)
+            end = start + self.page_bytes
+            return {"html": html[start:end], "response_metadata": {
+                "next_cursor": str(end) if end < len(html) else ""}}
+        if parts[2] == "folders":
+            return {"folders": [
+                {"folder_id": i,
+                 "type": self._folders[i]["folder"]["folder_type"].upper()}
+                for i in thread["folder_ids"]],
+                "response_metadata": {"next_cursor": ""}}
+        raise EmulatorError(404, "Unknown endpoint")
+
+    def _find_thread(self, thread_id_or_path):
+        if thread_id_or_path in self._threads:
+            return thread_id_or_path
+        for thread_id, thread in self._threads.items():
+            if thread["thread"]["secret_path"] == thread_id_or_path:
+                return thread_id
+        return None
+
+    def _user(self, user_id):
+        if user_id not in self._users:
+            raise EmulatorError(400, "Invalid user id")
+        return json.loads(json.dumps(self._users[user_id]))
+
+    def _folder(self, folder_id):
+        if folder_id not in self._folders:
+            raise EmulatorError(400, "Invalid folder id")
+        return json.loads(json.dumps(self._folders[folder_id]))
+
+    def _thread_response(self, thread_id):
+        thread = self._threads.get(thread_id)
+        if thread is None:
+            raise EmulatorError(400, "Invalid thread id")
+        return {
+            "thread": dict(thread["thread"]),
+            "user_ids": list(thread["user_ids"]),
+            "shared_folder_ids": [
+                i for i in thread["folder_ids"]
+                if self._folders[i]["folder"]["folder_type"] == "shared"],
+            "expanded_user_ids": list(thread["user_ids"]),
+            "invited_user_emails": [],
+            "html": thread["html"],
+        }
+
+    def _get_messages(self, thread_id, query):
+        if thread_id not in self._threads:
+            raise EmulatorError(400, "Invalid thread id")
+        count = min(int(query.get("count") or 25), 100)
+        max_created = query.get("max_created_usec")
+        messages = [m for m in reversed(self._messages[thread_id])
+                    if max_created is None or
+                    m["created_usec"] <= int(max_created)]
+        return [dict(m) for m in messages[:count]]
+
+    def _put_blob(self, thread_id, upload):
+        if thread_id not in self._threads:
+            raise EmulatorError(400, "Invalid thread id")
+        if not isinstance(upload, tuple):
+            raise EmulatorError(400, "Expected a multipart blob upload")
+        blob_id = self._new_id()
+        self._blobs[(thread_id, blob_id)] = upload[1]
+        return {"id": blob_id,
+                "url": "/blob/%s/%s" % (thread_id, blob_id)}
+
+    def _touch(self, thread_id):
+        self._threads[thread_id]["thread"]["updated_usec"] = \
+            self._now_usec()
+
+    def _split_ids(self, value):
+        return [i for i in (value or "").split(",") if i]
+
+    def _add_thread_members(self, thread_id, member_ids):
+        thread = self._threads[thread_id]
+        for member_id in member_ids:
+            if member_id in self._folders:
+                if member_id not in thread["folder_ids"]:
+                    thread["folder_ids"].append(member_id)
+                    self._folders[member_id]["children"].append(
+                        {"thread_id": thread_id})
+            elif member_id in self._users:
+                if member_id not in thread["user_ids"]:
+                    thread["user_ids"].append(member_id)
+            else:
+                raise EmulatorError(400, "Invalid member id %s" % member_id)
+
+    def _require_thread(self, form):
+        thread_id = form.get("thread_id")
+        if thread_id not in self._threads:
+            raise EmulatorError(400, "Invalid thread id")
+        return thread_id
+
+    def _require_folder(self, form):
+        folder_id = form.get("folder_id")
+        if folder_id not in self._folders:
+            raise EmulatorError(400, "Invalid folder id")
+        return folder_id
+
+    def _new_document(self, form, user_id):
+        content = form.get("content", "")
+        if form.get("format") == "markdown":
+            content = _markdown_to_html(content)
+        title = form.get("title") or _title_from_html(content) or "Untitled"
+        member_ids = self._split_ids(form.get("member_ids"))
+        if not member_ids:
+            member_ids = [self._users[user_id]["private_folder_id"]]
+        thread_id = self.add_thread(title, content, user_id, member_ids,
+                                    form.get("type", "document"))
+        return self._thread_response(thread_id)
+
+    def _new_chat(self, form, user_id):
+        thread_id = self.add_thread(
+            form.get("title") or "Chat", "", user_id,
+            self._split_ids(form.get("member_ids")), "chat")
+        if form.get("message"):
+            self.add_message(thread_id, form["message"], user_id)
+        return self._thread_response(thread_id)
+
+    def _copy_document(self, form, user_id):
+        source = self._threads[self._require_thread(form)]
+        title = form.get("title") or source["thread"]["title"]
+        member_ids = self._split_ids(form.get("folder_ids")) + \
+            self._split_ids(form.get("member_ids"))
+        thread_id = self.add_thread(title, source["html"], user_id,
+                                    member_ids or [self._users[user_id][
+                                        "private_folder_id"]])
+        return self._thread_response(thread_id)
+
+    def _edit_document(self, form, user_id):
+        thread_id = self._require_thread(form)
+        thread = self._threads[thread_id]
+        content = form.get("content", "")
+        if form.get("format") == "markdown":
+            content = _markdown_to_html(content)
+        content = _add_section_ids(content, self._new_id)
+        location = int(form.get("location") or APPEND)
+        html = thread["html"]
+        if location == APPEND:
+            html += content
+        elif location == PREPEND:
+            html = content + html
+        else:
+            section_id = form.get("section_id")
+            span = _find_section(html, section_id) if section_id else None
+            if span is None:
+                raise EmulatorError(400, "Invalid section id")
+            start, end = span
+            if location == AFTER_SECTION:
+                html = html[:end] + content + html[end:]
+            elif location == BEFORE_SECTION:
+                html = html[:start] + content + html[start:]
+            elif location == REPLACE_SECTION:
+                html = html[:start] + content + html[end:]
+            elif location == DELETE_SECTION:
+                html = html[:start] + html[end:]
+            else:
+                raise EmulatorError(400, "Invalid location")
+        thread["html"] = html
+        self._touch(thread_id)
+        return self._thread_response(thread_id)
+
+    def _delete_thread(self, form, user_id):
+        thread_id = self._require_thread(form)
+        for folder_id in self._threads.pop(thread_id)["folder_ids"]:
+            children = self._folders[folder_id]["children"]
+            children[:] = [c for c in children
+                           if c.get("thread_id") != thread_id]
+        self._messages.pop(thread_id, None)
+        return {}
+
+    def _thread_add_members(self, form, user_id):
+        thread_id = self._require_thread(form)
+        self._add_thread_members(
+            thread_id, self._split_ids(form.get("member_ids")))
+        self._touch(thread_id)
+        return self._thread_response(thread_id)
+
+    def _thread_remove_members(self, form, user_id):
+        thread_id = self._require_thread(form)
+        thread = self._threads[thread_id]
+        for member_id in self._split_ids(form.get("member_ids")):
+            if member_id in thread["folder_ids"]:
+                thread["folder_ids"].remove(member_id)
+                children = self._folders[member_id]["children"]
+                children[:] = [c for c in children
+                               if c.get("thread_id") != thread_id]
+            elif member_id in thread["user_ids"]:
+                thread["user_ids"].remove(member_id)
+        self._touch(thread_id)
+        return self._thread_response(thread_id)
+
+    def _new_message(self, form, user_id):
+        thread_id = self._require_thread(form)
+        return self.add_message(
+            thread_id, form.get("content") or form.get("parts") or "",
+            user_id)
+
+    def _new_folder(self, form, user_id):
+        parent_id = form.get("parent_id")
+        if parent_id and parent_id not in self._folders:
+            raise EmulatorError(400, "Invalid parent id")
+        member_ids = [user_id] + [
+            i for i in self._split_ids(form.get("member_ids"))
+            if i != user_id]
+        folder_id = self._add_folder(form.get("title") or "New Folder",
+                                     member_ids, parent_id, user_id,
+                                     "shared")
+        return self._folder(folder_id)
+
+    def _update_folder(self, form, user_id):
+        folder_id = self._require_folder(form)
+        folder = self._folders[folder_id]["folder"]
+        for key in ("title", "color"):
+            if form.get(key):
+                folder[key] = form[key]
+        folder["updated_usec"] = self._now_usec()
+        return self._folder(folder_id)
+
+    def _folder_add_members(self, form, user_id):
+        folder_id = self._require_folder(form)
+        members = self._folders[folder_id]["member_ids"]
+        for member_id in self._split_ids(form.get("member_ids")):
+            if member_id not in self._users:
+                raise EmulatorError(400, "Invalid user id %s" % member_id)
+            if member_id not in members:
+                members.append(member_id)
+                self._users[member_id]["shared_folder_ids"].append(folder_id)
+        return self._folder(folder_id)
+
+    def _folder_remove_members(self, form, user_id):
+        folder_id = self._require_folder(form)
+        members = self._folders[folder_id]["member_ids"]
+        for member_id in self._split_ids(form.get("member_ids")):
+            if member_id in members:
+                members.remove(member_id)
+                self._users[member_id]["shared_folder_ids"].remove(folder_id)
+        return self._folder(folder_id)
+
+    def _update_user(self, form, user_id):
+        return self._user(form.get("user_id") or user_id)
+
+
+_POST_ROUTES = {
+    "threads/new-document": QuipEmulator._new_document,
+    "threads/new-chat": QuipEmulator._new_chat,
+    "threads/copy-document": QuipEmulator._copy_document,
+    "threads/edit-document": QuipEmulator._edit_document,
+    "threads/delete": QuipEmulator._delete_thread,
+    "threads/add-members": QuipEmulator._thread_add_members,
+    "threads/remove-members": QuipEmulator._thread_remove_members,
+    "messages/new": QuipEmulator._new_message,
+    "folders/new": QuipEmulator._new_folder,
+    "folders/update": QuipEmulator._update_folder,
+    "folders/add-members": QuipEmulator._folder_add_members,
+    "folders/remove-members": QuipEmulator._folder_remove_members,
+    "users/update": QuipEmulator._update_user,
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    emulator = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _api_path(self, path):
+        if path.startswith("/1/"):
+            return path[3:]
+        if path.startswith("/2/"):
+            return "2/" + path[3:]
+        return path.lstrip("/")
+
+    def _token(self):
+        auth = self.headers.get("Authorization") or ""
+        return auth[len("Bearer "):] if auth.startswith("Bearer ") else None
+
+    def _respond(self, method, form):
+        url = urlparse(self.path)
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        status, headers, body = self.emulator.handle(
+            method, self._api_path(url.path), query, form, self._token())
+        if status is None:
+            self.close_connection = True
+            return
+        if isinstance(body, bytes):
+            content_type = "application/octet-stream"
+        else:
+            body = json.dumps(body).encode()
+            content_type = "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond("GET", None)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        data = self.rfile.read(length)
+        content_type = self.headers.get("Content-Type") or ""
+        if content_type.startswith("multipart/form-data"):
+            form = _parse_upload(content_type, data)
+        else:
+            form = dict((k, v[0]) for k, v in parse_qs(
+                data.decode("utf-8"), keep_blank_values=True).items())
+        self._respond("POST", form)
+
+
+def _parse_upload(content_type, data):
+    """Returns `(filename, data)` of the "blob" part of a multipart body."""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + data)
+    for part in message.iter_parts():
+        if part.get_param("name", header="content-disposition") == "blob":
+            return part.get_filename(), part.get_payload(decode=True)
+    return None, b""
+
+
+def _add_section_ids(html, new_id):
+    """Gives every block element without an ID a new section ID, as Quip
+    does for content it receives."""
+    return _SECTION_TAG_RE.sub(
+        lambda m: "<%s id='%s'" % (m.group(1), new_id()), html)
+
+
+def _find_section(html, section_id):
+    """Returns the `(start, end)` offsets of the element with the given ID,
+    or None."""
+    match = re.search(r"<(\w+)[^>]*\sid=['\"]%s['\"][^>]*>"
+                      % re.escape(section_id), html)
+    if match is None:
+        return None
+    tag = match.group(1)
+    depth = 1
+    tags = re.compile(r"<(/?)%s(?=[\s>/])[^>]*>" % tag)
+    for other in tags.finditer(html, match.end()):
+        depth += -1 if other.group(1) else 1
+        if depth == 0:
+            return match.start(), other.end()
+    return match.start(), len(html)
+
+
+def _markdown_to_html(markdown):
+    """Minimal markdown rendering: headings, list items and paragraphs."""
+    blocks = []
+    for line in markdown.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        heading = re.match(r"(#{1,3})\s+(.*)", stripped)
+        if heading:
+            level = len(heading.group(1))
+            blocks.append("<h%d>%s</h%d>" % (level, heading.group(2), level))
+        elif re.match(r"[*-]\s+", stripped):
+            blocks.append("<ul><li>%s</li></ul>" % stripped[2:].strip())
+        else:
+            blocks.append("<p>%s</p>" % stripped)
+    return "".join(blocks)
+
+
+def _title_from_html(html):
+    match = re.search(r"<(h1|h2|h3|p)[^>]*>(.*?)</\1>", html, re.S)
+    return re.sub(r"<[^>]+>", "", match.group(2)).strip() if match else None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serves an in-memory Quip API for load testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--token", default="emulator-token",
+                        help="access token of the first user")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--folders", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=3,
+                        help="messages per thread")
+    parser.add_argument("--document-bytes", type=int, default=2048)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="median response latency in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.0,
+                        help="log-normal spread of the latency; 0 for fixed")
+    parser.add_argument("--rate-limit", type=int,
+                        help="requests per user per window")
+    parser.add_argument("--company-rate-limit", type=int,
+                        help="requests per window across users")
+    parser.add_argument("--rate-limit-window", type=float, default=60)
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="fraction of requests failed with a 503")
+    parser.add_argument("--page-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--seed", type=int)
+    options = parser.parse_args()
+
+    latency = options.latency
+    if latency and options.latency_sigma:
+        latency = lognormal_latency(latency, options.latency_sigma)
+    emulator = QuipEmulator(
+        latency=latency, rate_limit=options.rate_limit,
+        company_rate_limit=options.company_rate_limit,
+        rate_limit_window=options.rate_limit_window,
+        failure_rate=options.failure_rate, page_bytes=options.page_bytes,
+        seed=options.seed)
+    emulator.populate(options.users, options.folders, options.threads,
+                      options.messages, options.document_bytes,
+                      token=options.token)
+    emulator.start(options.host, options.port)
+    print("Serving the Quip API emulator at %s (token %s)"
+          % (emulator.base_url, options.token))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""Parallel export of Quip workspaces to local disk.
+
+The exporter is a pipeline of stages connected by bounded queues:
+
+    discover -> metadata -> content -> blobs -> write
+
+Each stage runs its own pool of worker threads, so slow HTML or blob
+downloads never stall folder discovery, and the bounded queues keep memory
+flat when one stage outpaces the next. A manifest in the output directory
+records the `updated_usec` of every exported thread, so a later run skips
+threads that have not changed and resumes an interrupted export.
+"""
+
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+_BLOB_RE = re.compile(r"/blob/([A-Za-z0-9_-]+)/([A-Za-z0-9_-]+)")
+
+
+class StageStats:
+    """Throughput counters for a single pipeline stage."""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds, error=False):
+        with self._lock:
+            self.items += 1
+            self.busy_seconds += seconds
+            if error:
+                self.errors += 1
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def as_dict(self):
+        elapsed = self.elapsed
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "errors": self.errors,
+            "elapsed": elapsed,
+            "busy_seconds": self.busy_seconds,
+            "items_per_second": self.items / elapsed if elapsed else 0.0,
+        }
+
+
+class WorkspaceExporter:
+    """Exports folders, threads, HTML, messages and blobs to a directory.
+
+    Layout of `output_dir`:
+
+        manifest.json
+        folders/<folder_id>.json
+        threads/<thread_id>/thread.json
+        threads/<thread_id>/document.html
+        threads/<thread_id>/messages.json
+        threads/<thread_id>/blobs/<blob_id>
+
+        exporter = WorkspaceExporter(client, "/backups/nightly")
+        report = exporter.run(user["shared_folder_ids"])
+    """
+
+    MANIFEST_NAME = "manifest.json"
+
+    DEFAULT_CONCURRENCY = {
+        "discover": 1,
+        "metadata": 2,
+        "content": 4,
+        "blobs": 4,
+        "write": 1,
+    }
+
+    def __init__(self, client, output_dir, concurrency=None, queue_size=100,
+                 include_messages=True, include_blobs=True, cache=True,
+                 manifest_every=50):
+        """Initialize the exporter.
+
+        Args:
+            client: `QuipClient` used for all API requests
+            output_dir: Directory to write the export to
+            concurrency: Optional dict of stage name to worker count,
+                merged over `DEFAULT_CONCURRENCY`
+            queue_size: Maximum number of items waiting between two stages
+            include_messages: Whether to export thread messages
+            include_blobs: Whether to download blobs referenced by threads
+            cache: Whether metadata and HTML requests use the client cache
+            manifest_every: Save the manifest after this many written
+                threads, so an interrupted export can resume
+        """
+        self.client = client
+        self.output_dir = output_dir
+        self.concurrency = dict(self.DEFAULT_CONCURRENCY)
+        if concurrency:
+            self.concurrency.update(concurrency)
+        self.queue_size = queue_size
+        self.include_messages = include_messages
+        self.include_blobs = include_blobs
+        self.cache = cache
+        self.manifest_every = manifest_every
+        self.stats = {}
+        self._manifest = None
+        self._manifest_lock = threading.Lock()
+        self._seen_threads = set()
+        self._seen_lock = threading.Lock()
+
+    def run(self, folder_ids=(), thread_ids=()):
+        """Exports everything reachable from the given folders and threads.
+
+        Args:
+            folder_ids: Root folder IDs, walked recursively
+            thread_ids: Additional thread IDs to export
+
+        Returns:
+            Dictionary of per-stage throughput stats plus counts of
+            exported, skipped and failed threads.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._manifest = self._load_manifest()
+        self._seen_threads = set()
+        self._skipped = 0
+        self._failed = []
+
+        stages = [
+            ("discover", self._discover),
+            ("metadata", self._fetch_metadata),
+            ("content", self._fetch_content),
+            ("blobs", self._download_blobs),
+            ("write", self._write),
+        ]
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in stages]
+        self.stats = dict((name, StageStats(name, self.concurrency[name]))
+                          for name, _ in stages)
+
+        pools = []
+        for i, (name, func) in enumerate(stages):
+            out_q = queues[i + 1] if i + 1 < len(queues) else None
+            workers = [threading.Thread(
+                target=self._worker, args=(name, func, queues[i], out_q),
+                name=f"quip-export-{name}-{n}", daemon=True)
+                for n in range(self.concurrency[name])]
+            self.stats[name].started = time.time()
+            for worker in workers:
+                worker.start()
+            pools.append(workers)
+
+        queues[0].put(("roots", list(folder_ids), list(thread_ids)))
+        for i, (name, _) in enumerate(stages):
+            for _ in pools[i]:
+                queues[i].put(_STOP)
+            for worker in pools[i]:
+                worker.join()
+            self.stats[name].finished = time.time()
+
+        self._save_manifest()
+        report = dict((name, stats.as_dict())
+                      for name, stats in self.stats.items())
+        report["exported"] = self.stats["write"].items - \
+            self.stats["write"].errors
+        report["skipped"] = self._skipped
+        report["failed"] = list(self._failed)
+        return report
+
+    def _worker(self, name, func, in_q, out_q):
+        stats = self.stats[name]
+        while True:
+            item = in_q.get()
+            if item is _STOP:
+                return
+            start = time.time()
+            error = False
+            try:
+                for output in func(item) or ():
+                    out_q.put(output)
+            except Exception as e:
+                error = True
+                logger.warning("Export stage %s failed: %s", name, e)
+                self._failed.append({
+                    "stage": name,
+                    "thread_id": item.get("id") if isinstance(item, dict)
+                    else None,
+                    "error": str(e),
+                })
+            stats.record(time.time() - start, error=error)
+
+    def _discover(self, item):
+        _, folder_ids, thread_ids = item
+        batch_size = self.client.MAX_THREADS_PER_REQUEST
+        pending = []
+
+        def emit(thread_id):
+            with self._seen_lock:
+                if thread_id in self._seen_threads:
+                    return None
+                self._seen_threads.add(thread_id)
+            pending.append(thread_id)
+            if len(pending) >= batch_size:
+                batch = pending[:]
+                del pending[:]
+                return batch
+            return None
+
+        for thread_id in thread_ids:
+            batch = emit(thread_id)
+            if batch:
+                yield batch
+
+        seen_folders = set()
+        to_visit = [f for f in folder_ids]
+        while to_visit:
+            ids = [f for f in to_visit[:self.client.MAX_FOLDERS_PER_REQUEST]
+                   if f not in seen_folders]
+            to_visit = to_visit[self.client.MAX_FOLDERS_PER_REQUEST:]
+            if not ids:
+                continue
+            seen_folders.update(ids)
+            folders = self.client.get_folders(ids, cache=self.cache)
+            for folder_id, folder in folders.items():
+                self._write_json(
+                    os.path.join(self.output_dir, "folders",
+                                 folder_id + ".json"), folder)
+                for child in folder.get("children", []):
+                    if "folder_id" in child:
+                        if child["folder_id"] not in seen_folders:
+                            to_visit.append(child["folder_id"])
+                    elif "thread_id" in child:
+                        batch = emit(child["thread_id"])
+                        if batch:
+                            yield batch
+        if pending:
+            yield pending
+
+    def _fetch_metadata(self, thread_ids):
+        threads = self.client.get_threads(thread_ids, cache=self.cache)
+        for thread_id, thread in threads.items():
+            updated_usec = thread.get("thread", {}).get("updated_usec")
+            with self._manifest_lock:
+                entry = self._manifest["threads"].get(thread_id)
+                if entry and updated_usec and \
+                        entry.get("updated_usec") == updated_usec:
+                    self._skipped += 1
+                    continue
+            yield {"id": thread_id, "thread": thread,
+                   "updated_usec": updated_usec}
+
+    def _fetch_content(self, record):
+        thread_id = record["id"]
+        html = record["thread"].get("html")
+        if html is None:
+            html = self.client.get_thread_html_v2(
+                thread_id, cache=self.cache).get("html", "")
+        record["html"] = html
+        record["messages"] = []
+        if self.include_messages:
+            record["messages"] = list(self.client.iter_message_history(
+                thread_id, cache=self.cache))
+        blob_ids = []
+        if self.include_blobs:
+            for blob_thread_id, blob_id in _BLOB_RE.findall(html):
+                if blob_thread_id == thread_id and blob_id not in blob_ids:
+                    blob_ids.append(blob_id)
+            for message in record["messages"]:
+                for blob_info in message.get("files", []):
+                    if blob_info["hash"] not in blob_ids:
+                        blob_ids.append(blob_info["hash"])
+        record["blob_ids"] = blob_ids
+        yield record
+
+    def _download_blobs(self, record):
+        blobs = {}
+        for blob_id in record["blob_ids"]:
+            blobs[blob_id] = self.client.get_blob(record["id"], blob_id).read()
+        record["blobs"] = blobs
+        yield record
+
+    def _write(self, record):
+        thread_dir = os.path.join(self.output_dir, "threads", record["id"])
+        self._write_json(os.path.join(thread_dir, "thread.json"),
+                         record["thread"])
+        self._write_file(os.path.join(thread_dir, "document.html"),
+                         record["html"].encode("utf-8"))
+        if self.include_messages:
+            self._write_json(os.path.join(thread_dir, "messages.json"),
+                             record["messages"])
+        for blob_id, content in record["blobs"].items():
+            self._write_file(
+                os.path.join(thread_dir, "blobs", blob_id), content)
+        with self._manifest_lock:
+            self._manifest["threads"][record["id"]] = {
+                "updated_usec": record["updated_usec"],
+                "exported_usec": int(time.time() * 1000000),
+                "blob_ids": list(record["blobs"].keys()),
+            }
+            written = len(self._manifest["threads"])
+        if self.manifest_every and written % self.manifest_every == 0:
+            self._save_manifest()
+        return ()
+
+    def _load_manifest(self):
+        path = os.path.join(self.output_dir, self.MANIFEST_NAME)
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+            manifest.setdefault("threads", {})
+            return manifest
+        return {"threads": {}}
+
+    def _save_manifest(self):
+        with self._manifest_lock:
+            self._manifest["updated_usec"] = int(time.time() * 1000000)
+            self._write_json(
+                os.path.join(self.output_dir, self.MANIFEST_NAME),
+                self._manifest)
+
+    def _write_json(self, path, data):
+        self._write_file(path, json.dumps(data).encode("utf-8"))
+
+    def _write_file(self, path, content):
+        """Writes atomically so an interrupted export never leaves partial
+        files behind."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = "%s.%d.tmp" % (path, threading.get_ident())
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
@@ -0,0 +1,211 @@
+"""Local index of folder, thread and user memberships."""
+
+import collections
+
+from .storage import PersistentIndex
+
+
+class MembershipIndex(PersistentIndex):
+    """Bidirectional membership graph built from API responses.
+
+    Tracks folder children (threads and subfolders), the folders each thread
+    or folder is in, folder members and the shared folders of each user.
+    Every edge is stored in both directions, so lookups either way are
+    dictionary reads. Folder and thread responses replace what is known
+    about that folder or thread; mutations add or remove single edges.
+    """
+
+    def __init__(self, path=None, autosave_interval=30):
+        super().__init__(path, autosave_interval)
+        self._children = collections.defaultdict(set)
+        self._parents = collections.defaultdict(set)
+        self._members = collections.defaultdict(set)
+        self._user_folders = collections.defaultdict(set)
+        self._folders = set()
+
+    def _snapshot(self):
+        return {
+            "children": dict((k, sorted(v)) for k, v in
+                             self._children.items() if v),
+            "members": dict((k, sorted(v)) for k, v in
+                            self._members.items() if v),
+            "folders": sorted(self._folders),
+        }
+
+    def _restore(self, data):
+        self._folders = set(data["folders"])
+        for folder_id, children in data["children"].items():
+            for child_id in children:
+                self._link(folder_id, child_id)
+        for folder_id, members in data["members"].items():
+            for user_id in members:
+                self._add_member(folder_id, user_id)
+
+    def _link(self, folder_id, child_id):
+        self._children[folder_id].add(child_id)
+        self._parents[child_id].add(folder_id)
+
+    def _unlink(self, folder_id, child_id):
+        self._children[folder_id].discard(child_id)
+        self._parents[child_id].discard(folder_id)
+
+    def _add_member(self, folder_id, user_id):
+        self._members[folder_id].add(user_id)
+        self._user_folders[user_id].add(folder_id)
+
+    def _remove_member(self, folder_id, user_id):
+        self._members[folder_id].discard(user_id)
+        self._user_folders[user_id].discard(folder_id)
+
+    def set_folder(self, folder_id, thread_ids=None, subfolder_ids=None,
+                   member_ids=None, parent_id=None):
+        """Records a folder's full list of children and members. Passing
+        None for both `thread_ids` and `subfolder_ids`, or for
+        `member_ids`, leaves that side unchanged."""
+        with self._lock:
+            self._ensure_loaded()
+            self._folders.add(folder_id)
+            if thread_ids is not None or subfolder_ids is not None:
+                for child_id in list(self._children[folder_id]):
+                    self._unlink(folder_id, child_id)
+                self._folders.update(subfolder_ids or ())
+                for child_id in list(thread_ids or ()) + \
+                        list(subfolder_ids or ()):
+                    self._link(folder_id, child_id)
+            if member_ids is not None:
+                for user_id in list(self._members[folder_id]):
+                    self._remove_member(folder_id, user_id)
+                for user_id in member_ids:
+                    self._add_member(folder_id, user_id)
+            if parent_id:
+                self._link(parent_id, folder_id)
+            self._changed()
+
+    def set_thread_folders(self, thread_id, folder_ids, complete=True):
+        """Records the folders containing a thread. Unless `complete` is
+        False, folders not listed no longer contain it."""
+        with self._lock:
+            self._ensure_loaded()
+            folder_ids = set(folder_ids)
+            if complete:
+                for folder_id in self._parents[thread_id] - folder_ids:
+                    self._unlink(folder_id, thread_id)
+            self._folders.update(folder_ids)
+            for folder_id in folder_ids:
+                self._link(folder_id, thread_id)
+            self._changed()
+
+    def set_user_folders(self, user_id, folder_ids):
+        """Records the full list of shared folders a user is a member of."""
+        with self._lock:
+            self._ensure_loaded()
+            folder_ids = set(folder_ids)
+            for folder_id in self._user_folders[user_id] - folder_ids:
+                self._remove_member(folder_id, user_id)
+            self._folders.update(folder_ids)
+            for folder_id in folder_ids:
+                self._add_member(folder_id, user_id)
+            self._changed()
+
+    def add_folder_members(self, folder_id, user_ids):
+        """Applies a folder add-members mutation."""
+        with self._lock:
+            self._ensure_loaded()
+            self._folders.add(folder_id)
+            for user_id in user_ids:
+                self._add_member(folder_id, user_id)
+            self._changed()
+
+    def remove_folder_members(self, folder_id, user_ids):
+        """Applies a folder remove-members mutation."""
+        with self._lock:
+            self._ensure_loaded()
+            for user_id in user_ids:
+                self._remove_member(folder_id, user_id)
+            self._changed()
+
+    def add_thread_members(self, thread_id, member_ids):
+        """Applies a thread add-members mutation. Thread members can be
+        users or folders; only IDs already known to be folders are
+        recorded, since the two cannot be told apart."""
+        with self._lock:
+            self._ensure_loaded()
+            for member_id in member_ids:
+                if member_id in self._folders:
+                    self._link(member_id, thread_id)
+            self._changed()
+
+    def remove_thread_members(self, thread_id, member_ids):
+        """Applies a thread remove-members mutation."""
+        with self._lock:
+            self._ensure_loaded()
+            for member_id in member_ids:
+                self._unlink(member_id, thread_id)
+            self._changed()
+
+    def remove(self, item_id):
+        """Forgets a deleted thread or folder."""
+        with self._lock:
+            self._ensure_loaded()
+            for folder_id in list(self._parents.pop(item_id, ())):
+                self._children[folder_id].discard(item_id)
+            for child_id in list(self._children.pop(item_id, ())):
+                self._parents[child_id].discard(item_id)
+            for user_id in list(self._members.pop(item_id, ())):
+                self._user_folders[user_id].discard(item_id)
+            self._folders.discard(item_id)
+            self._changed()
+
+    def get_parents(self, item_id):
+        """Returns the IDs of the folders containing a thread or folder."""
+        with self._lock:
+            self._ensure_loaded()
+            return set(self._parents.get(item_id, ()))
+
+    def get_children(self, folder_id):
+        """Returns the IDs of the threads and folders in a folder."""
+        with self._lock:
+            self._ensure_loaded()
+            return set(self._children.get(folder_id, ()))
+
+    def get_descendants(self, folder_id, include_folders=False):
+        """Returns the IDs of every thread (and, optionally, folder) under a
+        folder, following subfolders recursively."""
+        with self._lock:
+            self._ensure_loaded()
+            result = set()
+            seen = set([folder_id])
+            pending = [folder_id]
+            while pending:
+                for child_id in self._children.get(pending.pop(), ()):
+                    if child_id in self._folders:
+                        if child_id in seen:
+                            continue
+                        seen.add(child_id)
+                        pending.append(child_id)
+                        if not include_folders:
+                            continue
+                    result.add(child_id)
+            return result
+
+    def get_members(self, folder_id):
+        """Returns the IDs of the users who are members of a folder."""
+        with self._lock:
+            self._ensure_loaded()
+            return set(self._members.get(folder_id, ()))
+
+    def get_user_folders(self, user_id):
+        """Returns the IDs of the shared folders a user is a member of."""
+        with self._lock:
+            self._ensure_loaded()
+            return set(self._user_folders.get(user_id, ()))
+
+    def clear(self):
+        with self._lock:
+            self._loaded = True
+            self._children.clear()
+            self._parents.clear()
+            self._members.clear()
+            self._user_folders.clear()
+            self._folders.clear()
+            self._dirty = True
@@ -0,0 +1,188 @@
+"""Automatic batching of single-entity lookups.
+
+Code that resolves IDs one at a time, for example every `author_id`
+returned by `get_messages`, sends one request per ID. The loaders here
+collect single lookups, dedupe them and dispatch them through
+`_cached_get` in batches of up to the endpoint's per-request maximum,
+resolving one `Future` per caller.
+
+    with client.batch_loader() as loader:
+        authors = [loader.get_user(m["author_id"]) for m in messages]
+    names = [author.result()["name"] for author in authors]
+
+Without a `wait` window, calling `result` on a future whose lookup is
+still pending dispatches its loader first, so results can also be read
+inside the `with` block.
+"""
+
+import threading
+from concurrent.futures import Future
+
+from .base import BaseQuipClient, QuipError
+
+
+class LoaderFuture(Future):
+    """`Future` that dispatches its loader's pending lookups when its
+    result is requested before they were sent.
+
+    Loaders with a `wait` window are left to their timer, so that
+    concurrent callers blocking on results still share a batch.
+    """
+
+    def __init__(self, loader):
+        Future.__init__(self)
+        self._loader = loader
+
+    def _flush(self):
+        if not self.done() and self._loader.wait is None:
+            self._loader.dispatch()
+
+    def result(self, timeout=None):
+        self._flush()
+        return Future.result(self, timeout)
+
+    def exception(self, timeout=None):
+        self._flush()
+        return Future.exception(self, timeout)
+
+
+class EntityLoader:
+    """Collects lookups for one endpoint and fetches them in batches.
+
+    Lookups are dispatched when `dispatch` is called, when `batch_size`
+    IDs are pending, or, if `wait` is given, `wait` seconds after the
+    first pending lookup, which lets concurrent callers share a batch.
+    Resolved futures are memoized for the lifetime of the loader.
+    """
+
+    def __init__(self, client, endpoint, batch_size, cache_ttl=None,
+                 cache=True, wait=None):
+        """Initialize the loader.
+
+        Args:
+            client: `QuipClient` used to fetch entities
+            endpoint: Bulk endpoint, e.g. "users", "threads" or "folders"
+            batch_size: Maximum IDs per request for the endpoint
+            cache_ttl: Cache TTL in seconds passed to `_cached_get`
+            cache: Whether `_cached_get` uses the cache
+            wait: Seconds to collect lookups before dispatching
+                automatically, or None to dispatch only explicitly
+        """
+        self.client = client
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.cache_ttl = cache_ttl
+        self.cache = cache
+        self.wait = wait
+        self.batches = 0
+        self._futures = {}
+        self._pending = []
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def load(self, id):
+        """Returns a `Future` resolving to the entity with the given ID."""
+        with self._lock:
+            future = self._futures.get(id)
+            if future is not None:
+                return future
+            future = LoaderFuture(self)
+            self._futures[id] = future
+            self._pending.append(id)
+            full = len(self._pending) >= self.batch_size
+            if not full and self.wait is not None and self._timer is None:
+                self._timer = threading.Timer(self.wait, self.dispatch)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.dispatch()
+        return future
+
+    def load_many(self, ids):
+        """Returns a list of futures, one per ID."""
+        return [self.load(id) for id in ids]
+
+    def dispatch(self):
+        """Fetches all pending lookups and resolves their futures."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        for i in range(0, len(pending), self.batch_size):
+            batch = pending[i:i + self.batch_size]
+            try:
+                self.batches += 1
+                entities = self.client._cached_get(
+                    self.endpoint, batch, self.cache_ttl if self.cache
+                    else None, batch_size=self.batch_size, cache=self.cache)
+            except Exception as e:
+                for id in batch:
+                    self._futures[id].set_exception(e)
+                continue
+            for id in batch:
+                if id in entities:
+                    self._futures[id].set_result(entities[id])
+                else:
+                    self._futures[id].set_exception(QuipError(
+                        404, f"{self.endpoint} {id} not found", None))
+
+    def clear(self, id=None):
+        """Forgets memoized results for the given ID, or all IDs."""
+        with self._lock:
+            if id is None:
+                self._futures = dict(
+                    (i, self._futures[i]) for i in self._pending)
+            elif id not in self._pending:
+                self._futures.pop(id, None)
+
+
+class BatchLoader:
+    """Per-endpoint loaders for users, threads and folders.
+
+    Used as a context manager, every pending lookup is dispatched on exit.
+    """
+
+    def __init__(self, client, wait=None, cache=True):
+        """Initialize the loaders.
+
+        Args:
+            client: `QuipClient` used to fetch entities
+            wait: Seconds to collect lookups before dispatching
+                automatically, or None to dispatch on exit or when a
+                result is requested
+            cache: Whether lookups use the client cache
+        """
+        self.users = EntityLoader(
+            client, "users", client.MAX_USERS_PER_REQUEST,
+            BaseQuipClient.THIRTY_DAYS, cache=cache, wait=wait)
+        self.threads = EntityLoader(
+            client, "threads", client.MAX_THREADS_PER_REQUEST,
+            BaseQuipClient.THIRTY_DAYS, cache=cache, wait=wait)
+        self.folders = EntityLoader(
+            client, "folders", client.MAX_FOLDERS_PER_REQUEST,
+            BaseQuipClient.THIRTY_DAYS, cache=cache, wait=wait)
+
+    def get_user(self, id):
+        """Returns a `Future` for the user with the given ID."""
+        return self.users.load(id)
+
+    def get_thread(self, id):
+        """Returns a `Future` for the thread with the given ID."""
+        return self.threads.load(id)
+
+    def get_folder(self, id):
+        """Returns a `Future` for the folder with the given ID."""
+        return self.folders.load(id)
+
+    def dispatch(self):
+        """Fetches every pending lookup on all endpoints."""
+        for loader in (self.users, self.threads, self.folders):
+            loader.dispatch()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.dispatch()
+        return False
@@ -0,0 +1,228 @@
+"""Per-endpoint request metrics built from the client's instrumentation
+hooks."""
+
+import bisect
+import collections
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+TIMINGS = ("queue", "wait", "network", "decode")
+
+
+class _EndpointStats:
+
+    def __init__(self, buckets, max_samples):
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.retries = 0
+        self.rate_limit_waits = 0
+        self.rate_limit_wait_seconds = 0.0
+        self.seconds = dict((t, 0.0) for t in TIMINGS)
+        self.duration_sum = 0.0
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.samples = collections.deque(maxlen=max_samples)
+
+
+class RequestMetrics:
+    """Aggregates instrumentation events into per-endpoint counters and
+    latency histograms.
+
+    Request latency is the "after_response" `total`. Percentiles are
+    computed over the last `max_samples` requests of each endpoint; the
+    cumulative histogram exported by `to_prometheus` counts every request.
+    """
+
+    def __init__(self, client=None, buckets=DEFAULT_BUCKETS,
+                 max_samples=1024):
+        """Initialize the metrics.
+
+        Args:
+            client: Client to attach to, if any
+            buckets: Upper bounds of the latency histogram buckets in seconds
+            max_samples: Latencies kept per endpoint for percentiles
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.max_samples = max_samples
+        self.rate_limit_remaining = None
+        self.company_rate_limit_remaining = None
+        self._endpoints = {}
+        self._lock = threading.Lock()
+        if client is not None:
+            self.attach(client)
+
+    def attach(self, client):
+        """Records the events of the given client."""
+        for event in client.HOOK_EVENTS:
+            client.add_hook(event, self.record)
+
+    def detach(self, client):
+        for event in client.HOOK_EVENTS:
+            client.remove_hook(event, self.record)
+
+    def _stats(self, endpoint):
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = _EndpointStats(self.buckets, self.max_samples)
+            self._endpoints[endpoint] = stats
+        return stats
+
+    def record(self, info):
+        """Records one instrumentation event."""
+        event = info["event"]
+        with self._lock:
+            stats = self._stats(info["endpoint"])
+            if event == "after_response":
+                stats.requests += 1
+                if not isinstance(info["status"], int) or \
+                        info["status"] >= 400:
+                    stats.errors += 1
+                stats.bytes += info["bytes"]
+                for timing in TIMINGS:
+                    stats.seconds[timing] += info[timing]
+                total = info["total"]
+                stats.duration_sum += total
+                stats.bucket_counts[
+                    bisect.bisect_left(self.buckets, total)] += 1
+                stats.samples.append(total)
+                if info["rate_limit_remaining"] is not None:
+                    self.rate_limit_remaining = info["rate_limit_remaining"]
+                if info["company_rate_limit_remaining"] is not None:
+                    self.company_rate_limit_remaining = \
+                        info["company_rate_limit_remaining"]
+            elif event == "cache_hit":
+                stats.cache_hits += 1
+            elif event == "cache_miss":
+                stats.cache_misses += 1
+            elif event == "retry":
+                stats.retries += 1
+            elif event == "rate_limit_wait":
+                stats.rate_limit_waits += 1
+                stats.rate_limit_wait_seconds += info["seconds"]
+
+    def percentile(self, endpoint, q):
+        """Returns the `q`th percentile (0-100) of the endpoint's recent
+        latencies in seconds, or None if it has no requests."""
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            samples = sorted(stats.samples) if stats else []
+        return _percentile(samples, q)
+
+    def summary(self):
+        """Returns `{endpoint: stats}` with request, error, byte, cache,
+        retry and rate limit counts, summed timings and p50/p95/p99
+        latencies in seconds."""
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._endpoints.items():
+                samples = sorted(stats.samples)
+                result[endpoint] = {
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "bytes": stats.bytes,
+                    "cache_hits": stats.cache_hits,
+                    "cache_misses": stats.cache_misses,
+                    "retries": stats.retries,
+                    "rate_limit_waits": stats.rate_limit_waits,
+                    "rate_limit_wait_seconds": stats.rate_limit_wait_seconds,
+                    "seconds": dict(stats.seconds),
+                    "p50": _percentile(samples, 50),
+                    "p95": _percentile(samples, 95),
+                    "p99": _percentile(samples, 99),
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+            self.rate_limit_remaining = None
+            self.company_rate_limit_remaining = None
+
+    def to_prometheus(self, prefix="quip_client"):
+        """Returns the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = []
+
+            def family(name, kind, help_text, samples):
+                lines.append("# HELP %s_%s %s" % (prefix, name, help_text))
+                lines.append("# TYPE %s_%s %s" % (prefix, name, kind))
+                for suffix, labels, value in samples:
+                    lines.append("%s_%s%s{%s} %s" % (
+                        prefix, name, suffix, ",".join(
+                            '%s="%s"' % (k, _escape(v)) for k, v in labels),
+                        _format(value)))
+
+            histogram = []
+            for endpoint, stats in endpoints:
+                labels = [("endpoint", endpoint)]
+                count = 0
+                bounds = list(self.buckets) + [float("inf")]
+                for bound, bucket_count in zip(bounds, stats.bucket_counts):
+                    count += bucket_count
+                    histogram.append(("_bucket", labels + [
+                        ("le", _format(bound))], count))
+                histogram.append(("_sum", labels, stats.duration_sum))
+                histogram.append(("_count", labels, stats.requests))
+            family("request_duration_seconds", "histogram",
+                   "Request latency in seconds.", histogram)
+
+            family("request_phase_seconds_total", "counter",
+                   "Request time spent in each phase in seconds.",
+                   [("", [("endpoint", e), ("phase", t)], s.seconds[t])
+                    for e, s in endpoints for t in TIMINGS])
+            for name, attr, help_text in (
+                    ("request_errors_total", "errors",
+                     "Requests answered with an error."),
+                    ("response_bytes_total", "bytes",
+                     "Response body bytes received."),
+                    ("cache_hits_total", "cache_hits",
+                     "Requests served from the cache."),
+                    ("cache_misses_total", "cache_misses",
+                     "Cacheable requests not found in the cache."),
+                    ("retries_total", "retries", "Retried requests."),
+                    ("rate_limit_waits_total", "rate_limit_waits",
+                     "Requests delayed by a rate limit."),
+                    ("rate_limit_wait_seconds_total",
+                     "rate_limit_wait_seconds",
+                     "Seconds spent waiting for rate limits.")):
+                family(name, "counter", help_text,
+                       [("", [("endpoint", e)], getattr(s, attr))
+                        for e, s in endpoints])
+
+            gauges = []
+            if self.rate_limit_remaining is not None:
+                gauges.append(("", [("scope", "user")],
+                               self.rate_limit_remaining))
+            if self.company_rate_limit_remaining is not None:
+                gauges.append(("", [("scope", "company")],
+                               self.company_rate_limit_remaining))
+            family("rate_limit_remaining", "gauge",
+                   "Requests remaining in the current rate limit window.",
+                   gauges)
+        return "\n".join(lines) + "\n"
+
+
+def _percentile(samples, q):
+    """Nearest-rank percentile of sorted samples."""
+    if not samples:
+        return None
+    rank = max(int(-(-q * len(samples) // 100)), 1)
+    return samples[min(rank, len(samples)) - 1]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace(
+        "\n", "\\n")
+
+
+def _format(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
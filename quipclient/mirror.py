@@ -0,0 +1,278 @@
+"""Normalized SQLite mirror of the entities seen by the client."""
+
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    type TEXT,
+    author_id TEXT,
+    link TEXT,
+    secret_path TEXT,
+    document_id TEXT,
+    is_template INTEGER,
+    created_usec INTEGER,
+    updated_usec INTEGER
+);
+CREATE INDEX IF NOT EXISTS threads_updated ON threads (updated_usec);
+CREATE INDEX IF NOT EXISTS threads_author ON threads (author_id);
+
+CREATE TABLE IF NOT EXISTS folders (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    folder_type TEXT,
+    color TEXT,
+    creator_id TEXT,
+    parent_id TEXT,
+    created_usec INTEGER,
+    updated_usec INTEGER
+);
+CREATE INDEX IF NOT EXISTS folders_parent ON folders (parent_id);
+
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    is_robot INTEGER,
+    created_usec INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS user_emails (
+    user_id TEXT NOT NULL,
+    email TEXT NOT NULL,
+    PRIMARY KEY (user_id, email)
+);
+CREATE INDEX IF NOT EXISTS user_emails_email ON user_emails (email);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT NOT NULL,
+    author_id TEXT,
+    text TEXT,
+    annotation_id TEXT,
+    created_usec INTEGER,
+    updated_usec INTEGER
+);
+CREATE INDEX IF NOT EXISTS messages_thread
+    ON messages (thread_id, created_usec);
+CREATE INDEX IF NOT EXISTS messages_author ON messages (author_id);
+
+CREATE TABLE IF NOT EXISTS folder_children (
+    folder_id TEXT NOT NULL,
+    child_id TEXT NOT NULL,
+    child_type TEXT NOT NULL,
+    PRIMARY KEY (folder_id, child_id)
+);
+CREATE INDEX IF NOT EXISTS folder_children_child
+    ON folder_children (child_id);
+
+CREATE TABLE IF NOT EXISTS folder_members (
+    folder_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (folder_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS folder_members_user ON folder_members (user_id);
+
+CREATE TABLE IF NOT EXISTS thread_users (
+    thread_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (thread_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS thread_users_user ON thread_users (user_id);
+"""
+
+
+def _upsert_sql(table, columns):
+    """Returns an upsert that skips rows older than the stored one."""
+    updates = ", ".join("%s = excluded.%s" % (c, c) for c in columns[1:])
+    condition = ""
+    if "updated_usec" in columns:
+        condition = (" WHERE %s.updated_usec IS NULL OR "
+                     "excluded.updated_usec IS NULL OR "
+                     "excluded.updated_usec >= %s.updated_usec"
+                     % (table, table))
+    return ("INSERT INTO %s (%s) VALUES (%s) ON CONFLICT (id) DO UPDATE "
+            "SET %s%s" % (table, ", ".join(columns),
+                          ", ".join("?" * len(columns)), updates, condition))
+
+
+THREAD_COLUMNS = ("id", "title", "type", "author_id", "link", "secret_path",
+                  "document_id", "is_template", "created_usec",
+                  "updated_usec")
+FOLDER_COLUMNS = ("id", "title", "folder_type", "color", "creator_id",
+                  "parent_id", "created_usec", "updated_usec")
+USER_COLUMNS = ("id", "name", "is_robot", "created_usec")
+MESSAGE_COLUMNS = ("id", "thread_id", "author_id", "text", "annotation_id",
+                   "created_usec", "updated_usec")
+
+
+class SQLiteMirror:
+    """Mirrors threads, folders, users, messages and their memberships into
+    indexed SQLite tables.
+
+    Each `upsert_*` call writes its whole batch in one transaction. Rows
+    carrying `updated_usec` are only replaced by rows at least as new, so
+    stale responses (e.g. served late by a background refresh) never
+    overwrite newer data. Thread, folder and user responses replace their
+    membership rows.
+    """
+
+    def __init__(self, path=":memory:"):
+        """Initialize the mirror.
+
+        Args:
+            path: SQLite database file, created if needed
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def upsert_threads(self, threads):
+        """Upserts thread responses, `{"thread": {...}, ...}`, or bare thread
+        objects as returned by the v2 API."""
+        rows = []
+        members = []
+        folders = []
+        for thread in threads:
+            info = thread.get("thread", thread)
+            rows.append(_row(info, THREAD_COLUMNS))
+            if "user_ids" in thread:
+                members.append((info["id"], thread["user_ids"]))
+            if "shared_folder_ids" in thread:
+                folders.append((info["id"], thread["shared_folder_ids"]))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                _upsert_sql("threads", THREAD_COLUMNS), rows)
+            for thread_id, user_ids in members:
+                self._conn.execute(
+                    "DELETE FROM thread_users WHERE thread_id = ?",
+                    (thread_id,))
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO thread_users VALUES (?, ?)",
+                    [(thread_id, u) for u in user_ids])
+            for thread_id, folder_ids in folders:
+                # Thread responses only list shared folders, so children
+                # recorded from private folder listings are kept
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO folder_children VALUES "
+                    "(?, ?, 'thread')", [(f, thread_id) for f in folder_ids])
+        return len(rows)
+
+    def upsert_folders(self, folders):
+        """Upserts folder responses, `{"folder": {...}, "member_ids": [...],
+        "children": [...]}`."""
+        rows = []
+        with self._lock, self._conn:
+            for folder in folders:
+                info = folder["folder"]
+                rows.append(_row(info, FOLDER_COLUMNS))
+                if "children" in folder:
+                    self._conn.execute(
+                        "DELETE FROM folder_children WHERE folder_id = ?",
+                        (info["id"],))
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO folder_children "
+                        "VALUES (?, ?, ?)",
+                        [(info["id"], c.get("thread_id") or c["folder_id"],
+                          "thread" if "thread_id" in c else "folder")
+                         for c in folder["children"]])
+                if "member_ids" in folder:
+                    self._conn.execute(
+                        "DELETE FROM folder_members WHERE folder_id = ?",
+                        (info["id"],))
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO folder_members VALUES (?, ?)",
+                        [(info["id"], u) for u in folder["member_ids"]])
+            self._conn.executemany(
+                _upsert_sql("folders", FOLDER_COLUMNS), rows)
+        return len(rows)
+
+    def upsert_users(self, users):
+        """Upserts user objects."""
+        rows = [_row(user, USER_COLUMNS) for user in users]
+        with self._lock, self._conn:
+            self._conn.executemany(_upsert_sql("users", USER_COLUMNS), rows)
+            for user in users:
+                if "emails" in user:
+                    self._conn.execute(
+                        "DELETE FROM user_emails WHERE user_id = ?",
+                        (user["id"],))
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO user_emails VALUES (?, ?)",
+                        [(user["id"], e.lower()) for e in user["emails"]])
+        return len(rows)
+
+    def upsert_messages(self, thread_id, messages):
+        """Upserts the given thread's messages."""
+        rows = [_row(dict(message, thread_id=thread_id), MESSAGE_COLUMNS)
+                for message in messages]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                _upsert_sql("messages", MESSAGE_COLUMNS), rows)
+        return len(rows)
+
+    def delete_thread(self, thread_id):
+        with self._lock, self._conn:
+            for sql in ("DELETE FROM threads WHERE id = ?",
+                        "DELETE FROM messages WHERE thread_id = ?",
+                        "DELETE FROM thread_users WHERE thread_id = ?",
+                        "DELETE FROM folder_children WHERE child_id = ?"):
+                self._conn.execute(sql, (thread_id,))
+
+    def query(self, sql, params=()):
+        """Runs a read query and returns the rows as dictionaries."""
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def get_thread(self, thread_id):
+        rows = self.query("SELECT * FROM threads WHERE id = ?", (thread_id,))
+        return rows[0] if rows else None
+
+    def get_threads_updated_since(self, updated_usec):
+        """Returns the threads updated after `updated_usec`, newest first."""
+        return self.query(
+            "SELECT * FROM threads WHERE updated_usec > ? "
+            "ORDER BY updated_usec DESC", (updated_usec,))
+
+    def get_folder_threads(self, folder_id):
+        """Returns the mirrored threads directly in the given folder."""
+        return self.query(
+            "SELECT t.* FROM folder_children c JOIN threads t "
+            "ON t.id = c.child_id WHERE c.folder_id = ? "
+            "ORDER BY t.updated_usec DESC", (folder_id,))
+
+    def get_thread_messages(self, thread_id):
+        """Returns the thread's mirrored messages, oldest first."""
+        return self.query(
+            "SELECT * FROM messages WHERE thread_id = ? "
+            "ORDER BY created_usec", (thread_id,))
+
+    def get_user_by_email(self, email):
+        rows = self.query(
+            "SELECT u.* FROM user_emails e JOIN users u ON u.id = e.user_id "
+            "WHERE e.email = ?", (email.lower(),))
+        return rows[0] if rows else None
+
+    def counts(self):
+        """Returns the number of rows in each entity table."""
+        return dict(
+            (table, self.query("SELECT COUNT(*) AS n FROM %s" % table)[0]["n"])
+            for table in ("threads", "folders", "users", "messages"))
+
+
+def _row(data, columns):
+    values = []
+    for column in columns:
+        value = data.get(column)
+        if isinstance(value, bool):
+            value = int(value)
+        values.append(value)
+    return values
@@ -0,0 +1,182 @@
+"""Parser backends that turn Quip document HTML into an `ElementTree`.
+
+Every backend returns an `<html>` root element whose children are the
+top-level sections of the document, built from the standard library
+`Element` class so the trees work with `xml.etree` helpers like `tostring`.
+
+    xml:  the strict expat parser; fastest, but raises on HTML that is not
+          well-formed XML (unclosed `<br>`, `&nbsp;`, ...)
+    html: a tolerant tree builder over the standard library `html.parser`
+    lxml: a tolerant tree builder over lxml's HTML parser, if installed
+    auto: `xml`, falling back to `lxml` (or `html` if lxml is not
+          installed) for documents that are not well-formed
+"""
+
+import html.parser
+import xml.etree.cElementTree
+
+VOID_TAGS = frozenset([
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+    "meta", "param", "source", "track", "wbr"])
+
+# Open elements implicitly closed by the start of another, e.g. `<li>`
+_IMPLIED_END = {
+    "dd": ("dd", "dt"),
+    "dt": ("dd", "dt"),
+    "li": ("li",),
+    "p": ("p",),
+    "td": ("td", "th"),
+    "th": ("td", "th"),
+    "tr": ("td", "th", "tr"),
+}
+
+
+def parse_xml(document_html):
+    """Parses well-formed document HTML with the strict XML parser."""
+    document_xml = "<html>" + document_html + "</html>"
+    return xml.etree.cElementTree.fromstring(document_xml.encode("utf-8"))
+
+
+class _HTMLTreeBuilder(html.parser.HTMLParser):
+    """Feeds `html.parser` events into an `ElementTree` `TreeBuilder`,
+    closing void and unclosed elements and dropping stray end tags."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._builder = xml.etree.cElementTree.TreeBuilder()
+        self._open = []
+
+    def handle_starttag(self, tag, attrs):
+        implied = _IMPLIED_END.get(tag, ())
+        while self._open and self._open[-1] in implied:
+            self._builder.end(self._open.pop())
+        self._builder.start(tag, dict(
+            (name, "" if value is None else value) for name, value in attrs))
+        if tag in VOID_TAGS:
+            self._builder.end(tag)
+        else:
+            self._open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in self._open:
+            return
+        while self._open:
+            open_tag = self._open.pop()
+            self._builder.end(open_tag)
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        self._builder.data(data)
+
+    def close(self):
+        super().close()
+        while self._open:
+            self._builder.end(self._open.pop())
+        return self._builder.close()
+
+
+class _EventRecorder:
+    """`TreeBuilder` wrapper recording the elements it starts and ends."""
+
+    def __init__(self, events):
+        self._builder = xml.etree.cElementTree.TreeBuilder()
+        self._events = events
+
+    def start(self, tag, attrs):
+        element = self._builder.start(tag, attrs)
+        self._events.append(("start", element))
+        return element
+
+    def end(self, tag):
+        element = self._builder.end(tag)
+        self._events.append(("end", element))
+        return element
+
+    def data(self, data):
+        self._builder.data(data)
+
+    def close(self):
+        return self._builder.close()
+
+
+class HTMLPullParser(_HTMLTreeBuilder):
+    """Tolerant counterpart of `XMLPullParser` for streaming: `feed` HTML
+    chunks, then `read_events` yields the `("start", element)` and
+    `("end", element)` events built so far."""
+
+    def __init__(self):
+        super().__init__()
+        self._events = []
+        self._builder = _EventRecorder(self._events)
+
+    def read_events(self):
+        events, self._events[:] = list(self._events), []
+        return iter(events)
+
+
+def parse_html(document_html):
+    """Parses document HTML with the tolerant `html.parser` tree builder."""
+    parser = _HTMLTreeBuilder()
+    parser.handle_starttag("html", [])
+    parser.feed(document_html)
+    return parser.close()
+
+
+def parse_lxml(document_html):
+    """Parses document HTML with lxml's tolerant HTML parser."""
+    import lxml.etree
+    parser = lxml.etree.HTMLParser(
+        target=xml.etree.cElementTree.TreeBuilder())
+    root = lxml.etree.fromstring(
+        "<html><body>" + document_html + "</body></html>", parser)
+    tree = xml.etree.cElementTree.Element("html")
+    body = root.find("body")
+    if body is not None:
+        tree.text = body.text
+        tree.extend(list(body))
+    return tree
+
+
+def lxml_available():
+    try:
+        import lxml.etree
+    except ImportError:
+        return False
+    return True
+
+
+def parse_auto(document_html):
+    """Parses document HTML with the strict parser, falling back to a
+    tolerant one if the document is not well-formed."""
+    try:
+        return parse_xml(document_html)
+    except xml.etree.cElementTree.ParseError:
+        if lxml_available():
+            return parse_lxml(document_html)
+        return parse_html(document_html)
+
+
+PARSERS = {
+    "auto": parse_auto,
+    "html": parse_html,
+    "lxml": parse_lxml,
+    "xml": parse_xml,
+}
+
+
+def get_parser(parser=None):
+    """Returns the parse function for a backend name, or `parser` itself if
+    it is already callable. Defaults to `auto`."""
+    if callable(parser):
+        return parser
+    try:
+        return PARSERS[parser or "auto"]
+    except KeyError:
+        raise ValueError("Unknown HTML parser %r, expected one of %s"
+                         % (parser, ", ".join(sorted(PARSERS))))
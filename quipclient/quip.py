@@ -1,8 +1,24 @@
-from .base import BaseQuipClient, QuipError
+from .base import BaseQuipClient, QuipError, URLError
+from .directory import UserDirectory
+from .documents import (
+    DocumentCache, ParsedDocument, chunk_sections, content_words)
+from .graph import MembershipIndex
+from .loader import BatchLoader
+from .mirror import SQLiteMirror
+from .parsers import get_parser, parse_auto, parse_xml
+from .search import SearchIndex
+from .spreadsheets import (
+    SpreadsheetColumns, SpreadsheetReader, chunk_rows, diff_spreadsheet,
+    find_inserted_row_id, format_cell_value, get_row_items, index_rows,
+    parse_row, render_rows)
+import collections
+import copy
 import datetime
+import hashlib
 import json
 import logging
 import os
+import socket
 import ssl
 import sys
 import time
@@ -35,7 +51,9 @@ class QuipClient(BaseQuipClient):
         BLUE = range(5)
 
     def __init__(self, access_token=None, client_id=None, client_secret=None,
-                 base_url=None, request_timeout=None, cache_dir=None):
+                 base_url=None, request_timeout=None, cache_dir=None,
+                 html_parser=None, transport=None, offline=False,
+                 offline_retention=False):
         """Constructs a Quip API client.
         If `access_token` is given, all of the API methods in the client
         will work to read and modify Quip documents.
@@ -43,20 +61,89 @@ class QuipClient(BaseQuipClient):
         Otherwise, only `get_authorization_url` and `get_access_token`
         work, and we assume the client is for a server using the Quip API's
         OAuth endpoint.
+
+        `html_parser` selects the backend used by `parse_document_html`:
+        "auto" (the default), "xml", "html", "lxml" or a function taking the
+        document HTML. See `quipclient.parsers`. The streaming spreadsheet
+        reader follows it, using its tolerant parser for every backend other
+        than "xml" and "auto".
+
+        `transport` replaces `urlopen` for API requests, e.g. to record or
+        replay traffic. See `quipclient.transport`.
+
+        If `offline` is True, every read is served from the cache alone;
+        see `set_offline`. The authenticated user is then the one last
+        authenticated online with the same token. `offline_retention` keeps
+        responses past their TTL, until the cache evicts them by size, so
+        offline clients can still read them with `ignore_ttl`.
         """
         super().__init__(access_token, client_id, client_secret, 
-                        base_url, request_timeout, cache_dir)
+                        base_url, request_timeout, cache_dir, transport,
+                        offline, offline_retention)
+
+        self.html_parser = get_parser(html_parser)
+
+        # Parsed documents shared by the section, list and spreadsheet
+        # helpers
+        self.document_cache = DocumentCache()
+
+        # Optional full-text index of every thread whose HTML passes through
+        # the client; see `enable_search_index`
+        self.search_index = None
+
+        # Optional index of the folder, thread and user memberships seen in
+        # responses and mutations; see `enable_membership_index`
+        self.membership_index = None
+
+        # Optional SQLite mirror of every entity seen; see `enable_mirror`
+        self.mirror = None
+
+        # Users and contacts for `get_user` and autocomplete
+        self.directory = UserDirectory(self)
+        self.add_response_observer(self._record_users)
         
         if self.access_token:
-            try:
-                self._user_id = self.get_authenticated_user()["id"]
-            except:
-                pass
+            # Remembered without expiry, so offline clients can find the
+            # entries of the user once users/current has expired
+            token_key = "token:" + hashlib.sha256(
+                self.access_token.encode()).hexdigest()[:16]
+            if self.offline:
+                self._user_id = self._cache_load(token_key)
+            if not self._user_id:
+                try:
+                    self._user_id = self.get_authenticated_user()["id"]
+                except:
+                    pass
+                else:
+                    if not self.offline:
+                        self._cache_store(token_key, self._user_id, None)
 
 
     def get_user(self, id, cache=True, cache_ttl=BaseQuipClient.ONE_HOUR):
-        """Returns the user with the given ID."""
-        return self._fetch_json("users/" + id, cache=cache, cache_ttl=cache_ttl)
+        """Returns the user with the given ID.
+
+        Users are served from `directory` or from the per-user entries
+        written by `get_users`, if they are younger than `cache_ttl`.
+        """
+        if cache or self.offline:
+            max_age = None if self.offline_ignore_ttl else cache_ttl
+            user = self.directory.get(id, max_age=max_age)
+            if user is not None:
+                return user
+            cache_key = self._cache_key(f"users/{id}")
+            cached, written = self._cache_load_entry(cache_key)
+            if cached and id in cached and (
+                    written is None or max_age is None or
+                    time.time() - written < max_age):
+                self.directory.add([cached[id]])
+                return cached[id]
+            if self.offline:
+                raise self._offline_miss([cache_key])
+        user = self._fetch_json("users/" + id, cache=False)
+        if cache:
+            self._cache_store(self._cache_key(f"users/{id}"), {id: user},
+                              cache_ttl)
+        return user
 
     def get_users(self, ids, cache=True, cache_ttl=BaseQuipClient.THIRTY_DAYS):
         """Returns a dictionary of users for the given IDs.
@@ -66,27 +153,70 @@ class QuipClient(BaseQuipClient):
         return self._cached_get("users", ids, None if not cache else cache_ttl, 
                               batch_size=self.MAX_USERS_PER_REQUEST, cache=cache)
 
+    def batch_loader(self, wait=None, cache=True):
+        """Returns a `BatchLoader` that batches single user, thread and
+        folder lookups into bulk requests.
+
+            with client.batch_loader() as loader:
+                authors = [loader.get_user(m["author_id"])
+                           for m in client.get_messages(thread_id)]
+            names = [author.result()["name"] for author in authors]
+
+        Args:
+            wait: Seconds to collect lookups before dispatching
+                automatically, or None to dispatch when the block exits
+            cache: Whether lookups use the cache
+        """
+        return BatchLoader(self, wait=wait, cache=cache)
+
     def update_user(self, user_id, picture_url=None):
         return self._fetch_json("users/update", post_data={
             "user_id": user_id,
             "picture_url": picture_url,
         })
 
-    def get_contacts(self):
+    def get_contacts(self, cache=True, cache_ttl=BaseQuipClient.ONE_HOUR):
         """Returns a list of the users in the authenticated user's contacts."""
-        return self._fetch_json("users/contacts")
-
-    def get_folder(self, id, cache=True, cache_ttl=BaseQuipClient.THIRTY_DAYS):
-        """Returns the folder with the given ID."""
-        return self._fetch_json("folders/" + id, cache=cache, cache_ttl=cache_ttl)
+        return self._fetch_json("users/contacts", cache=cache,
+                                cache_ttl=cache_ttl)
+
+    def search_users(self, query, count=10):
+        """Returns up to `count` users from `directory` whose name or email
+        matches `query`, without an API call. Call `directory.load()` first
+        to include every contact."""
+        return self.directory.search(query, count)
+
+    def _record_users(self, path, args, post_data, response):
+        """Response observer feeding `directory`."""
+        if not path.startswith("users/") or post_data:
+            return
+        if isinstance(response, list):
+            self.directory.add(response)
+        elif isinstance(response, dict):
+            self.directory.add(
+                [response] if "id" in response else response.values())
+
+    def get_folder(self, id, cache=True, cache_ttl=BaseQuipClient.THIRTY_DAYS,
+                   soft_ttl=None):
+        """Returns the folder with the given ID.
+
+        Past `soft_ttl` seconds, the cached folder is still returned but
+        refreshed in the background.
+        """
+        return self._fetch_json("folders/" + id, cache=cache, cache_ttl=cache_ttl,
+                                soft_ttl=soft_ttl)
 
-    def get_folders(self, ids, cache=True, cache_ttl=BaseQuipClient.THIRTY_DAYS):
+    def get_folders(self, ids, cache=True, cache_ttl=BaseQuipClient.THIRTY_DAYS,
+                    soft_ttl=None):
         """Returns a dictionary of folders for the given IDs.
         
         Uses caching to optimize repeated requests for the same folders.
+        Folders cached longer than `soft_ttl` seconds are still returned but
+        refreshed in the background.
         """
         return self._cached_get("folders", ids, None if not cache else cache_ttl,
-                              batch_size=self.MAX_FOLDERS_PER_REQUEST, cache=cache)
+                              batch_size=self.MAX_FOLDERS_PER_REQUEST, cache=cache,
+                              soft_ttl=soft_ttl)
 
     def new_folder(self, title, parent_id=None, color=None, member_ids=[]):
         return self._fetch_json("folders/new", post_data={
@@ -134,6 +264,81 @@ class QuipClient(BaseQuipClient):
             "messages/" + thread_id, max_created_usec=max_created_usec,
             count=count, cache=False)
 
+    def iter_message_history(self, thread_id, page_size=None, cache=True):
+        """Yields every message in the given thread, newest first.
+
+        Pages backwards through `get_messages` using `max_created_usec`.
+        Messages older than the newest page never change, so every full
+        older page is cached permanently, keyed by the thread and the
+        page's `max_created_usec` boundary. The newest page is always
+        refetched; it is also kept as the thread's "head" so that the next
+        run can stitch it onto the cached older pages without refetching
+        anything else.
+
+            client = quip.QuipClient(...)
+            for message in client.iter_message_history(thread_id):
+                print(message["text"])
+
+        Args:
+            thread_id: Thread ID to read messages from
+            page_size: Messages per request, at most
+                `MAX_MESSAGES_PER_REQUEST`
+            cache: Whether to read and write cached pages
+        """
+        count = page_size or self.MAX_MESSAGES_PER_REQUEST
+        head_key = self._cache_key(
+            self._url("messages/" + thread_id, count=count) + "#head")
+
+        if self.offline and cache:
+            # The newest page is never cached under its own URL
+            newest = self._cache_load(head_key)
+            if newest is None:
+                raise self._offline_miss([head_key])
+        else:
+            newest = self.get_messages(thread_id, count=count)
+        for message in newest:
+            yield message
+        if len(newest) < count:
+            if cache:
+                self._cache_store(head_key, newest, None)
+            return
+
+        previous = self._cache_load(head_key) if cache else None
+        if cache:
+            self._cache_store(head_key, newest, None)
+
+        page = newest
+        while True:
+            bottom = page[-1]["created_usec"]
+            boundary = bottom - 1
+            # Once a fetched page reaches the previous newest page, the
+            # messages of it older than this page are complete, so continue
+            # from its bottom. Until then keep paging backwards.
+            if previous and previous[0]["created_usec"] >= bottom:
+                seen = set(m["id"] for m in page)
+                for message in previous:
+                    if message["created_usec"] < bottom and \
+                            message["id"] not in seen:
+                        yield message
+                if len(previous) < count:
+                    return
+                boundary = previous[-1]["created_usec"] - 1
+                previous = None
+
+            page_key = self._cache_key(self._url(
+                "messages/" + thread_id, max_created_usec=boundary,
+                count=count))
+            page = self._cache_load(page_key) if cache else None
+            if page is None:
+                page = self.get_messages(
+                    thread_id, max_created_usec=boundary, count=count)
+                if cache and len(page) >= count:
+                    self._cache_store(page_key, page, None)
+            for message in page:
+                yield message
+            if len(page) < count:
+                return
+
     def new_message(self, thread_id, content=None, **kwargs):
         """Sends a message on the given thread.
 
@@ -146,20 +351,29 @@ class QuipClient(BaseQuipClient):
         args.update(kwargs)
         return self._fetch_json("messages/new", post_data=args, cache=False)
 
-    def get_thread(self, id, cache=True, cache_ttl=BaseQuipClient.THIRTY_DAYS):
-        """Returns the thread with the given ID using v1 API."""
-        return self._fetch_json("threads/" + id, cache=cache, cache_ttl=cache_ttl)
+    def get_thread(self, id, cache=True, cache_ttl=BaseQuipClient.THIRTY_DAYS,
+                   soft_ttl=None):
+        """Returns the thread with the given ID using v1 API.
 
-    def get_thread_v2(self, thread_id_or_path, cache=True, cache_ttl=None):
+        Past `soft_ttl` seconds, the cached thread is still returned but
+        refreshed in the background.
+        """
+        return self._fetch_json("threads/" + id, cache=cache, cache_ttl=cache_ttl,
+                                soft_ttl=soft_ttl)
+
+    def get_thread_v2(self, thread_id_or_path, cache=True, cache_ttl=None,
+                      soft_ttl=None):
         """Returns thread information using v2 API.
         
         Args:
             thread_id_or_path: Thread ID or secret path from thread URL
             cache: Whether to cache the response
             cache_ttl: Cache TTL in seconds
+            soft_ttl: Age in seconds after which the cached thread is still
+                returned but refreshed in the background
         """
         return self._fetch_json(f"2/threads/{thread_id_or_path}", 
-                              cache=cache, cache_ttl=cache_ttl)
+                              cache=cache, cache_ttl=cache_ttl, soft_ttl=soft_ttl)
 
     def get_threads_v2(self, ids, cache=True, cache_ttl=None):
         """Returns information about multiple threads using v2 API.
@@ -201,32 +415,56 @@ class QuipClient(BaseQuipClient):
                 raise
             raise TimeoutError(f"Request timed out after {timeout} seconds") from e
 
-    def get_thread_html_v2(self, thread_id_or_path, cache=True, cache_ttl=BaseQuipClient.ONE_DAY * 10):
+    def get_thread_html_v2(self, thread_id_or_path, cache=True, cache_ttl=BaseQuipClient.ONE_DAY * 10,
+                           soft_ttl=None):
         """Returns complete thread HTML content using v2 API.
         
         Args:
             thread_id_or_path: Thread ID or secret path
             cache: Whether to cache the response (default False)
             cache_ttl: Cache TTL in seconds (default 1 hour)
+            soft_ttl: Age in seconds after which the cached HTML is still
+                returned but refreshed in the background
             
         Returns:
             Combined results from all pages of HTML content.
         """
         # Try to get complete result from cache first
-        if cache:
-            url = self._url(f"2/threads/{thread_id_or_path}/html")
-            cache_key = f"{self._user_id or '_'}:{url}"
-            cached_data = self._cache.get(cache_key)
+        if cache or self.offline:
+            started = time.time()
+            path = f"2/threads/{thread_id_or_path}/html"
+            cache_key = self._cache_key(self._url(path))
+            cached_data, written = self._cache_load_entry(cache_key)
             if cached_data:
-                return json.loads(zlib.decompress(cached_data).decode())
+                stale = self._is_stale(path, cache_key, written, soft_ttl)
+                self._emit("cache_hit", path, stale=stale,
+                           seconds=time.time() - started)
+                self._notify_response(path, {}, None, cached_data,
+                                      cached=True)
+                if stale:
+                    self._schedule_refresh(
+                        cache_key, self._fetch_thread_html,
+                        thread_id_or_path, cache, cache_ttl, "refresh")
+                return cached_data
+            self._emit("cache_miss", path)
+            if self.offline:
+                raise self._offline_miss([cache_key])
+            return self._fetch_thread_html(
+                thread_id_or_path, cache, cache_ttl, "miss")
         
-        # If not cached or cache disabled, fetch all pages
+        return self._fetch_thread_html(thread_id_or_path, cache, cache_ttl)
+
+    def _fetch_thread_html(self, thread_id_or_path, cache, cache_ttl,
+                           cache_status="bypass"):
+        """Fetches all pages of thread HTML for `get_thread_html_v2`,
+        reporting `cache_status` as the cache outcome of each page."""
         result = {"html": "", "response_metadata": {"next_cursor": ""}}
         cursor = None
         
         while True:
             page = self._fetch_json(f"2/threads/{thread_id_or_path}/html",
-                                  cursor=cursor, cache=False)
+                                  cursor=cursor, cache=False,
+                                  cache_status=cache_status)
             
             if "html" in page:
                 result["html"] += page["html"]
@@ -238,23 +476,24 @@ class QuipClient(BaseQuipClient):
         # Cache the complete result if caching is enabled
         if cache:
             url = self._url(f"2/threads/{thread_id_or_path}/html")
-            cache_key = f"{self._user_id or '_'}:{url}"
-            self._cache.set(
-                cache_key,
-                zlib.compress(json.dumps(result).encode()),
-                cache_ttl
-            )
-                
+            self._cache_store(self._cache_key(url), result, cache_ttl)
+
+        self._notify_response(f"2/threads/{thread_id_or_path}/html", {},
+                              None, result)
         return result
 
 
-    def get_threads(self, ids, cache=True, cache_ttl=BaseQuipClient.THIRTY_DAYS):
+    def get_threads(self, ids, cache=True, cache_ttl=BaseQuipClient.THIRTY_DAYS,
+                    soft_ttl=None):
         """Returns a dictionary of threads for the given IDs.
         
         Uses caching to optimize repeated requests for the same threads.
+        Threads cached longer than `soft_ttl` seconds are still returned but
+        refreshed in the background.
         """
         return self._cached_get("threads", ids, None if not cache else cache_ttl,
-                              batch_size=self.MAX_THREADS_PER_REQUEST, cache=cache)
+                              batch_size=self.MAX_THREADS_PER_REQUEST, cache=cache,
+                              soft_ttl=soft_ttl)
 
     def get_recent_threads(self, max_updated_usec=None, count=None, **kwargs):
         """Returns the recently updated threads for a given user."""
@@ -268,6 +507,230 @@ class QuipClient(BaseQuipClient):
         return self._fetch_json("threads/search", query=query, count=count,
             only_match_titles=only_match_titles, **kwargs)
 
+    def enable_search_index(self, path=None):
+        """Indexes the HTML of every thread the client fetches, for
+        `search_local`.
+
+        Threads are indexed as their HTML is fetched, refreshed or served
+        from the cache through `get_thread`, `get_threads`,
+        `get_thread_html_v2` and document edits. Indexing parses each
+        changed document in the request path, so it is off until enabled.
+        The index is saved periodically and on `close`.
+
+            client = quip.QuipClient(...)
+            client.enable_search_index()
+            client.get_threads(thread_ids)
+            client.search_local("roadmap")
+
+        Args:
+            path: File the index is persisted to. Defaults to
+                `search_index.json.z` in the cache directory
+
+        Returns:
+            The `SearchIndex`
+        """
+        if self.search_index is None:
+            self.search_index = SearchIndex(
+                path or os.path.join(
+                    self._cache.directory, "search_index.json.z"),
+                parser=self.parse_document_html)
+            self.add_response_observer(self._index_response, cached=True)
+        return self.search_index
+
+    def search_local(self, query, count=10):
+        """Searches the threads this client has indexed, without an API call.
+
+        Enables the search index with its default path if needed; see
+        `enable_search_index`. Every query term must match; title matches
+        are boosted.
+
+        Returns:
+            Up to `count` results with `thread_id`, `title`, `score` and the
+            matching `section_ids`, best first.
+        """
+        return self.enable_search_index().search(query, count)
+
+    def _index_response(self, path, args, post_data, response):
+        """Response observer feeding `search_index`."""
+        if path == "threads/delete":
+            self.search_index.remove_thread(post_data["thread_id"])
+            return
+        if path.startswith("2/threads/") and path.endswith("/html"):
+            # Pages are indexed once combined by `_fetch_thread_html`
+            if "cursor" not in args:
+                self.search_index.add_thread(
+                    path[len("2/threads/"):-len("/html")], response["html"])
+            return
+        if not path.startswith("threads/"):
+            return
+        if isinstance(response, dict) and "thread" in response:
+            threads = [response]
+        elif isinstance(response, dict):
+            threads = response.values()
+        elif isinstance(response, list):
+            threads = response
+        else:
+            return
+        for thread in threads:
+            if not isinstance(thread, dict) or "html" not in thread or \
+                    not isinstance(thread.get("thread"), dict):
+                continue
+            info = thread["thread"]
+            self.search_index.add_thread(
+                info["id"], thread["html"], info.get("title"),
+                info.get("updated_usec"))
+
+    def enable_membership_index(self, path=None):
+        """Records the folder, thread and user memberships seen in responses,
+        including those served from the cache, and in mutations, answering
+        membership questions without API calls.
+
+        The index is saved periodically and on `close`.
+
+            client = quip.QuipClient(...)
+            index = client.enable_membership_index()
+            client.get_folders(folder_ids)
+            index.get_descendants(folder_id)
+
+        Args:
+            path: File the index is persisted to. Defaults to
+                `membership_index.json.z` in the cache directory
+
+        Returns:
+            The `MembershipIndex`
+        """
+        if self.membership_index is None:
+            self.membership_index = MembershipIndex(path or os.path.join(
+                self._cache.directory, "membership_index.json.z"))
+            self.add_response_observer(self._record_membership, cached=True)
+        return self.membership_index
+
+    def _record_membership(self, path, args, post_data, response):
+        """Response observer feeding `membership_index`."""
+        index = self.membership_index
+        if path == "folders/add-members":
+            index.add_folder_members(
+                post_data["folder_id"], post_data["member_ids"].split(","))
+        elif path == "folders/remove-members":
+            index.remove_folder_members(
+                post_data["folder_id"], post_data["member_ids"].split(","))
+        elif path == "threads/add-members":
+            index.add_thread_members(
+                post_data["thread_id"], post_data["member_ids"].split(","))
+        elif path == "threads/remove-members":
+            index.remove_thread_members(
+                post_data["thread_id"], post_data["member_ids"].split(","))
+        elif path == "threads/delete":
+            index.remove(post_data["thread_id"])
+        elif path.startswith("2/threads/") and path.endswith("/folders"):
+            index.set_thread_folders(
+                path[len("2/threads/"):-len("/folders")],
+                [f["folder_id"] for f in response.get("folders", [])],
+                complete=False)
+        elif not isinstance(response, dict):
+            return
+        elif path.startswith("folders/"):
+            folders = [response] if "folder" in response else \
+                response.values()
+            for folder in folders:
+                if not isinstance(folder, dict) or "folder" not in folder:
+                    continue
+                children = folder.get("children")
+                index.set_folder(
+                    folder["folder"]["id"],
+                    thread_ids=None if children is None else [
+                        c["thread_id"] for c in children if "thread_id" in c],
+                    subfolder_ids=None if children is None else [
+                        c["folder_id"] for c in children if "folder_id" in c],
+                    member_ids=folder.get("member_ids"),
+                    parent_id=folder["folder"].get("parent_id") or
+                    (post_data or {}).get("parent_id"))
+        elif path.startswith("threads/"):
+            threads = [response] if "thread" in response else \
+                response.values()
+            for thread in threads:
+                if isinstance(thread, dict) and "shared_folder_ids" in thread:
+                    # Responses only list shared folders, so they never
+                    # remove the thread from private ones
+                    index.set_thread_folders(
+                        thread["thread"]["id"], thread["shared_folder_ids"],
+                        complete=False)
+        elif path.startswith("users/"):
+            users = [response] if "id" in response else response.values()
+            for user in users:
+                if isinstance(user, dict) and "shared_folder_ids" in user:
+                    index.set_user_folders(
+                        user["id"], user["shared_folder_ids"])
+
+    def enable_mirror(self, path=None):
+        """Mirrors every thread, folder, user and message the client fetches
+        or serves from its cache into normalized SQLite tables, for
+        reporting queries that should touch neither the API nor the
+        response cache.
+
+            client = quip.QuipClient(...)
+            mirror = client.enable_mirror("quip.sqlite3")
+            client.get_threads(thread_ids)
+            mirror.get_threads_updated_since(since_usec)
+
+        Args:
+            path: SQLite database file. Defaults to `mirror.sqlite3` in the
+                cache directory
+
+        Returns:
+            The `SQLiteMirror`
+        """
+        if self.mirror is None:
+            self.mirror = SQLiteMirror(path or os.path.join(
+                self._cache.directory, "mirror.sqlite3"))
+            self.add_response_observer(self._mirror_response, cached=True)
+        return self.mirror
+
+    def close(self):
+        """Saves the local indexes, closes the mirror and the response cache.
+
+        The client must not be used after.
+        """
+        for index in (self.search_index, self.membership_index):
+            if index is not None:
+                index.close()
+        if self.mirror is not None:
+            self.mirror.close()
+        super().close()
+
+    def _mirror_response(self, path, args, post_data, response):
+        """Response observer feeding `mirror`."""
+        mirror = self.mirror
+        if path == "threads/delete":
+            mirror.delete_thread(post_data["thread_id"])
+        elif path.startswith("messages/"):
+            if path == "messages/new":
+                mirror.upsert_messages(post_data["thread_id"], [response])
+            elif isinstance(response, list):
+                mirror.upsert_messages(path[len("messages/"):], response)
+        elif isinstance(response, list):
+            if path == "users/contacts":
+                mirror.upsert_users(response)
+            elif path.startswith("threads/"):
+                mirror.upsert_threads(
+                    [t for t in response if "thread" in t])
+        elif not isinstance(response, dict) or \
+                path.endswith(("/html", "/folders", "-members")):
+            return
+        elif path.startswith(("threads/", "2/threads/")):
+            threads = [response] if "thread" in response else [
+                t for t in response.values()
+                if isinstance(t, dict) and ("thread" in t or "id" in t)]
+            mirror.upsert_threads(threads)
+        elif path.startswith("folders/"):
+            mirror.upsert_folders([response] if "folder" in response else [
+                f for f in response.values()
+                if isinstance(f, dict) and "folder" in f])
+        elif path.startswith("users/") and path != "users/update":
+            mirror.upsert_users([response] if "id" in response else [
+                u for u in response.values()
+                if isinstance(u, dict) and "id" in u])
+
     def add_thread_members(self, thread_id, member_ids):
         """Adds the given folder or user IDs to the given thread."""
         return self._fetch_json("threads/add-members", post_data={
@@ -313,6 +776,7 @@ class QuipClient(BaseQuipClient):
             user = client.get_authenticated_user()
             client.new_document(..., member_ids=[user["archive_folder_id"]])
 
+        For content larger than a few MB, use `new_large_document`.
         """
         return self._fetch_json("threads/new-document", post_data={
             "content": content,
@@ -321,6 +785,113 @@ class QuipClient(BaseQuipClient):
             "member_ids": ",".join(member_ids),
         }, cache=False)
 
+    def new_large_document(self, content, format="html", title=None,
+                           member_ids=[], max_chunk_bytes=512 * 1024,
+                           retries=3, retry_delay=1, on_progress=None):
+        """Creates a document from content too large for one request.
+
+        The content is split on section boundaries into pieces of at most
+        `max_chunk_bytes`. The document is created with the first piece and
+        the rest are appended in order with `edit_document`. Each piece is
+        retried up to `retries` times, with exponential backoff starting at
+        `retry_delay` seconds, when the API answers with 429 or 503 or the
+        request times out. Neither request is idempotent, so other errors
+        are not retried, and before an append is retried the thread is
+        re-read to check whether the failed request was applied anyway.
+        Whether a timed out `new-document` was applied cannot be checked,
+        so the first piece is only retried on 429.
+
+        `on_progress`, if given, is called with the upload stats after each
+        piece.
+
+        Returns:
+            The response of the last request, with an `upload` entry holding
+            `chunks`, `bytes`, `retries`, `seconds` and `bytes_per_second`.
+        """
+        stats = {"chunks": 0, "bytes": 0, "retries": 0, "seconds": 0.0,
+                 "bytes_per_second": 0.0}
+        start = time.time()
+        response = None
+        for chunk in chunk_sections(content, max_chunk_bytes, format):
+            if response is None:
+                response = self._retry_edit(
+                    stats, retries, retry_delay, None, self.new_document,
+                    chunk, format=format, title=title, member_ids=member_ids)
+                thread_id = response["thread"]["id"]
+            else:
+                previous = response
+                response = self._retry_edit(
+                    stats, retries, retry_delay,
+                    lambda: self._get_appended_thread(
+                        thread_id, previous, chunk, format),
+                    self.edit_document, thread_id, chunk,
+                    operation=self.APPEND, format=format)
+            stats["chunks"] += 1
+            stats["bytes"] += len(chunk.encode("utf-8"))
+            stats["seconds"] = time.time() - start
+            if stats["seconds"]:
+                stats["bytes_per_second"] = stats["bytes"] / stats["seconds"]
+            if on_progress:
+                on_progress(dict(stats))
+        if response is None:
+            response = self.new_document(
+                content, format=format, title=title, member_ids=member_ids)
+        response["upload"] = stats
+        return response
+
+    def _retry_edit(self, stats, retries, retry_delay, applied, func, *args,
+                    **kwargs):
+        """Calls `func`, a request that is not idempotent, retrying it on
+        429 and 503 answers and on timeouts.
+
+        A 503 or a timeout does not mean the request was not applied, so
+        before retrying those `applied` is called, and the response it
+        returns, if any, is used instead of retrying. Without `applied`
+        only 429 answers, which are never applied, are retried.
+        """
+        retried = (429, 503) if applied is not None else (429,)
+        for attempt in range(retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except QuipError as error:
+                if attempt == retries or error.code not in retried:
+                    raise
+                code, path = error.code, getattr(error, "path", "")
+            except (socket.timeout, URLError):
+                if attempt == retries or applied is None:
+                    raise
+                code, path = 503, ""
+            if code != 429 and applied is not None:
+                response = applied()
+                if response is not None:
+                    return response
+            stats["retries"] += 1
+            delay = retry_delay * 2 ** attempt
+            self._emit("retry", path, attempt=attempt + 1, code=code,
+                       delay=delay)
+            time.sleep(delay)
+
+    def _get_appended_thread(self, thread_id, previous, chunk, format):
+        """Returns the thread, freshly fetched, if `chunk` was appended to it
+        since the `previous` edit response was received, or None.
+
+        The thread must have changed and its text must end with the text of
+        `chunk`, so a concurrent edit by someone else is not mistaken for
+        the append.
+        """
+        thread = self.get_thread(thread_id, cache=False)
+        words = content_words(chunk, format)
+        if words and \
+                content_words(thread.get("html") or "")[-len(words):] != words:
+            return None
+        if previous.get("html") is not None:
+            changed = thread.get("html") != previous["html"]
+        else:
+            updated_usec = previous.get("thread", {}).get("updated_usec")
+            changed = updated_usec is not None and updated_usec != \
+                thread.get("thread", {}).get("updated_usec")
+        return thread if changed else None
+
     def copy_document(self, thread_id, folder_ids=None, member_ids=None,
             title=None, values=None, **kwargs):
         """Copies the given document, optionally replaces template variables
@@ -348,14 +919,12 @@ class QuipClient(BaseQuipClient):
         Impersonates the commentors if the access token used has
         permission, but does not add them to the thread.
         """
-        import re
         threads = self.get_threads(children_ids + [original_id])
-        original_section_ids = re.findall(r" id='([a-zA-Z0-9]{11})'",
-                                          threads[original_id]["html"])
+        original_section_ids = self._get_thread_document(
+            original_id, threads[original_id]).section_ids
         for thread_id in children_ids:
-            thread = threads[thread_id]
-            child_section_ids = re.findall(r" id='([a-zA-Z0-9]{11})'",
-                                           thread["html"])
+            document = self._get_thread_document(thread_id, threads[thread_id])
+            child_section_ids = document.section_ids
             parent_map = dict(zip(child_section_ids, original_section_ids))
             messages = self.get_messages(thread_id)
             for message in reversed(messages):
@@ -376,11 +945,8 @@ class QuipClient(BaseQuipClient):
                         section_id = message["annotation"][
                             "highlight_section_ids"][0]
                     else:
-                        anno_loc = thread["html"].find(
-                            '<annotation id="%s"' % message["annotation"]["id"])
-                        loc = thread["html"].rfind("id=", 0, anno_loc)
-                        if anno_loc >= 0 and loc >= 0:
-                            section_id = thread["html"][loc + 4:loc + 15]
+                        section_id = document.get_annotation_section(
+                            message["annotation"]["id"])
                     if section_id and section_id in parent_map:
                         kwargs["section_id"] = parent_map[section_id]
                 if "files" in message:
@@ -424,6 +990,7 @@ class QuipClient(BaseQuipClient):
             client = quip.QuipClient(...)
             client.add_to_first_list(thread_id, "Try the Quip API")
 
+        To add to another list, use `add_to_list`.
         """
         items = [item.replace("\n", " ") for item in items]
         args = {
@@ -443,6 +1010,53 @@ class QuipClient(BaseQuipClient):
             args["content"] = "\n\n".join(["    * %s" % i for i in items])
         return self.edit_document(**args)
 
+    def add_to_list(self, thread_id, items, list_id=None, index=0,
+                    document_html=None, add_to_top=False):
+        """Adds the given items to a list in one edit.
+
+        The list is the one with ID `list_id`, or the `index`-th list in the
+        document. If the document has no such list, a new bulleted list is
+        appended.
+
+            client = quip.QuipClient(...)
+            client.add_to_list(thread_id, ["Write docs", "Ship"], index=-1)
+
+        """
+        items = [item.replace("\n", " ") for item in items]
+        if not items:
+            return None
+        document = self._get_document(thread_id, document_html)
+        list_tree = None
+        if document is not None:
+            if list_id:
+                list_tree = document.get_section(list_id)
+            else:
+                lists = document.get_elements("ul")
+                try:
+                    list_tree = lists[index]
+                except IndexError:
+                    pass
+        section_id = None
+        operation = self.AFTER_SECTION
+        if list_tree is not None:
+            if add_to_top:
+                section_id = self.get_first_list_item_id(list_tree)
+                operation = self.BEFORE_SECTION
+            else:
+                section_id = self.get_last_list_item_id(list_tree)
+        if not section_id:
+            return self.edit_document(
+                thread_id=thread_id,
+                content="\n\n".join(["    * %s" % i for i in items]),
+                format="markdown",
+                operation=self.APPEND)
+        return self.edit_document(
+            thread_id=thread_id,
+            content="\n\n".join(items),
+            format="markdown",
+            section_id=section_id,
+            operation=operation)
+
     def add_to_spreadsheet(self, thread_id, *rows, **kwargs):
         """Adds the given rows to the named (or first) spreadsheet in the
         given document.
@@ -450,9 +1064,9 @@ class QuipClient(BaseQuipClient):
             client = quip.QuipClient(...)
             client.add_to_spreadsheet(thread_id, ["5/1/2014", 2.24])
 
+        For many rows, use `bulk_add_to_spreadsheet`.
         """
-        content = "".join(["<tr>%s</tr>" % "".join(
-            ["<td>%s</td>" % cell for cell in row]) for row in rows])
+        content = render_rows(rows)
         if kwargs.get("name"):
             spreadsheet = self.get_named_spreadsheet(kwargs["name"], thread_id)
         else:
@@ -469,6 +1083,91 @@ class QuipClient(BaseQuipClient):
             section_id=section_id,
             operation=operation)
 
+    def bulk_add_to_spreadsheet(self, thread_id, rows, name=None,
+                                add_to_top=False, max_chunk_bytes=256 * 1024,
+                                on_progress=None, resume=None):
+        """Adds many rows to the named (or first) spreadsheet in chunks.
+
+        Rows are rendered like `add_to_spreadsheet` and split into chunks of
+        at most `max_chunk_bytes`. Each chunk is inserted after the last row
+        of the previous one, whose ID is read from the HTML returned by the
+        previous edit, so the document is not reparsed between chunks.
+
+        After every committed chunk, `on_progress` is called with a state
+        dict (`rows_committed`, `rows_total`, `chunks_committed`,
+        `bytes_committed`, `last_row_id`). If a chunk fails, pass the last
+        state back as `resume` with the same `rows` to continue after the
+        last committed chunk.
+
+            client = quip.QuipClient(...)
+            state = {}
+            try:
+                client.bulk_add_to_spreadsheet(
+                    thread_id, rows, on_progress=state.update)
+            except quip.QuipError:
+                client.bulk_add_to_spreadsheet(
+                    thread_id, rows, resume=state)
+
+        Returns:
+            The final progress state.
+        """
+        rows = list(rows)
+        if resume:
+            state = dict(resume)
+            state["rows_total"] = len(rows)
+        else:
+            state = {
+                "rows_committed": 0,
+                "rows_total": len(rows),
+                "chunks_committed": 0,
+                "bytes_committed": 0,
+                "last_row_id": None,
+            }
+        section_id = state["last_row_id"]
+        operation = self.AFTER_SECTION
+        if section_id is None:
+            if name:
+                spreadsheet = self.get_named_spreadsheet(name, thread_id)
+            else:
+                spreadsheet = self.get_first_spreadsheet(thread_id)
+            if add_to_top:
+                section_id = self.get_first_row_item_id(spreadsheet)
+                operation = self.BEFORE_SECTION
+            else:
+                section_id = self.get_last_row_item_id(spreadsheet)
+
+        for chunk, content in chunk_rows(rows[state["rows_committed"]:],
+                                         max_chunk_bytes):
+            response = self.edit_document(
+                thread_id=thread_id,
+                content=content,
+                section_id=section_id,
+                operation=operation)
+            last_row_id = find_inserted_row_id(
+                (response or {}).get("html") or "", section_id, len(chunk),
+                before=operation == self.BEFORE_SECTION)
+            if last_row_id is None:
+                # The response did not include the new rows; fall back to
+                # the live document.
+                document = self.get_thread(thread_id, cache=False)
+                last_row_id = find_inserted_row_id(
+                    document.get("html") or "", section_id, len(chunk),
+                    before=operation == self.BEFORE_SECTION)
+            state["rows_committed"] += len(chunk)
+            state["chunks_committed"] += 1
+            state["bytes_committed"] += len(content.encode("utf-8"))
+            state["last_row_id"] = last_row_id
+            if on_progress:
+                on_progress(dict(state))
+            if last_row_id is None and \
+                    state["rows_committed"] < state["rows_total"]:
+                raise QuipError(
+                    0, "Could not find the rows inserted after %s"
+                    % section_id, None)
+            section_id = last_row_id
+            operation = self.AFTER_SECTION
+        return state
+
     def update_spreadsheet_row(self, thread_id, header, value, updates, **args):
         """Finds the row where the given header column is the given value, and
         applies the given updates. Updates is a dict from header to
@@ -506,10 +1205,181 @@ class QuipClient(BaseQuipClient):
                 thread_id, spreadsheet, updates, headers=headers, **args)
         return response
 
+    def update_spreadsheet_rows(self, thread_id, key_header, records,
+                                max_rows_per_edit=200, **args):
+        """Bulk version of `update_spreadsheet_row`.
+
+        `records` is a list of dicts from header to new value, each
+        including `key_header`. The document is fetched and parsed once and
+        rows are looked up through a hash index of the key column. Only
+        cells whose value differs are replaced (the edit API takes one
+        section per request), repeated records for the same key are merged,
+        and all records without a matching row are appended together in
+        chunks of `max_rows_per_edit` rows.
+
+            client = quip.QuipClient(...)
+            client.update_spreadsheet_rows(thread_id, "customer", [
+                {"customer": "Acme", "Billed": "6/24/2015"},
+                {"customer": "Initech", "Billed": "7/1/2015"},
+            ])
+
+        Returns:
+            Dictionary with the number of `updated`, `unchanged` and
+            `inserted` rows, the number of edit `requests` sent and the
+            last edit `response`.
+        """
+        spreadsheet = self._get_current_spreadsheet(
+            thread_id, args.get("name"))
+        headers = self.get_spreadsheet_header_items(spreadsheet)
+        key_index = self.get_index_of_header(headers, key_header)
+        rows = index_rows(spreadsheet, key_index)
+
+        merged = collections.OrderedDict()
+        for record in records:
+            key = str(record[key_header])
+            merged.setdefault(key.lower(), {}).update(record)
+
+        result = {"updated": 0, "unchanged": 0, "inserted": 0,
+                  "requests": 0, "response": None}
+        missing = []
+        for key, updates in merged.items():
+            row = rows.get(key)
+            if row is None:
+                missing.append(updates)
+                continue
+            ids = self.get_row_ids(row)
+            current = self.get_row_items(row)
+            changes = collections.OrderedDict()
+            for head, val in updates.items():
+                index = self.get_index_of_header(headers, head)
+                if not index or index >= len(ids) or not ids[index]:
+                    continue
+                if (current[index] or "").replace(u"\u200b", "") != str(val):
+                    changes[ids[index]] = val
+            for section_id, val in changes.items():
+                result["response"] = self.edit_document(
+                    thread_id=thread_id,
+                    content=val,
+                    format="markdown",
+                    section_id=section_id,
+                    operation=self.REPLACE_SECTION,
+                    **args)
+                self._invalidate_thread(thread_id)
+                result["requests"] += 1
+            result["updated" if changes else "unchanged"] += 1
+
+        if missing:
+            section_id = self.get_last_row_item_id(spreadsheet)
+            chunks = [missing[i:i + max_rows_per_edit]
+                      for i in range(0, len(missing), max_rows_per_edit)]
+            # Every chunk goes right after the same anchor row, so insert the
+            # last chunk first to keep the records in order.
+            for chunk in reversed(chunks):
+                result["response"] = self.edit_document(
+                    thread_id=thread_id,
+                    content="".join(self._spreadsheet_row_html(headers, u)
+                                    for u in chunk),
+                    section_id=section_id,
+                    operation=self.AFTER_SECTION,
+                    **args)
+                self._invalidate_thread(thread_id)
+                result["requests"] += 1
+            result["inserted"] = len(missing)
+        return result
+
+    def sync_spreadsheet(self, thread_id, desired, key_header=None,
+                         dry_run=False, max_rows_per_edit=200, **args):
+        """Makes the named (or first) spreadsheet match `desired` with the
+        fewest edits.
+
+        `desired` is a list of dicts from header to value; see
+        `spreadsheets.diff_spreadsheet` for how rows are matched with and
+        without `key_header`. Cells are only replaced when their content
+        differs, new rows are inserted in groups next to their neighbours,
+        and rows no longer wanted are deleted.
+
+            client = quip.QuipClient(...)
+            patch = client.sync_spreadsheet(
+                thread_id, records, key_header="customer", dry_run=True)
+            print(patch.as_dict())
+
+        Args:
+            thread_id: Thread containing the spreadsheet
+            desired: List of dicts from header to value
+            key_header: Header identifying rows, or None to match rows by
+                position
+            dry_run: Only compute the plan, without sending any edits
+            max_rows_per_edit: Maximum rows inserted per request
+
+        Returns:
+            The `SpreadsheetPatch`, with the edit responses in `responses`
+            unless `dry_run` is set.
+        """
+        spreadsheet = self._get_current_spreadsheet(
+            thread_id, args.get("name"))
+        headers = self.get_spreadsheet_header_items(spreadsheet)
+        patch = diff_spreadsheet(self.parse_spreadsheet_contents(spreadsheet),
+                                 desired, key_header=key_header,
+                                 max_rows_per_edit=max_rows_per_edit)
+        if dry_run:
+            return patch
+
+        for section_id, value in patch.replacements:
+            patch.responses.append(self.edit_document(
+                thread_id=thread_id,
+                content=format_cell_value(value),
+                format="markdown",
+                section_id=section_id,
+                operation=self.REPLACE_SECTION,
+                **args))
+            self._invalidate_thread(thread_id)
+        for where, section_id, rows in patch.inserts:
+            if section_id is None:
+                section_id = self.get_last_row_item_id(spreadsheet)
+            operation = self.AFTER_SECTION if where == "after" \
+                else self.BEFORE_SECTION
+            chunks = [rows[i:i + max_rows_per_edit]
+                      for i in range(0, len(rows), max_rows_per_edit)]
+            # Chunks share one anchor, so send them in the order that leaves
+            # the rows in sequence.
+            if operation == self.AFTER_SECTION:
+                chunks.reverse()
+            for chunk in chunks:
+                patch.responses.append(self.edit_document(
+                    thread_id=thread_id,
+                    content="".join(self._spreadsheet_row_html(headers, row)
+                                    for row in chunk),
+                    section_id=section_id,
+                    operation=operation,
+                    **args))
+                self._invalidate_thread(thread_id)
+        for section_id in patch.deletes:
+            patch.responses.append(self.edit_document(
+                thread_id=thread_id,
+                content="",
+                section_id=section_id,
+                operation=self.DELETE_SECTION,
+                **args))
+            self._invalidate_thread(thread_id)
+        return patch
+
     def add_spreadsheet_row(
             self, thread_id, spreadsheet, updates, headers=None, **args):
         if not headers:
             headers = self.get_spreadsheet_header_items(spreadsheet)
+        content = self._spreadsheet_row_html(headers, updates)
+        section_id = self.get_last_row_item_id(spreadsheet)
+        response = self.edit_document(
+            thread_id=thread_id,
+            content=content,
+            section_id=section_id,
+            operation=self.AFTER_SECTION,
+            **args)
+        return response
+
+    def _spreadsheet_row_html(self, headers, updates):
+        """Returns the `<tr>` HTML for a new row from a dict of header to
+        value. Values for unknown headers fill the gaps, then trail."""
         indexed_items = {}
         extra_items = []
         for head, val in updates.items():
@@ -529,16 +1399,8 @@ class QuipClient(BaseQuipClient):
                 else:
                     cells.append("")
         cells.extend(extra_items)
-        content = "<tr>%s</tr>" % "".join(
+        return "<tr>%s</tr>" % "".join(
             ["<td>%s</td>" % cell for cell in cells])
-        section_id = self.get_last_row_item_id(spreadsheet)
-        response = self.edit_document(
-            thread_id=thread_id,
-            content=content,
-            section_id=section_id,
-            operation=self.AFTER_SECTION,
-            **args)
-        return response
 
     def toggle_checkmark(self, thread_id, item, checked=True):
         """Sets the checked state of the given list item to the given state.
@@ -548,15 +1410,82 @@ class QuipClient(BaseQuipClient):
             client.toggle_checkmark(thread_id, list[0])
 
         """
+        # Edits a copy, since `item` may belong to a shared parsed document.
+        item = copy.deepcopy(item)
         if checked:
             item.attrib["class"] = "checked"
         else:
             item.attrib["class"] = ""
         return self.edit_document(thread_id=thread_id,
-                                  content=xml.etree.cElementTree.tostring(item),
+                                  content=xml.etree.cElementTree.tostring(
+                                      item, encoding="unicode"),
                                   section_id=item.attrib["id"],
                                   operation=self.REPLACE_SECTION)
 
+    def toggle_checkmarks(self, thread_id, items, checked=True,
+                          document_html=None):
+        """Sets the checked state of many list items with as few edits as
+        possible.
+
+        `items` are list item IDs or `ElementTree`s. The document is fetched
+        uncached and parsed once, since whole lists are rewritten from it.
+        Items already in the requested state are skipped, and a list whose
+        items all change is replaced in a single edit; otherwise each
+        changed item is replaced on its own, leaving the others untouched.
+
+            client = quip.QuipClient(...)
+            items = client.get_first_list(thread_id).iter("li")
+            client.toggle_checkmarks(thread_id, items)
+
+        Returns:
+            The responses of the edits that were sent.
+        """
+        document = self._get_document(thread_id, document_html, cache=False)
+        if document is None:
+            return []
+        state = "checked" if checked else ""
+        changes = collections.OrderedDict()
+        for item in items:
+            item_id = item if isinstance(item, str) else item.attrib["id"]
+            element = document.get_section(item_id)
+            if element is None:
+                raise QuipError(0, "No list item %s in thread %s"
+                                % (item_id, thread_id), None)
+            if element.attrib.get("class", "") == state:
+                continue
+            parent = document.get_parent(item_id)
+            pending = changes.setdefault(parent, [])
+            if item_id not in pending:
+                pending.append(item_id)
+
+        responses = []
+        for parent, item_ids in changes.items():
+            parent_id = parent.attrib.get("id")
+            if len(item_ids) > 1 and parent_id and all(
+                    element.attrib.get("id") in item_ids
+                    for element in parent.iter("li")):
+                section = copy.deepcopy(parent)
+                sections = [section]
+                for element in section.iter("li"):
+                    if element.attrib.get("id") in item_ids:
+                        element.attrib["class"] = state
+            else:
+                # Copies, since the parsed document may be shared.
+                sections = [copy.deepcopy(document.get_section(i))
+                            for i in item_ids]
+                for section in sections:
+                    section.attrib["class"] = state
+            for section in sections:
+                section.tail = None
+                responses.append(self.edit_document(
+                    thread_id=thread_id,
+                    content=xml.etree.cElementTree.tostring(
+                        section, encoding="unicode"),
+                    section_id=section.attrib["id"],
+                    operation=self.REPLACE_SECTION))
+                self._invalidate_thread(thread_id)
+        return responses
+
     def get_first_list(self, thread_id=None, document_html=None):
         """Returns the `ElementTree` of the first list in the document.
 
@@ -572,34 +1501,22 @@ class QuipClient(BaseQuipClient):
         return self._get_container(thread_id, document_html, "ul", -1)
 
     def get_section(self, section_id, thread_id=None, document_html=None):
-        if not document_html:
-            document_html = self.get_thread(thread_id).get("html")
-            if not document_html:
-                return None
-        tree = self.parse_document_html(document_html)
-        element = list(tree.iterfind(".//*[@id='%s']" % section_id))
-        if not element:
+        document = self._get_document(thread_id, document_html)
+        if document is None:
             return None
-        return element[0]
+        return document.get_section(section_id)
 
     def get_named_spreadsheet(self, name, thread_id=None, document_html=None):
-        if not document_html:
-            document_html = self.get_thread(thread_id).get("html")
-            if not document_html:
-                return None
-        tree = self.parse_document_html(document_html)
-        element = list(tree.iterfind(".//*[@title='%s']" % name))
-        if not element:
+        document = self._get_document(thread_id, document_html)
+        if document is None:
             return None
-        return element[0]
+        return document.titles.get(name)
 
     def _get_container(self, thread_id, document_html, container, index):
-        if not document_html:
-            document_html = self.get_thread(thread_id).get("html")
-            if not document_html:
-                return None
-        tree = self.parse_document_html(document_html)
-        lists = list(tree.iter(container))
+        document = self._get_document(thread_id, document_html)
+        if document is None:
+            return None
+        lists = document.get_elements(container)
         if not lists:
             return None
         try:
@@ -643,7 +1560,7 @@ class QuipClient(BaseQuipClient):
 
     def get_row_items(self, row_tree):
         """Returns the text of items in the given row `ElementTree`."""
-        return [(list(x.itertext()) or [None])[0] for x in row_tree]
+        return get_row_items(row_tree)
 
     def get_row_ids(self, row_tree):
         """Returns the ids of items in the given row `ElementTree`."""
@@ -691,40 +1608,114 @@ class QuipClient(BaseQuipClient):
         """Returns a python-friendly representation of the given spreadsheet
         `ElementTree`
         """
-        import collections
         spreadsheet = {
             "id": spreadsheet_tree.attrib.get("id"),
             "headers": self.get_spreadsheet_header_items(spreadsheet_tree),
             "rows": [],
         }
         for row in spreadsheet_tree.iterfind(".//tr"):
-            value = {
-                "id": row.attrib.get("id"),
-                "cells": collections.OrderedDict(),
-            }
-            for i, cell in enumerate(row):
-                if cell.tag != "td":
-                    continue
-                data = {
-                    "id": cell.attrib.get("id"),
-                }
-                images = list(cell.iter("img"))
-                if images:
-                    data["content"] = images[0].attrib.get("src")
-                else:
-                    data["content"] = list(cell.itertext())[0].replace(
-                        u"\u200b", "")
-                style = cell.attrib.get("style")
-                if style and "background-color:#" in style:
-                    sharp = style.find("#")
-                    data["color"] = style[sharp + 1:sharp + 7]
-                value["cells"][spreadsheet["headers"][i]] = data
+            value = parse_row(row, spreadsheet["headers"])
             if len(value["cells"]):
                 spreadsheet["rows"].append(value)
         return spreadsheet
 
+    def iter_spreadsheet_rows(self, thread_id=None, document_html=None,
+                              name=None, index=0):
+        """Returns a `SpreadsheetReader` that streams the rows of the named
+        (or `index`-th) spreadsheet without building the document tree.
+
+        Rows have the same shape as those of `parse_spreadsheet_contents`.
+        `document_html` may also be an iterable of HTML chunks.
+
+            client = quip.QuipClient(...)
+            reader = client.iter_spreadsheet_rows(thread_id, name="Tracker")
+            for row in reader:
+                ...
+        """
+        if document_html is None:
+            document_html = self.get_thread(thread_id).get("html") or ""
+        return SpreadsheetReader(document_html, name=name, index=index,
+                                 parser=self._streaming_parser())
+
+    def _streaming_parser(self):
+        """Returns the `SpreadsheetReader` parser matching `html_parser`."""
+        if self.html_parser is parse_xml:
+            return "xml"
+        if self.html_parser is parse_auto:
+            return "auto"
+        return "html"
+
+    def get_spreadsheet_columns(self, thread_id=None, document_html=None,
+                                name=None, index=0):
+        """Returns the named (or `index`-th) spreadsheet as a
+        `SpreadsheetColumns`, with one list per header instead of a dict per
+        row and cell. Use `to_numpy` or `to_csv` on the result for NumPy
+        arrays or CSV.
+
+            client = quip.QuipClient(...)
+            columns = client.get_spreadsheet_columns(thread_id)
+            amounts = columns.to_numpy(float, headers=["Amount"])["Amount"]
+            total = numpy.nansum(amounts)
+        """
+        reader = self.iter_spreadsheet_rows(
+            thread_id, document_html, name=name, index=index)
+        columns = SpreadsheetColumns.from_rows(reader.iter_row_elements())
+        columns.id = reader.id
+        return columns
+
+    def _get_document(self, thread_id, document_html, cache=True):
+        """Returns a `ParsedDocument` for `document_html`, or for the given
+        thread's HTML. With `cache` False the thread is always refetched,
+        for edits that must be computed from the current document.
+        """
+        if document_html:
+            return ParsedDocument(self.parse_document_html(document_html),
+                                  len(document_html))
+        return self._get_thread_document(
+            thread_id, self.get_thread(thread_id, cache=cache))
+
+    def _get_current_spreadsheet(self, thread_id, name=None):
+        """Returns the named (or first) spreadsheet of the thread's current,
+        uncached HTML."""
+        document = self._get_document(thread_id, None, cache=False)
+        if document is None:
+            return None
+        if name:
+            return document.titles.get(name)
+        tables = document.get_elements("table")
+        return tables[0] if tables else None
+
+    def _invalidate_thread(self, thread_id):
+        """Drops the cached thread response and parsed document of a thread
+        after editing it."""
+        self._cache.delete(self._cache_key(self._url("threads/" + thread_id)))
+        self.document_cache.invalidate(thread_id)
+
+    def _get_thread_document(self, thread_id, thread):
+        """Returns a `ParsedDocument` for a thread response, or None if it
+        has no HTML.
+
+        Documents are shared through `document_cache`, keyed by the
+        thread's `updated_usec`, so repeated helper calls on an unchanged
+        document skip both the fetch and the parse. Treat elements from a
+        shared document as read-only.
+        """
+        document_html = thread.get("html")
+        if not document_html:
+            return None
+        updated_usec = thread.get("thread", {}).get("updated_usec")
+        if updated_usec is None:
+            return ParsedDocument(self.parse_document_html(document_html),
+                                  len(document_html))
+        document = self.document_cache.get(thread_id, updated_usec)
+        if document is None:
+            document = ParsedDocument(
+                self.parse_document_html(document_html), len(document_html))
+            self.document_cache.put(
+                thread_id, updated_usec, document, len(document_html))
+        return document
+
     def parse_document_html(self, document_html):
         """Returns an `ElementTree` for the given Quip document HTML"""
-        document_xml = "<html>" + document_html + "</html>"
-        return xml.etree.cElementTree.fromstring(document_xml.encode("utf-8"))
+        return self.html_parser(document_html)
 
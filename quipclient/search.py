@@ -0,0 +1,193 @@
+"""Local full-text index over thread HTML seen by the client."""
+
+import collections
+import hashlib
+import math
+import re
+
+from .parsers import get_parser
+from .storage import PersistentIndex
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    """Returns the lower-cased word tokens of the given text."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def section_texts(tree):
+    """Returns `{section_id: text}` for a parsed document, attributing each
+    piece of text to the innermost enclosing element with an ID. Text
+    outside any section is keyed by ""."""
+    texts = collections.defaultdict(list)
+    stack = [(child, "") for child in reversed(tree)]
+    if tree.text:
+        texts[""].append(tree.text)
+    while stack:
+        element, parent_id = stack.pop()
+        section_id = parent_id
+        element_id = element.attrib.get("id")
+        if element_id and element.tag != "annotation":
+            section_id = element_id
+        if element.text:
+            texts[section_id].append(element.text)
+        if element.tail:
+            texts[parent_id].append(element.tail)
+        for child in reversed(element):
+            stack.append((child, section_id))
+    return dict((k, " ".join(v)) for k, v in texts.items())
+
+
+class SearchIndex(PersistentIndex):
+    """Inverted index of thread titles and sections.
+
+    Postings map each term to the threads containing it, with the term's
+    count in the title and in each section, so queries return matching
+    section IDs as well as threads. Threads are reindexed only when their
+    `updated_usec` or their HTML changes.
+
+    The index is persisted as compressed JSON at `path`, written at most
+    every `autosave_interval` seconds as threads are indexed, and on `save`.
+    """
+
+    TITLE_BOOST = 3.0
+
+    def __init__(self, path=None, parser=None, autosave_interval=30):
+        """Initialize the index.
+
+        Args:
+            path: File to persist the index to, or None to keep it in memory
+            parser: Function parsing document HTML into an `ElementTree`
+            autosave_interval: Minimum seconds between automatic saves, or
+                None to only save on `save`
+        """
+        super().__init__(path, autosave_interval)
+        self.parser = get_parser(parser)
+        self._docs = {}
+        self._postings = {}
+
+    def _snapshot(self):
+        return {"docs": self._docs, "postings": self._postings}
+
+    def _restore(self, data):
+        self._docs = data["docs"]
+        self._postings = data["postings"]
+
+    def add_thread(self, thread_id, document_html=None, title=None,
+                   updated_usec=None):
+        """Indexes (or reindexes) a thread.
+
+        If the thread is already indexed at the same `updated_usec`, or from
+        the same HTML, this is a no-op. A missing `title` keeps the
+        previously indexed title.
+        """
+        digest = document_html and hashlib.sha1(
+            document_html.encode("utf-8")).hexdigest()
+        with self._lock:
+            self._ensure_loaded()
+            doc = self._docs.get(thread_id)
+            if doc and updated_usec is not None and \
+                    doc["updated_usec"] == updated_usec:
+                return
+            if doc and digest and doc.get("digest") == digest and \
+                    title in (None, doc["title"]):
+                return
+            if title is None and doc:
+                title = doc["title"]
+            texts = {}
+            if document_html:
+                texts = section_texts(self.parser(document_html))
+            self._remove(thread_id)
+
+            counts = collections.defaultdict(lambda: [0, {}])
+            for token in tokenize(title or ""):
+                counts[token][0] += 1
+            for section_id, text in texts.items():
+                for token in tokenize(text):
+                    sections = counts[token][1]
+                    sections[section_id] = sections.get(section_id, 0) + 1
+            for term, posting in counts.items():
+                self._postings.setdefault(term, {})[thread_id] = posting
+            self._docs[thread_id] = {
+                "title": title,
+                "updated_usec": updated_usec,
+                "digest": digest,
+                "terms": list(counts),
+            }
+            self._changed()
+
+    def remove_thread(self, thread_id):
+        with self._lock:
+            self._ensure_loaded()
+            if self._remove(thread_id):
+                self._changed()
+
+    def _remove(self, thread_id):
+        doc = self._docs.pop(thread_id, None)
+        if doc is None:
+            return False
+        for term in doc["terms"]:
+            threads = self._postings.get(term)
+            if threads is not None:
+                threads.pop(thread_id, None)
+                if not threads:
+                    del self._postings[term]
+        return True
+
+    def search(self, query, count=10):
+        """Returns the threads containing every term of `query`, best first.
+
+        Each result has `thread_id`, `title`, `score` and `section_ids`, the
+        sections containing query terms ordered by how many they contain.
+        """
+        terms = list(collections.OrderedDict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            self._ensure_loaded()
+            postings = [self._postings.get(t, {}) for t in terms]
+            if not all(postings):
+                return []
+            postings.sort(key=len)
+            thread_ids = set(postings[0])
+            for threads in postings[1:]:
+                thread_ids.intersection_update(threads)
+            total = len(self._docs)
+            results = []
+            for thread_id in thread_ids:
+                score = 0.0
+                section_hits = collections.Counter()
+                for threads in postings:
+                    title_count, sections = threads[thread_id]
+                    idf = math.log(1.0 + total / float(len(threads)))
+                    count_in_thread = self.TITLE_BOOST * title_count + \
+                        sum(sections.values())
+                    score += idf * (1.0 + math.log(count_in_thread))
+                    section_hits.update(sections)
+                results.append({
+                    "thread_id": thread_id,
+                    "title": self._docs[thread_id]["title"],
+                    "score": score,
+                    "section_ids": [s for s, _ in section_hits.most_common()
+                                    if s],
+                })
+        results.sort(key=lambda r: (-r["score"], r["thread_id"]))
+        return results[:count]
+
+    def clear(self):
+        with self._lock:
+            self._loaded = True
+            self._docs = {}
+            self._postings = {}
+            self._dirty = True
+
+    def __contains__(self, thread_id):
+        with self._lock:
+            self._ensure_loaded()
+            return thread_id in self._docs
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._docs)
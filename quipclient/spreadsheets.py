@@ -0,0 +1,518 @@
+"""Helpers for reading and editing Quip spreadsheets."""
+
+import collections
+import itertools
+import re
+import xml.etree.cElementTree
+
+from .parsers import HTMLPullParser
+
+_ROW_ID_RE = re.compile(r"<tr\b[^>]*?\sid=['\"]([^'\"]+)['\"]")
+
+
+def get_row_items(row_tree):
+    """Returns the text of items in the given row `ElementTree`."""
+    return [(list(x.itertext()) or [None])[0] for x in row_tree]
+
+
+def find_inserted_row_id(document_html, anchor_id, count, before=False):
+    """Returns the ID of the last of `count` rows just inserted after (or
+    before) the row `anchor_id`, by scanning the `<tr>` tags of the
+    document HTML returned by an edit instead of parsing it.
+
+    Returns None if the anchor or the inserted rows cannot be found.
+    """
+    for quote in ("'", '"'):
+        anchor = document_html.find("id=%s%s%s" % (quote, anchor_id, quote))
+        if anchor >= 0:
+            break
+    else:
+        return None
+    if before:
+        start = document_html.rfind("<tr", 0, anchor)
+        match = None
+        for match in _ROW_ID_RE.finditer(document_html, 0, start):
+            pass
+        return match.group(1) if match else None
+    for i, match in enumerate(_ROW_ID_RE.finditer(document_html, anchor)):
+        if i == count - 1:
+            return match.group(1)
+    return None
+
+
+def render_rows(rows):
+    """Returns the `<tr>` HTML for rows given as lists of cell values."""
+    return "".join(["<tr>%s</tr>" % "".join(
+        ["<td>%s</td>" % cell for cell in row]) for row in rows])
+
+
+def chunk_rows(rows, max_bytes):
+    """Yields `(rows, content)` chunks whose rendered HTML is at most
+    `max_bytes` UTF-8 bytes, except for single rows that are larger."""
+    chunk = []
+    parts = []
+    size = 0
+    for row in rows:
+        html = render_rows([row])
+        row_size = len(html.encode("utf-8"))
+        if chunk and size + row_size > max_bytes:
+            yield chunk, "".join(parts)
+            chunk, parts, size = [], [], 0
+        chunk.append(row)
+        parts.append(html)
+        size += row_size
+    if chunk:
+        yield chunk, "".join(parts)
+
+
+def index_rows(spreadsheet_tree, key_index):
+    """Returns a dict from the lower-cased text of each row's `key_index`
+    cell to the row `ElementTree`, keeping the first row for each key."""
+    rows = {}
+    for row in spreadsheet_tree.iterfind(".//tr"):
+        if len(row) <= key_index:
+            continue
+        cell = row[key_index]
+        if cell.tag != "td":
+            continue
+        text = (list(cell.itertext()) or [""])[0]
+        rows.setdefault(text.lower(), row)
+    return rows
+
+
+def parse_cell(cell):
+    """Returns the `(id, content, color)` of a spreadsheet cell.
+
+    `content` is the source of the cell's first image, or its first text
+    without zero-width spaces. `color` is the hex background color, or None.
+    """
+    images = list(cell.iter("img"))
+    if images:
+        content = images[0].attrib.get("src")
+    else:
+        content = (list(cell.itertext()) or [""])[0].replace(u"\u200b", "")
+    color = None
+    style = cell.attrib.get("style")
+    if style and "background-color:#" in style:
+        sharp = style.find("#")
+        color = style[sharp + 1:sharp + 7]
+    return cell.attrib.get("id"), content, color
+
+
+def parse_row(row_tree, headers):
+    """Returns the python-friendly representation of a spreadsheet row, as
+    used by `QuipClient.parse_spreadsheet_contents`.
+
+    Only `td` cells are included, keyed by the header of their column.
+    """
+    value = {
+        "id": row_tree.attrib.get("id"),
+        "cells": collections.OrderedDict(),
+    }
+    for i, cell in enumerate(row_tree):
+        if cell.tag != "td":
+            continue
+        cell_id, content, color = parse_cell(cell)
+        data = {
+            "id": cell_id,
+            "content": content,
+        }
+        if color is not None:
+            data["color"] = color
+        value["cells"][headers[i]] = data
+    return value
+
+
+def _xml_pull_parser():
+    return xml.etree.cElementTree.XMLPullParser(events=("start", "end"))
+
+
+class SpreadsheetReader:
+    """Streams the rows of one spreadsheet out of document HTML.
+
+    The HTML is fed to an incremental parser in chunks. Each row is
+    converted as soon as its closing tag is seen and then removed from the
+    tree, so memory stays proportional to a single row rather than to the
+    whole document. Rows have the same shape as the `rows` returned by
+    `QuipClient.parse_spreadsheet_contents`; `id` and `headers` are set
+    once the table and its first row have been read.
+
+        reader = SpreadsheetReader(document_html, name="Tracker")
+        for row in reader:
+            print(row["cells"][reader.headers[1]]["content"])
+
+    `parser` mirrors the backends of `quipclient.parsers`: "xml" streams
+    with the strict `XMLPullParser` and raises on HTML that is not
+    well-formed XML, "html" streams with the tolerant `HTMLPullParser`,
+    and "auto" streams strictly, restarting tolerantly from the first row
+    not yet yielded if the document turns out not to be well-formed.
+    Chunked input cannot be restarted, so "auto" reads it tolerantly.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, document_html, name=None, index=0, parser="xml"):
+        """Initialize the reader.
+
+        Args:
+            document_html: Document HTML, either a string or an iterable
+                of string chunks
+            name: Title of the spreadsheet to read. Defaults to the
+                spreadsheet at `index`
+            index: Position of the spreadsheet among the document's
+                tables, used when `name` is not given
+            parser: "xml", "html" or "auto"
+        """
+        if parser not in ("auto", "html", "xml"):
+            raise ValueError("Unknown streaming parser %r, expected one of "
+                             "auto, html, xml" % (parser,))
+        self.document_html = document_html
+        self.name = name
+        self.index = index
+        self.parser = parser
+        self.id = None
+        self.headers = None
+        self.found = False
+
+    def _chunks(self):
+        yield "<html>"
+        if isinstance(self.document_html, str):
+            for i in range(0, len(self.document_html), self.CHUNK_SIZE):
+                yield self.document_html[i:i + self.CHUNK_SIZE]
+        else:
+            for chunk in self.document_html:
+                yield chunk
+        yield "</html>"
+
+    def _is_target(self, table, tables_seen):
+        if self.name is not None:
+            return table.attrib.get("title") == self.name
+        return tables_seen == self.index
+
+    def __iter__(self):
+        for row in self.iter_row_elements():
+            value = parse_row(row, self.headers)
+            if len(value["cells"]):
+                yield value
+
+    def iter_row_elements(self):
+        """Yields each `tr` element of the spreadsheet, header row
+        included. Elements are removed from the tree once the consumer
+        moves on."""
+        if self.parser == "xml":
+            return self._iter_row_elements(_xml_pull_parser())
+        if self.parser == "auto" and isinstance(self.document_html, str):
+            return self._iter_auto()
+        return self._iter_row_elements(HTMLPullParser())
+
+    def _iter_auto(self):
+        yielded = 0
+        try:
+            for row in self._iter_row_elements(_xml_pull_parser()):
+                yielded += 1
+                yield row
+            return
+        except xml.etree.cElementTree.ParseError:
+            pass
+        self.id = self.headers = None
+        self.found = False
+        rows = self._iter_row_elements(HTMLPullParser())
+        for row in itertools.islice(rows, yielded, None):
+            yield row
+
+    def _iter_row_elements(self, parser):
+        stack = []
+        table = None
+        tables_seen = 0
+        for chunk in self._chunks():
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                if event == "start":
+                    if table is None and element.tag == "table":
+                        if self._is_target(element, tables_seen):
+                            table = element
+                            self.found = True
+                            self.id = element.attrib.get("id")
+                        tables_seen += 1
+                    stack.append(element)
+                    continue
+
+                stack.pop()
+                parent = stack[-1] if stack else None
+                if table is not None and element.tag == "tr":
+                    if self.headers is None:
+                        self.headers = get_row_items(element)
+                    yield element
+                    parent.remove(element)
+                elif element is table:
+                    return
+                elif table is None and len(stack) == 1:
+                    # Drop finished top-level elements outside the table
+                    parent.remove(element)
+        parser.close()
+
+
+class SpreadsheetColumns:
+    """Column-oriented contents of a spreadsheet.
+
+    Instead of a dict per row and per cell, every header maps to one list
+    of cell contents, with parallel lists of cell IDs and colors. Rows
+    without `td` cells (such as the header row) are skipped, and missing
+    cells are None, so all lists have one entry per row in `row_ids`.
+
+    Attributes:
+        id: ID of the spreadsheet
+        headers: Header row items
+        row_ids: Row IDs in document order
+        columns: Header to list of cell contents
+        cell_ids: Header to list of cell IDs
+        colors: Header to list of hex background colors
+    """
+
+    def __init__(self, headers, id=None):
+        self.id = id
+        self.headers = list(headers)
+        self.row_ids = []
+        self._contents = [[] for _ in self.headers]
+        self._ids = [[] for _ in self.headers]
+        self._colors = [[] for _ in self.headers]
+
+    @classmethod
+    def from_rows(cls, row_elements, headers=None, id=None):
+        """Builds columns from an iterable of `tr` elements. The first row
+        supplies the headers unless `headers` is given."""
+        columns = None
+        for row in row_elements:
+            if columns is None:
+                columns = cls(headers if headers is not None
+                              else get_row_items(row), id)
+            columns.append_row(row)
+        return columns if columns is not None else cls(headers or [], id)
+
+    def append_row(self, row_tree):
+        """Appends a `tr` element if it has any `td` cells."""
+        cells = [(i, cell) for i, cell in enumerate(row_tree)
+                 if cell.tag == "td" and i < len(self.headers)]
+        if not cells:
+            return
+        n = len(self.row_ids)
+        self.row_ids.append(row_tree.attrib.get("id"))
+        for i, cell in cells:
+            cell_id, content, color = parse_cell(cell)
+            self._pad(i, n)
+            self._contents[i].append(content)
+            self._ids[i].append(cell_id)
+            self._colors[i].append(color)
+        for i in range(len(self.headers)):
+            self._pad(i, n + 1)
+
+    def _pad(self, i, length):
+        missing = length - len(self._contents[i])
+        if missing > 0:
+            self._contents[i].extend([None] * missing)
+            self._ids[i].extend([None] * missing)
+            self._colors[i].extend([None] * missing)
+
+    def _by_header(self, lists):
+        return collections.OrderedDict(zip(self.headers, lists))
+
+    @property
+    def columns(self):
+        return self._by_header(self._contents)
+
+    @property
+    def cell_ids(self):
+        return self._by_header(self._ids)
+
+    @property
+    def colors(self):
+        return self._by_header(self._colors)
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    def to_numpy(self, dtype=object, headers=None):
+        """Returns the columns as a dict of header to NumPy array.
+
+        For float and complex dtypes, empty and missing cells become NaN.
+        Pass `headers` to convert only those columns, e.g. the numeric ones.
+        Requires the 'numpy' module.
+        """
+        import numpy
+        blank = numpy.dtype(dtype).kind in "fc"
+        arrays = collections.OrderedDict()
+        for header, values in zip(self.headers, self._contents):
+            if headers is not None and header not in headers:
+                continue
+            if blank:
+                values = [numpy.nan if v is None or
+                          not v.replace(u"\u200b", "").strip() else v
+                          for v in values]
+            arrays[header] = numpy.array(values, dtype=dtype)
+        return arrays
+
+    def to_csv(self, f=None, include_header=True):
+        """Writes the columns as CSV to the file-like object `f`, or
+        returns the CSV as a string if `f` is None."""
+        import csv
+        import io
+        out = f if f is not None else io.StringIO()
+        writer = csv.writer(out)
+        if include_header:
+            writer.writerow(["" if h is None else h for h in self.headers])
+        writer.writerows(zip(*self._contents))
+        if f is None:
+            return out.getvalue()
+
+
+class SpreadsheetPatch:
+    """The edits that make a spreadsheet match a desired table.
+
+    Attributes:
+        replacements: List of `(cell_id, value)` cell replacements
+        inserts: List of `(operation, section_id, rows)` groups, where
+            `rows` is a list of dicts from sheet header to value inserted
+            together relative to `section_id`. `operation` is "after" or
+            "before"
+        deletes: List of row IDs to delete
+        unknown_headers: Desired headers that match no sheet header
+        max_rows_per_edit: Maximum rows inserted per request when the patch
+            is applied, or None to insert each group in one request
+    """
+
+    def __init__(self, max_rows_per_edit=None):
+        self.max_rows_per_edit = max_rows_per_edit
+        self.replacements = []
+        self.inserts = []
+        self.deletes = []
+        self.unknown_headers = []
+        self.responses = []
+
+    @property
+    def inserted_rows(self):
+        return sum(len(rows) for _, _, rows in self.inserts)
+
+    def request_count(self, max_rows_per_edit=None):
+        """Returns the number of edit requests needed to apply the patch.
+
+        `max_rows_per_edit` defaults to the patch's own chunk size.
+        """
+        max_rows_per_edit = max_rows_per_edit or self.max_rows_per_edit
+        inserts = 0
+        for _, _, rows in self.inserts:
+            if max_rows_per_edit:
+                inserts += -(-len(rows) // max_rows_per_edit)
+            else:
+                inserts += 1
+        return len(self.replacements) + inserts + len(self.deletes)
+
+    def __bool__(self):
+        return bool(self.replacements or self.inserts or self.deletes)
+
+    def as_dict(self, max_rows_per_edit=None):
+        return {
+            "replacements": len(self.replacements),
+            "inserted_rows": self.inserted_rows,
+            "deleted_rows": len(self.deletes),
+            "requests": self.request_count(max_rows_per_edit),
+            "unknown_headers": list(self.unknown_headers),
+        }
+
+
+def format_cell_value(value):
+    """Returns the text a cell holding `value` reads back as."""
+    return "" if value is None else str(value)
+
+
+def diff_spreadsheet(spreadsheet, desired, key_header=None,
+                     max_rows_per_edit=None):
+    """Returns the `SpreadsheetPatch` that turns `spreadsheet` into the
+    `desired` table.
+
+    Args:
+        spreadsheet: Spreadsheet as returned by
+            `QuipClient.parse_spreadsheet_contents`
+        desired: List of dicts from header to value. Headers match the
+            sheet's exactly or, failing that, case-insensitively
+        key_header: Header identifying rows. Rows are matched by
+            case-insensitive key and missing rows are inserted next to the
+            desired row before them; sheet rows with a non-empty key that
+            is not desired are deleted. Without a key, rows are matched by
+            position and extra rows are appended or deleted at the end.
+        max_rows_per_edit: Maximum rows inserted per request, used to count
+            the requests the patch needs
+    """
+    patch = SpreadsheetPatch(max_rows_per_edit)
+    headers = [h for h in spreadsheet["headers"] if h is not None]
+    lower_headers = dict((h.lower(), h) for h in reversed(headers))
+
+    def map_header(header):
+        if header in headers:
+            return header
+        mapped = lower_headers.get(str(header).lower())
+        if mapped is None and header not in patch.unknown_headers:
+            patch.unknown_headers.append(header)
+        return mapped
+
+    wanted = []
+    for record in desired:
+        row = collections.OrderedDict()
+        for header, value in record.items():
+            mapped = map_header(header)
+            if mapped is not None:
+                row[mapped] = value
+        wanted.append(row)
+
+    rows = spreadsheet["rows"]
+    if key_header is not None:
+        key = map_header(key_header)
+        existing = collections.OrderedDict()
+        for row in rows:
+            cell = row["cells"].get(key)
+            text = cell["content"].lower() if cell else ""
+            if text and text not in existing:
+                existing[text] = row
+        matches = [existing.get(format_cell_value(w.get(key)).lower())
+                   for w in wanted]
+    else:
+        matches = rows[:len(wanted)] + [None] * (len(wanted) - len(rows))
+
+    matched_ids = set(m["id"] for m in matches if m is not None)
+    first_kept = next((m for m in matches if m is not None), None)
+    anchor = None
+    pending = []
+
+    def flush():
+        if not pending:
+            return
+        if anchor is not None:
+            patch.inserts.append(("after", anchor, list(pending)))
+        elif first_kept is not None and key_header is not None:
+            patch.inserts.append(("before", first_kept["id"], list(pending)))
+        elif rows:
+            patch.inserts.append(("after", rows[-1]["id"], list(pending)))
+        else:
+            patch.inserts.append(("after", None, list(pending)))
+        del pending[:]
+
+    for row, match in zip(wanted, matches):
+        if match is None:
+            pending.append(row)
+            continue
+        flush()
+        anchor = match["id"]
+        for header, value in row.items():
+            cell = match["cells"].get(header)
+            if cell is not None and cell["content"] != format_cell_value(value):
+                patch.replacements.append((cell["id"], value))
+    flush()
+
+    for row in rows:
+        if row["id"] in matched_ids:
+            continue
+        if key_header is not None:
+            cell = row["cells"].get(key)
+            if not (cell and cell["content"]):
+                continue
+        patch.deletes.append(row["id"])
+    return patch
@@ -0,0 +1,72 @@
+"""Persistence shared by the client's local indexes."""
+
+import json
+import os
+import threading
+import time
+import zlib
+
+
+class PersistentIndex:
+    """Base class for in-memory indexes persisted as compressed JSON.
+
+    Subclasses implement `_snapshot`, returning the JSON-serializable state,
+    and `_restore`, loading it back, and call `_ensure_loaded` before
+    reading and `_changed` after writing, both under `_lock`. The file is
+    loaded lazily and written at most every `autosave_interval` seconds as
+    the index changes, and on `save` and `close`, which owners should call
+    before exiting.
+    """
+
+    def __init__(self, path=None, autosave_interval=30):
+        """Initialize the index.
+
+        Args:
+            path: File to persist the index to, or None to keep it in memory
+            autosave_interval: Minimum seconds between automatic saves, or
+                None to only save on `save`
+        """
+        self.path = path
+        self.autosave_interval = autosave_interval
+        self._loaded = False
+        self._dirty = False
+        self._saved_at = time.time()
+        self._lock = threading.RLock()
+
+    def _snapshot(self):
+        raise NotImplementedError
+
+    def _restore(self, data):
+        raise NotImplementedError
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            self._restore(json.loads(zlib.decompress(f.read()).decode("utf-8")))
+
+    def _changed(self):
+        self._dirty = True
+        if self.path and self.autosave_interval is not None and \
+                time.time() - self._saved_at >= self.autosave_interval:
+            self.save()
+
+    def save(self):
+        """Writes the index to `path` if it changed since the last save."""
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            data = json.dumps(self._snapshot()).encode("utf-8")
+            tmp_path = "%s.%d.tmp" % (self.path, threading.get_ident())
+            with open(tmp_path, "wb") as f:
+                f.write(zlib.compress(data))
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            self._saved_at = time.time()
+
+    def close(self):
+        """Saves pending changes. The index stays usable afterwards."""
+        self.save()
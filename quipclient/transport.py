@@ -0,0 +1,269 @@
+"""Transports recording API traffic to a log and replaying it offline.
+
+    recorder = RecordingTransport("traffic.jsonl.gz")
+    client = QuipClient(access_token=token, transport=recorder)
+    ...
+    recorder.close()
+
+    replay = ReplayTransport("traffic.jsonl.gz", speed=10)
+    client = QuipClient(access_token="replay", transport=replay)
+    ...
+    replay.requests, replay.misses
+
+Each exchange is one JSON line: the request method, URL and body, the
+response status, headers and body, when it was sent and how long it took.
+Logs whose path ends in ".gz" are gzip-compressed; every record is flushed
+as it is written, so a log cut short by a crash stays readable up to its
+last complete record. Access tokens and client secrets are replaced by
+"REDACTED" in URLs, request bodies and response bodies, OAuth codes in
+URLs and request bodies, and the Authorization header is never recorded.
+"""
+
+import base64
+import collections
+import gzip
+import io
+import json
+import threading
+import time
+import zlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from . import base
+
+REDACTED = "REDACTED"
+
+# Response fields holding credentials
+SECRET_KEYS = frozenset([
+    "access_token", "client_secret", "refresh_token",
+])
+
+# Query and form parameters holding credentials, including the OAuth
+# verification code; responses use "code" for other things
+SECRET_PARAMS = SECRET_KEYS | frozenset(["code"])
+
+
+class ReplayMissError(Exception):
+    """Raised by `ReplayTransport` for a request that is not in the log."""
+
+    def __init__(self, method, url):
+        Exception.__init__(self, "No recorded response for %s %s"
+                           % (method, url))
+        self.method = method
+        self.url = url
+
+
+class RecordedResponse:
+    """File-like response returned by the transports, with the `code`,
+    `status` and `headers` attributes of a `urlopen` response."""
+
+    def __init__(self, url, status, headers, body):
+        self.url = url
+        self.code = self.status = status
+        self.headers = headers
+        self._body = io.BytesIO(body)
+
+    def read(self, size=-1):
+        return self._body.read(size)
+
+    def getcode(self):
+        return self.code
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+def redact_url(url):
+    """Returns the URL with credential query parameters redacted."""
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    return urlunsplit(parts._replace(query=_redact_query(parts.query)))
+
+
+def _redact_query(query):
+    return urlencode([(k, REDACTED if k in SECRET_PARAMS else v)
+                      for k, v in parse_qsl(query, keep_blank_values=True)])
+
+
+def _redact_json(value):
+    if isinstance(value, dict):
+        return dict((k, REDACTED if k in SECRET_KEYS else _redact_json(v))
+                    for k, v in value.items())
+    if isinstance(value, list):
+        return [_redact_json(v) for v in value]
+    return value
+
+
+def _redact_body(body):
+    """Returns a response body with credential fields redacted."""
+    try:
+        data = json.loads(body.decode("utf-8"))
+    except ValueError:
+        return body
+    if not isinstance(data, (dict, list)):
+        return body
+    redacted = _redact_json(data)
+    if redacted == data:
+        return body
+    return json.dumps(redacted).encode("utf-8")
+
+
+def _recorded_headers(headers):
+    return dict((k, v) for k, v in (headers or {}).items()
+                if k.lower() not in ("set-cookie", "authorization"))
+
+
+def _encode(body):
+    try:
+        return body.decode("utf-8")
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(body).decode("ascii")}
+
+
+def _decode(body):
+    if isinstance(body, dict):
+        return base64.b64decode(body["base64"])
+    return body.encode("utf-8")
+
+
+def _request_key(request):
+    """Returns the redacted `(method, url, body)` of a `Request`."""
+    data = request.data
+    if isinstance(data, bytes):
+        data = data.decode("utf-8", "replace")
+    return (request.get_method(), redact_url(request.full_url),
+            _redact_query(data) if data else None)
+
+
+def read_log(path):
+    """Yields the records of a log, ignoring a truncated last record."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return
+        except (EOFError, zlib.error):
+            return
+
+
+class RecordingTransport:
+    """Sends requests through `transport` (by default `urlopen`) and
+    appends each exchange to the log at `path`."""
+
+    def __init__(self, path, transport=None):
+        self.path = path
+        self.transport = transport
+        self.records = 0
+        self._started = time.time()
+        self._lock = threading.Lock()
+        if path.endswith(".gz"):
+            self._file = gzip.open(path, "ab")
+        else:
+            self._file = open(path, "ab")
+
+    def __call__(self, request, timeout=None):
+        method, url, body = _request_key(request)
+        sent = time.time()
+        try:
+            response = (self.transport or base.urlopen)(
+                request, timeout=timeout)
+            status = response.code
+            headers = _recorded_headers(response.headers)
+            data = response.read()
+        except base.HTTPError as error:
+            status = error.code
+            headers = _recorded_headers(error.headers)
+            data = error.read()
+            self._write(method, url, body, sent, status, headers, data)
+            raise base.HTTPError(error.url, status, error.msg, error.headers,
+                                 io.BytesIO(data))
+        self._write(method, url, body, sent, status, headers, data)
+        return RecordedResponse(request.full_url, status, headers, data)
+
+    def _write(self, method, url, body, sent, status, headers, data):
+        record = {
+            "t": round(sent - self._started, 6),
+            "elapsed": round(time.time() - sent, 6),
+            "method": method,
+            "url": url,
+            "body": body,
+            "status": status,
+            "headers": headers,
+            "response": _encode(_redact_body(data)),
+        }
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line.encode("utf-8"))
+            self._file.flush()
+            self.records += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplayTransport:
+    """Serves requests from a log written by `RecordingTransport`.
+
+    Requests are matched on method, URL and body, with credentials
+    redacted. Repeated requests get the recorded responses in order, the
+    last one being reused once they run out. Each response is delayed by
+    its recorded `elapsed` time divided by `speed`; a `speed` of None
+    answers immediately. Requests missing from the log raise
+    `ReplayMissError`, or are sent through `fallback` if one is given.
+
+    `requests` counts the requests served by endpoint URL path and
+    `misses` lists the `(method, url)` of unmatched requests.
+    """
+
+    def __init__(self, path, speed=1.0, fallback=None):
+        self.path = path
+        self.speed = speed
+        self.fallback = fallback
+        self.requests = collections.Counter()
+        self.misses = []
+        self._lock = threading.Lock()
+        self._responses = collections.defaultdict(collections.deque)
+        for record in read_log(path):
+            self._responses[(record["method"], record["url"],
+                             record["body"])].append(record)
+
+    def __call__(self, request, timeout=None):
+        key = _request_key(request)
+        with self._lock:
+            records = self._responses.get(key)
+            if not records:
+                self.misses.append(key[:2])
+                record = None
+            else:
+                record = records.popleft() if len(records) > 1 \
+                    else records[0]
+                self.requests[urlsplit(key[1]).path] += 1
+        if record is None:
+            if self.fallback is not None:
+                return self.fallback(request, timeout=timeout)
+            raise ReplayMissError(*key[:2])
+        if self.speed:
+            time.sleep(record["elapsed"] / self.speed)
+        data = _decode(record["response"])
+        if record["status"] >= 400:
+            raise base.HTTPError(request.full_url, record["status"], "",
+                                 record["headers"], io.BytesIO(data))
+        return RecordedResponse(request.full_url, record["status"],
+                                record["headers"], data)
@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "benchmarks"))
+
+import run_benchmarks  # noqa: E402
+
+SCALES = {
+    "entities": [2, 5],
+    "document_bytes": [10 * 1024, 20 * 1024],
+    "rows": [3, 8],
+}
+
+
+def test_case_throughput_units(mock_urlopen):
+    """Test that every case reports the units of its own scale"""
+    transport = run_benchmarks.FakeTransport(page_bytes=4096)
+    mock_urlopen.side_effect = transport
+    bench = run_benchmarks.Bench(transport)
+    cases = list(run_benchmarks.cached_get_cases(SCALES)) + \
+        list(run_benchmarks.fetch_json_cases(SCALES)) + \
+        list(run_benchmarks.thread_html_cases(SCALES, transport)) + \
+        list(run_benchmarks.parse_cases(SCALES))
+    try:
+        units = dict(((name, scale), (unit, run(bench.client())))
+                     for name, scale, unit, run in cases)
+    finally:
+        bench.cleanup()
+
+    small, large = [
+        len(run_benchmarks.document_html(size).encode("utf-8")) / 1e6
+        for size in SCALES["document_bytes"]]
+    assert units == {
+        ("cached_get", "2 threads"): ("threads", 2),
+        ("cached_get", "5 threads"): ("threads", 5),
+        ("fetch_json", "2 calls"): ("calls", 2),
+        ("fetch_json", "5 calls"): ("calls", 5),
+        ("thread_html_v2", "10KB"): ("MB", small),
+        ("thread_html_v2", "20KB"): ("MB", large),
+        ("parse_document_html", "10KB"): ("MB", small),
+        ("parse_document_html", "20KB"): ("MB", large),
+        ("parse_spreadsheet_contents", "3 rows"): ("rows", 3),
+        ("parse_spreadsheet_contents", "8 rows"): ("rows", 8),
+    }
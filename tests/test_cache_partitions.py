@@ -0,0 +1,111 @@
+import json
+import pytest
+from io import BytesIO
+from urllib.error import HTTPError
+from quipclient import QuipClient, QuipError
+
+
+def _client(tmp_path, mock_urlopen, mock_response, user_id):
+    mock_urlopen.return_value = mock_response(json_data={"id": user_id})
+    client = QuipClient(access_token="token-" + user_id,
+                        cache_dir=str(tmp_path / "cache"))
+    mock_urlopen.reset_mock()
+    return client
+
+
+def test_user_profiles_stay_per_user(tmp_path, mock_urlopen, mock_response):
+    """Test that user profiles, which include the caller's own folder IDs,
+    are not shared"""
+    alice = _client(tmp_path, mock_urlopen, mock_response, "ALICE")
+    bob = _client(tmp_path, mock_urlopen, mock_response, "BOB")
+    mock_urlopen.return_value = mock_response(json_data={
+        "ALICE": {"id": "ALICE", "private_folder_id": "PRIVATE"}})
+    alice.get_users(["ALICE"])
+    alice.get_users(["ALICE"])
+    assert mock_urlopen.call_count == 1
+
+    mock_urlopen.return_value = mock_response(json_data={
+        "ALICE": {"id": "ALICE"}})
+    assert "private_folder_id" not in bob.get_users(["ALICE"])["ALICE"]
+    assert mock_urlopen.call_count == 2
+
+
+def test_thread_html_stays_per_user(tmp_path, mock_urlopen, mock_response):
+    alice = _client(tmp_path, mock_urlopen, mock_response, "ALICE")
+    bob = _client(tmp_path, mock_urlopen, mock_response, "BOB")
+    mock_urlopen.return_value = mock_response(json_data={
+        "html": "<p>Secret</p>", "response_metadata": {"next_cursor": ""}})
+
+    alice.get_thread_html_v2("THREAD1")
+    bob.get_thread_html_v2("THREAD1")
+    assert mock_urlopen.call_count == 2
+
+
+def test_shared_folders_check_membership(tmp_path, mock_urlopen,
+                                         mock_response):
+    """Test that shared folder entries are only served to members"""
+    alice = _client(tmp_path, mock_urlopen, mock_response, "ALICE")
+    bob = _client(tmp_path, mock_urlopen, mock_response, "BOB")
+    carol = _client(tmp_path, mock_urlopen, mock_response, "CAROL")
+    mock_urlopen.return_value = mock_response(json_data={
+        "folder": {"id": "F1", "title": "Team"},
+        "member_ids": ["ALICE", "BOB"]})
+
+    alice.get_folder("F1")
+    bob.get_folder("F1")
+    assert mock_urlopen.call_count == 1
+
+    mock_urlopen.side_effect = HTTPError(
+        "url", 403, "Forbidden", {}, BytesIO(json.dumps(
+            {"error_description": "no access"}).encode()))
+    with pytest.raises(QuipError):
+        carol.get_folder("F1")
+    assert mock_urlopen.call_count == 2
+
+    # The error was not cached in the shared partition
+    mock_urlopen.side_effect = None
+    assert alice.get_folder("F1")["folder"]["title"] == "Team"
+    assert mock_urlopen.call_count == 2
+
+
+def test_entries_before_user_id_are_found(tmp_path, mock_urlopen,
+                                          mock_response):
+    """Test that the authenticated user lookup is cached per token"""
+    _client(tmp_path, mock_urlopen, mock_response, "ALICE")
+    client = QuipClient(access_token="token-ALICE",
+                        cache_dir=str(tmp_path / "cache"))
+    assert client._user_id == "ALICE"
+    assert mock_urlopen.call_count == 0
+
+
+def test_partition_rules(quip_client):
+    assert quip_client._cache_key(
+        "https://platform.quip.com/1/folders/F1") == \
+        "*:https://platform.quip.com/1/folders/F1"
+    assert quip_client._cache_key(
+        "https://platform.quip.com/1/users/U1").startswith("TEST_USER_ID:")
+    assert quip_client._cache_key(
+        "https://platform.quip.com/1/users/current").startswith(
+            "TEST_USER_ID:")
+    quip_client.cache_partitions["2/threads/"] = "shared"
+    assert quip_client._cache_key(
+        "https://platform.quip.com/2/threads/T1").startswith("*:")
+
+
+def test_blob_errors_cached_per_token(tmp_path, mock_urlopen):
+    """Test that blob errors seen before the user ID is known stay with
+    the token that got them"""
+    def _forbidden(request, timeout=None):
+        raise HTTPError(
+            request.get_full_url(), 403, "Forbidden", {},
+            BytesIO(json.dumps({"error_description": "No access"}).encode()))
+    mock_urlopen.side_effect = _forbidden
+    client = QuipClient(access_token="token-ALICE",
+                        cache_dir=str(tmp_path / "cache"))
+    assert client._user_id is None
+    with pytest.raises(QuipError):
+        client.get_blob("THREAD1", "BLOB1")
+
+    url = client._url("blob/THREAD1/BLOB1")
+    assert client._cache.get(client._cache_key(url)) is not None
+    assert client._cache.get("_:" + url) is None
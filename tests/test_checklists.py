@@ -0,0 +1,125 @@
+import pytest
+from urllib.parse import parse_qs
+from quipclient import QuipError
+
+CHECKLIST_HTML = (
+    "<h1 id='TITLE'>Launch</h1>"
+    "<ul id='LIST1' class='checklist'>"
+    "<li id='I1' class=''>One</li><li id='I2' class=''>Two</li>"
+    "<li id='I3' class='checked'>Three</li><li id='I4' class=''>Four</li>"
+    "</ul>"
+    "<ul id='LIST2'><li id='J1' class=''>Alpha</li>"
+    "<li id='J2' class=''>Beta</li></ul>"
+)
+
+
+@pytest.fixture
+def checklist_thread(mock_urlopen, mock_response):
+    """Serves one checklist thread and records edit requests"""
+    edits = []
+
+    def _route(request, timeout=None):
+        if request.data:
+            edits.append(dict((k, v[0]) for k, v in
+                              parse_qs(request.data.decode()).items()))
+            return mock_response(json_data={"thread": {"id": "THREAD1"}})
+        return mock_response(json_data={
+            "thread": {"id": "THREAD1", "updated_usec": 1},
+            "html": CHECKLIST_HTML})
+    mock_urlopen.side_effect = _route
+    return edits
+
+
+def test_toggle_checkmarks_groups_by_list(quip_client, mock_urlopen,
+                                          checklist_thread):
+    """Test that lists are replaced together only when every item changes"""
+    responses = quip_client.toggle_checkmarks(
+        "THREAD1", ["I1", "I2", "I3", "I4", "J1", "J2"])
+
+    assert len(responses) == 4
+    assert mock_urlopen.call_count == 5
+    assert [(e["section_id"], e["location"]) for e in checklist_thread] == [
+        ("I1", str(quip_client.REPLACE_SECTION)),
+        ("I2", str(quip_client.REPLACE_SECTION)),
+        ("I4", str(quip_client.REPLACE_SECTION)),
+        ("LIST2", str(quip_client.REPLACE_SECTION))]
+    assert checklist_thread[0]["content"] == \
+        '<li id="I1" class="checked">One</li>'
+    assert checklist_thread[3]["content"].count('class="checked"') == 2
+
+    # The shared parsed document is left untouched
+    first_list = quip_client.get_first_list("THREAD1")
+    assert first_list.find("li").attrib["class"] == ""
+
+
+def test_toggle_checkmarks_replaces_current_list(quip_client, mock_urlopen,
+                                                mock_response,
+                                                checklist_thread):
+    """Test that whole lists are rebuilt from the current document"""
+    quip_client.get_thread("THREAD1")
+    current = CHECKLIST_HTML.replace(
+        "Beta</li></ul>", "Beta</li><li id='J3' class=''>Gamma</li></ul>")
+    route = mock_urlopen.side_effect
+
+    def _route(request, timeout=None):
+        if request.data:
+            return route(request, timeout)
+        return mock_response(json_data={
+            "thread": {"id": "THREAD1", "updated_usec": 2},
+            "html": current})
+    mock_urlopen.side_effect = _route
+
+    quip_client.toggle_checkmarks("THREAD1", ["J1", "J2"])
+    assert [e["section_id"] for e in checklist_thread] == ["J1", "J2"]
+
+    quip_client.toggle_checkmarks("THREAD1", ["J1", "J2", "J3"])
+    assert checklist_thread[2]["section_id"] == "LIST2"
+    assert '<li id="J3" class="checked">Gamma</li>' in \
+        checklist_thread[2]["content"]
+
+
+def test_toggle_checkmarks_skips_unchanged(quip_client, checklist_thread):
+    """Test that items already in the requested state are not edited"""
+    items = list(quip_client.get_first_list("THREAD1").iter("li"))
+    quip_client.toggle_checkmarks("THREAD1", items, checked=False)
+    assert [e["section_id"] for e in checklist_thread] == ["I3"]
+    assert 'class=""' in checklist_thread[0]["content"]
+
+
+def test_toggle_checkmark_leaves_cached_document(quip_client,
+                                                checklist_thread):
+    """Test that toggling one item does not modify the shared document"""
+    item = quip_client.get_first_list("THREAD1").find("li")
+    quip_client.toggle_checkmark("THREAD1", item)
+
+    assert 'class="checked"' in checklist_thread[0]["content"]
+    assert item.attrib["class"] == ""
+    first_list = quip_client.get_first_list("THREAD1")
+    assert first_list.find("li").attrib["class"] == ""
+
+
+def test_toggle_checkmarks_unknown_item(quip_client, checklist_thread):
+    with pytest.raises(QuipError):
+        quip_client.toggle_checkmarks("THREAD1", ["MISSING"])
+
+
+def test_add_to_list(quip_client, checklist_thread):
+    """Test that many items are added to the chosen list in one edit"""
+    quip_client.add_to_list("THREAD1", ["Gamma", "Delta\nEpsilon"], index=-1)
+    quip_client.add_to_list("THREAD1", ["Zero"], list_id="LIST1",
+                            add_to_top=True)
+
+    assert len(checklist_thread) == 2
+    assert checklist_thread[0]["section_id"] == "J2"
+    assert checklist_thread[0]["content"] == "Gamma\n\nDelta Epsilon"
+    assert checklist_thread[0]["format"] == "markdown"
+    assert checklist_thread[1]["section_id"] == "I1"
+    assert checklist_thread[1]["location"] == \
+        str(quip_client.BEFORE_SECTION)
+
+
+def test_add_to_list_without_list(quip_client, checklist_thread):
+    """Test that a new list is appended when the list does not exist"""
+    quip_client.add_to_list("THREAD1", ["One"], index=5)
+    assert checklist_thread[0]["location"] == str(quip_client.APPEND)
+    assert checklist_thread[0]["content"] == "    * One"
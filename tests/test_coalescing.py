@@ -0,0 +1,111 @@
+import json
+import threading
+import time
+import pytest
+from io import BytesIO
+from urllib.error import HTTPError
+from quipclient import QuipError
+
+
+def _wait_for_waiters(client, count, timeout=5):
+    """Blocks until `count` callers are waiting on the in-flight request"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with client._inflight_lock:
+            if any(f.waiters >= count for f in client._inflight.values()):
+                return
+        time.sleep(0.001)
+
+
+def _run_concurrently(func, count):
+    results = [None] * count
+    errors = [None] * count
+
+    def call(i):
+        try:
+            results[i] = func()
+        except Exception as e:
+            errors[i] = e
+
+    workers = [threading.Thread(target=call, args=(i,))
+               for i in range(count)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results, errors
+
+
+def test_identical_gets_share_one_request(quip_client, mock_urlopen,
+                                          mock_response):
+    """Test that concurrent identical GETs send a single request"""
+    def slow_response(request, timeout=None):
+        _wait_for_waiters(quip_client, 7)
+        return mock_response(json_data={"folder": {"id": "FOLDER1"}})
+    mock_urlopen.side_effect = slow_response
+
+    results, errors = _run_concurrently(
+        lambda: quip_client.get_folder("FOLDER1"), 8)
+
+    assert errors == [None] * 8
+    assert mock_urlopen.call_count == 1
+    assert all(r == {"folder": {"id": "FOLDER1"}} for r in results)
+    assert len(set(id(r) for r in results)) == 8
+    assert quip_client.get_coalescing_stats()["coalesced"] == 7
+
+
+def test_coalesced_errors_are_shared(quip_client, mock_urlopen):
+    """Test that waiters receive the leader's error"""
+    def failing_response(request, timeout=None):
+        _wait_for_waiters(quip_client, 3)
+        raise HTTPError("url", 403, "Forbidden", {}, BytesIO(
+            json.dumps({"error_description": "no access"}).encode()))
+    mock_urlopen.side_effect = failing_response
+
+    results, errors = _run_concurrently(
+        lambda: quip_client.get_folder("FOLDER1"), 4)
+
+    assert mock_urlopen.call_count == 1
+    assert all(isinstance(e, QuipError) and e.code == 403 for e in errors)
+
+
+def test_coalescing_disabled(quip_client, mock_urlopen, mock_response):
+    """Test that coalesce_requests=False sends every request"""
+    quip_client.coalesce_requests = False
+    mock_urlopen.return_value = mock_response(json_data={"data": "test"})
+
+    _run_concurrently(lambda: quip_client._fetch_json("test", cache=False), 4)
+
+    assert mock_urlopen.call_count == 4
+    assert quip_client.get_coalescing_stats()["coalesced"] == 0
+
+
+def test_paginated_gets_not_coalesced_with_single_pages(
+        quip_client, mock_urlopen, mock_response):
+    """Test that a paginated GET does not join a single-page GET"""
+    # Both first pages are in flight at once unless they were coalesced
+    first_pages = threading.Barrier(2, timeout=2)
+
+    def paged_response(request, timeout=None):
+        if "cursor=" in request.get_full_url():
+            return mock_response(json_data={
+                "folders": [{"folder_id": "F2"}],
+                "response_metadata": {"next_cursor": ""}})
+        try:
+            first_pages.wait()
+        except threading.BrokenBarrierError:
+            pass
+        return mock_response(json_data={
+            "folders": [{"folder_id": "F1"}],
+            "response_metadata": {"next_cursor": "NEXT"}})
+    mock_urlopen.side_effect = paged_response
+
+    calls = [lambda: quip_client._fetch_json("2/threads/T1/folders",
+                                             cache=False),
+             lambda: quip_client._fetch_json("2/threads/T1/folders",
+                                             cache=False, paginate=True)]
+    results, errors = _run_concurrently(lambda: calls.pop()(), 2)
+
+    assert errors == [None, None]
+    assert sorted(len(r["folders"]) for r in results) == [1, 2]
+    assert quip_client.get_coalescing_stats()["coalesced"] == 0
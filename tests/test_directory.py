@@ -0,0 +1,80 @@
+import pytest
+from urllib.parse import urlparse, parse_qs
+from quipclient.directory import UserDirectory
+
+CONTACTS = [
+    {"id": "U1", "name": "Ada Lovelace", "emails": ["ada@example.com"]},
+    {"id": "U2", "name": "Alan Turing", "emails": ["alan@example.com"]},
+    {"id": "U3", "name": "Grace Hopper", "emails": ["grace@navy.mil"]},
+]
+
+
+@pytest.fixture
+def users_endpoint(mock_urlopen, mock_response):
+    """Serves contacts and bulk user lookups"""
+    def _route(request, timeout=None):
+        url = urlparse(request.get_full_url())
+        if url.path.endswith("/contacts"):
+            return mock_response(json_data=CONTACTS)
+        if "ids" in parse_qs(url.query):
+            ids = parse_qs(url.query)["ids"][0].split(",")
+            return mock_response(json_data=dict(
+                (i, {"id": i, "name": "User " + i}) for i in ids))
+        user_id = url.path.rsplit("/", 1)[-1]
+        return mock_response(json_data={"id": user_id, "name": "Single"})
+    mock_urlopen.side_effect = _route
+    return mock_urlopen
+
+
+def test_prefix_and_fuzzy_search(quip_client):
+    directory = UserDirectory(quip_client)
+    directory.add(CONTACTS)
+
+    assert [u["id"] for u in directory.search("al")] == ["U2"]
+    assert [u["id"] for u in directory.search("a")] == ["U1", "U2"]
+    assert [u["id"] for u in directory.search("grace@")] == ["U3"]
+    assert [u["id"] for u in directory.search("ada love")] == ["U1"]
+    # Misspelled: no prefix match, but most trigrams are shared
+    assert [u["id"] for u in directory.search("hoper")] == ["U3"]
+    assert directory.search("zzz") == []
+
+    directory.add([{"id": "U2", "name": "Alonzo Church"}])
+    assert [u["id"] for u in directory.search("turing")] == []
+    assert [u["id"] for u in directory.search("alonzo")] == ["U2"]
+
+
+def test_load_batches_missing_users(quip_client, users_endpoint):
+    """Test that load fetches contacts and unknown users in one batch"""
+    quip_client.directory.load(["U1", "U4", "U5"])
+    assert users_endpoint.call_count == 2
+    assert all(i in quip_client.directory for i in ["U1", "U3", "U4", "U5"])
+    assert quip_client.search_users("user u4")[0]["id"] == "U4"
+
+
+def test_get_user_served_from_directory(quip_client, users_endpoint):
+    """Test that get_user reuses users loaded in bulk"""
+    quip_client.get_users(["U7", "U8"])
+    assert users_endpoint.call_count == 1
+    assert quip_client.get_user("U7")["name"] == "User U7"
+    assert users_endpoint.call_count == 1
+
+    # Users only in the shared cache entries are served from there
+    quip_client.directory = UserDirectory(quip_client)
+    assert quip_client.get_user("U8")["name"] == "User U8"
+    assert users_endpoint.call_count == 1
+
+    assert quip_client.get_user("U9")["name"] == "Single"
+    assert quip_client.get_user("U9", cache=False)["name"] == "Single"
+    assert users_endpoint.call_count == 3
+
+
+def test_refresh_only_stale_users(quip_client, users_endpoint):
+    directory = quip_client.directory
+    directory.load()
+    directory.add([{"id": "U9", "name": "Old"}])
+    directory._loaded_at["U9"] -= directory.refresh_interval + 1
+    users_endpoint.reset_mock()
+
+    assert directory.refresh() == 1
+    assert users_endpoint.call_count == 2
+    assert directory.get("U9")["name"] == "User U9"
@@ -0,0 +1,85 @@
+import pytest
+from unittest.mock import Mock
+from quipclient import DocumentCache
+
+SPREADSHEET_HTML = (
+    "<h1 id='HEAD1'>Tracker</h1>"
+    "<table id='TABLE1' title='Sheet1'><thead><tr id='ROW0'>"
+    "<th id='H1'>A</th><th id='H2'>B</th></tr></thead><tbody>"
+    "<tr id='ROW1'><td id='C1'>Name</td><td id='C2'>Status</td></tr>"
+    "<tr id='ROW2'><td id='C3'>Acme</td><td id='C4'>Open</td></tr>"
+    "</tbody></table>"
+    "<ul id='LIST1'><li id='ITEM1'>One</li><li id='ITEM2'>Two</li></ul>"
+)
+
+
+def _thread(updated_usec, html=SPREADSHEET_HTML):
+    return {"thread": {"id": "THREAD1", "updated_usec": updated_usec},
+            "html": html}
+
+
+@pytest.fixture
+def counted_parse(quip_client):
+    parse = Mock(wraps=quip_client.parse_document_html)
+    quip_client.parse_document_html = parse
+    return parse
+
+
+def test_helpers_share_parsed_document(quip_client, mock_urlopen,
+                                       mock_response, counted_parse):
+    """Test that helpers on the same thread fetch and parse it once"""
+    mock_urlopen.return_value = mock_response(json_data=_thread(100))
+
+    assert quip_client.get_section("ITEM2", "THREAD1").text == "Two"
+    assert quip_client.get_named_spreadsheet(
+        "Sheet1", "THREAD1").attrib["id"] == "TABLE1"
+    assert quip_client.get_first_list("THREAD1").attrib["id"] == "LIST1"
+    assert quip_client.get_last_row_item_id(
+        quip_client.get_first_spreadsheet("THREAD1")) == "ROW2"
+
+    assert counted_parse.call_count == 1
+    assert mock_urlopen.call_count == 1
+    assert quip_client.document_cache.hits == 3
+
+
+def test_new_updated_usec_is_reparsed(quip_client, mock_urlopen,
+                                      mock_response, counted_parse):
+    """Test that a changed document is parsed again"""
+    mock_urlopen.return_value = mock_response(json_data=_thread(100))
+    quip_client.get_section("ITEM1", "THREAD1")
+
+    quip_client._cache.clear()
+    mock_urlopen.return_value = mock_response(json_data=_thread(
+        200, SPREADSHEET_HTML.replace("Two", "Three")))
+    assert quip_client.get_section("ITEM2", "THREAD1").text == "Three"
+    assert counted_parse.call_count == 2
+
+
+def test_document_html_argument_bypasses_cache(quip_client, mock_urlopen,
+                                               counted_parse):
+    """Test that explicitly passed HTML is parsed without fetching"""
+    quip_client.get_section("ITEM1", document_html=SPREADSHEET_HTML)
+    quip_client.get_section("ITEM1", document_html=SPREADSHEET_HTML)
+    assert counted_parse.call_count == 2
+    assert mock_urlopen.call_count == 0
+    assert len(quip_client.document_cache) == 0
+
+
+def test_document_cache_evicts_by_size():
+    """Test LRU eviction by total document size"""
+    cache = DocumentCache(max_bytes=100)
+    cache.put("T1", 1, "tree1", 40)
+    cache.put("T2", 1, "tree2", 40)
+    assert cache.get("T1", 1) == "tree1"
+    cache.put("T3", 1, "tree3", 40)
+
+    assert cache.get("T2", 1) is None
+    assert cache.get("T1", 1) == "tree1"
+    assert cache.size == 80
+
+    cache.put("T4", 1, "huge", 200)
+    assert cache.get("T4", 1) is None
+
+    cache.invalidate("T1")
+    assert cache.get("T1", 1) is None
+    assert len(cache) == 1
@@ -0,0 +1,75 @@
+import json
+from urllib.parse import urlparse, parse_qs
+from quipclient import ParsedDocument
+
+DOCUMENT_HTML = (
+    "<h1 id='AAAAAAAAAA1'>Title</h1>"
+    "<p id='AAAAAAAAAA2'>Some <annotation id=\"ANNO1\">highlighted</annotation>"
+    " text</p>"
+    "<ul id='AAAAAAAAAA3'><li id='AAAAAAAAAA4'>One</li>"
+    "<li id='AAAAAAAAAA5'>Two <annotation id=\"ANNO2\">x</annotation></li></ul>"
+    "<table id='AAAAAAAAAA6' title='Budget'><tr id='AAAAAAAAAA7'>"
+    "<td id='AAAAAAAAAA8'>1</td></tr></table>"
+)
+
+
+def test_document_index(quip_client):
+    """Test the section, parent, position, title and annotation indexes"""
+    document = ParsedDocument(quip_client.parse_document_html(DOCUMENT_HTML))
+
+    assert document.section_ids == ["AAAAAAAAAA%d" % i for i in range(1, 9)]
+    assert document.get_section("AAAAAAAAAA5").text == "Two "
+    assert document.get_parent("AAAAAAAAAA5").attrib["id"] == "AAAAAAAAAA3"
+    assert document.get_parent("AAAAAAAAAA1") is document.tree
+    assert document.get_position("AAAAAAAAAA4") == 3
+    assert document.get_section("MISSING") is None
+    assert document.titles["Budget"].attrib["id"] == "AAAAAAAAAA6"
+    assert document.get_annotation_section("ANNO1") == "AAAAAAAAAA2"
+    assert document.get_annotation_section("ANNO2") == "AAAAAAAAAA5"
+    assert [e.attrib["id"] for e in document.get_elements("li")] == \
+        ["AAAAAAAAAA4", "AAAAAAAAAA5"]
+
+
+def test_get_section_uses_index(quip_client):
+    """Test section and spreadsheet lookups through the client helpers"""
+    assert quip_client.get_section(
+        "AAAAAAAAAA8", document_html=DOCUMENT_HTML).text == "1"
+    assert quip_client.get_section(
+        "NOPE", document_html=DOCUMENT_HTML) is None
+    assert quip_client.get_named_spreadsheet(
+        "Budget", document_html=DOCUMENT_HTML).attrib["id"] == "AAAAAAAAAA6"
+
+
+def test_merge_comments_maps_annotations(quip_client, mock_urlopen,
+                                         mock_response):
+    """Test that merged comments land on the matching original section"""
+    child_html = DOCUMENT_HTML.replace("AAAAAAAAAA", "BBBBBBBBBB")
+    threads = {
+        "ORIG": {"thread": {"id": "ORIG", "updated_usec": 1},
+                 "html": DOCUMENT_HTML},
+        "CHILD": {"thread": {"id": "CHILD", "updated_usec": 1},
+                  "html": child_html},
+    }
+    posted = []
+
+    def _route(request, timeout=None):
+        url = request.get_full_url()
+        if request.data:
+            posted.append(parse_qs(request.data.decode()))
+            return mock_response(json_data={})
+        if "/threads/" in url:
+            ids = parse_qs(urlparse(url).query)["ids"][0].split(",")
+            return mock_response(json_data=dict((i, threads[i]) for i in ids))
+        return mock_response(json_data=[
+            {"id": "M1", "author_id": "U1", "text": "hi",
+             "annotation": {"id": "ANNO2"}},
+            {"id": "M2", "author_id": "U1", "text": "yo",
+             "annotation": {"id": "X",
+                            "highlight_section_ids": ["BBBBBBBBBB1"]}},
+        ])
+    mock_urlopen.side_effect = _route
+
+    quip_client.merge_comments("ORIG", ["CHILD"])
+
+    assert [p["section_id"] for p in posted] == \
+        [["AAAAAAAAAA1"], ["AAAAAAAAAA5"]]
@@ -0,0 +1,119 @@
+import time
+import pytest
+from quipclient import QuipClient, QuipError
+from quipclient.emulator import QuipEmulator, fixed_latency
+
+TOKEN = "emulator-token"
+
+
+@pytest.fixture
+def emulator():
+    emulator = QuipEmulator(page_bytes=256, seed=1)
+    emulator.populate(users=3, folders=2, threads=5, messages=4,
+                      document_bytes=1024, token=TOKEN)
+    with emulator:
+        yield emulator
+
+
+def _client(emulator, tmp_path):
+    return QuipClient(access_token=TOKEN, base_url=emulator.base_url,
+                      cache_dir=str(tmp_path / "cache"))
+
+
+def test_reads_entities(emulator, tmp_path):
+    client = _client(emulator, tmp_path)
+    user = client.get_authenticated_user()
+    assert client._user_id == user["id"]
+
+    thread_ids = emulator.thread_ids()
+    threads = client.get_threads(thread_ids)
+    assert sorted(threads) == sorted(thread_ids)
+    folder_id = threads[thread_ids[0]]["shared_folder_ids"][0]
+    folder = client.get_folder(folder_id)
+    assert user["id"] in folder["member_ids"]
+    assert {"thread_id": thread_ids[0]} in folder["children"]
+
+    messages = client.get_messages(thread_ids[0], count=3)
+    assert [m["text"] for m in messages] == [
+        "Message 3", "Message 2", "Message 1"]
+    assert len(client.get_contacts()) == 2
+
+
+def test_paginates_thread_html(emulator, tmp_path):
+    client = _client(emulator, tmp_path)
+    thread_id = emulator.thread_ids()[0]
+    html = client.get_thread(thread_id)["html"]
+    emulator.requests.clear()
+
+    result = client.get_thread_html_v2(thread_id, cache=False)
+    assert result["html"] == html
+    assert emulator.requests["2/threads/{id}/html"] == \
+        -(-len(html) // 256)
+
+
+def test_edits_documents(emulator, tmp_path):
+    client = _client(emulator, tmp_path)
+    thread = client.new_document("<h1>Plan</h1><p>Draft</p>")
+    assert thread["thread"]["title"] == "Plan"
+    tree = client.parse_document_html(thread["html"])
+    section_id = tree[1].attrib["id"]
+
+    client.edit_document(thread["thread"]["id"], "<p>Final</p>",
+                         operation=client.REPLACE_SECTION,
+                         section_id=section_id)
+    thread = client.edit_document(thread["thread"]["id"], "<p>Notes</p>")
+    texts = [e.text for e in client.parse_document_html(thread["html"])]
+    assert texts == ["Plan", "Final", "Notes"]
+
+
+def test_rate_limits(tmp_path):
+    emulator = QuipEmulator(rate_limit=3, rate_limit_window=3600)
+    emulator.populate(users=1, folders=0, threads=1, token=TOKEN)
+    with emulator:
+        client = _client(emulator, tmp_path)
+        client.get_thread(emulator.thread_ids()[0], cache=False)
+        assert client._rate_limit == 3
+        assert client._rate_limit_remaining == 1
+        client.get_thread(emulator.thread_ids()[0], cache=False)
+        client._rate_limit_reset = None
+        with pytest.raises(QuipError) as error:
+            client.get_thread(emulator.thread_ids()[0], cache=False)
+    assert error.value.code == 503
+    assert emulator.responses[503] == 1
+
+
+def test_injected_failures_and_latency(tmp_path):
+    emulator = QuipEmulator(latency=fixed_latency(0.05))
+    emulator.populate(users=1, folders=0, threads=0, token=TOKEN)
+    emulator.inject_failure("threads/new-document", status=429)
+    with emulator:
+        client = _client(emulator, tmp_path)
+        start = time.time()
+        response = client.new_large_document("<p>Hello</p>", retry_delay=0)
+        assert time.time() - start >= 0.1
+    assert response["upload"]["retries"] == 1
+    assert emulator.responses[429] == 1
+
+
+def test_blobs(emulator, tmp_path):
+    client = _client(emulator, tmp_path)
+    thread_id = emulator.thread_ids()[0]
+    status, headers, body = emulator.handle(
+        "POST", "blob/" + thread_id, {}, ("a.txt", b"data"), TOKEN)
+    assert status == 200
+    assert client.get_blob(thread_id, body["id"]).read() == b"data"
+
+
+def test_new_websocket(emulator, tmp_path):
+    client = _client(emulator, tmp_path)
+    response = client.new_websocket()
+    assert response["user_id"] == client._user_id
+    assert response["url"].startswith("ws://")
+
+
+def test_rejects_unknown_tokens(emulator, tmp_path):
+    client = QuipClient(access_token="wrong", base_url=emulator.base_url,
+                        cache_dir=str(tmp_path / "cache"))
+    with pytest.raises(QuipError) as error:
+        client.get_thread(emulator.thread_ids()[0])
+    assert error.value.code == 401
@@ -0,0 +1,119 @@
+import json
+import os
+import pytest
+from unittest.mock import Mock
+from quipclient import WorkspaceExporter
+
+FOLDERS = {
+    "ROOT": {
+        "folder": {"id": "ROOT", "title": "Root"},
+        "children": [{"thread_id": "THREAD1"}, {"folder_id": "SUB"}],
+    },
+    "SUB": {
+        "folder": {"id": "SUB", "title": "Sub"},
+        "children": [{"thread_id": "THREAD2"}, {"folder_id": "ROOT"}],
+    },
+}
+
+THREADS = {
+    "THREAD1": {
+        "thread": {"id": "THREAD1", "updated_usec": 100},
+        "html": "<p id='SEC1'><img src='/blob/THREAD1/BLOB1'></p>",
+    },
+    "THREAD2": {
+        "thread": {"id": "THREAD2", "updated_usec": 200},
+        "html": "<p id='SEC2'>Text</p>",
+    },
+}
+
+
+@pytest.fixture
+def routed_urlopen(mock_urlopen, mock_response):
+    """Routes mocked requests to canned responses by URL"""
+    def _route(request, timeout=None):
+        url = request.get_full_url()
+        path = url.split("/1/", 1)[1]
+        if path.startswith("folders/"):
+            ids = path.split("ids=")[1].replace("%2C", ",").split(",")
+            return mock_response(json_data=dict(
+                (i, FOLDERS[i]) for i in ids))
+        if path.startswith("threads/"):
+            ids = path.split("ids=")[1].replace("%2C", ",").split(",")
+            return mock_response(json_data=dict(
+                (i, THREADS[i]) for i in ids))
+        if path.startswith("messages/"):
+            return mock_response(json_data=[
+                {"id": "MSG1", "author_id": "USER1", "text": "hi",
+                 "files": [{"hash": "BLOB2", "name": "a.txt"}]}])
+        if path.startswith("blob/"):
+            blob = Mock()
+            blob.read.return_value = path.encode()
+            return blob
+        raise AssertionError("Unexpected request " + url)
+    mock_urlopen.side_effect = _route
+    return mock_urlopen
+
+
+def test_export_writes_workspace(quip_client, routed_urlopen, tmp_path):
+    """Test that folders, threads, messages and blobs are written"""
+    out = tmp_path / "export"
+    report = WorkspaceExporter(quip_client, str(out)).run(["ROOT"])
+
+    assert report["exported"] == 2
+    assert report["failed"] == []
+    assert json.loads((out / "folders" / "SUB.json").read_text())[
+        "folder"]["title"] == "Sub"
+    thread_dir = out / "threads" / "THREAD1"
+    assert "SEC1" in (thread_dir / "document.html").read_text()
+    assert json.loads((thread_dir / "messages.json").read_text())[0][
+        "id"] == "MSG1"
+    assert (thread_dir / "blobs" / "BLOB1").read_bytes() == \
+        b"blob/THREAD1/BLOB1"
+    assert (thread_dir / "blobs" / "BLOB2").exists()
+    assert not [f for f in os.listdir(thread_dir) if f.endswith(".tmp")]
+
+    manifest = json.loads((out / "manifest.json").read_text())
+    assert manifest["threads"]["THREAD2"]["updated_usec"] == 200
+    for stage in ("discover", "metadata", "content", "blobs", "write"):
+        assert report[stage]["errors"] == 0
+
+
+def test_export_skips_unchanged_threads(quip_client, routed_urlopen,
+                                        tmp_path):
+    """Test that a second run only exports threads with a newer updated_usec"""
+    out = str(tmp_path / "export")
+    WorkspaceExporter(quip_client, out).run(["ROOT"])
+
+    THREADS["THREAD2"]["thread"]["updated_usec"] = 300
+    try:
+        report = WorkspaceExporter(
+            quip_client, out, cache=False).run(["ROOT"])
+    finally:
+        THREADS["THREAD2"]["thread"]["updated_usec"] = 200
+
+    assert report["skipped"] == 1
+    assert report["exported"] == 1
+
+
+def test_export_stage_failure_is_reported(quip_client, routed_urlopen,
+                                          tmp_path):
+    """Test that a failing thread is reported and left out of the manifest"""
+    out = tmp_path / "export"
+    exporter = WorkspaceExporter(quip_client, str(out),
+                                 concurrency={"blobs": 2})
+
+    def fail(thread_id, blob_id):
+        if thread_id == "THREAD1":
+            raise IOError("disk on fire")
+        return quip_client.get_blob(thread_id, blob_id)
+    exporter.client = Mock(wraps=quip_client)
+    exporter.client.MAX_THREADS_PER_REQUEST = 10
+    exporter.client.MAX_FOLDERS_PER_REQUEST = 100
+    exporter.client.get_blob.side_effect = fail
+
+    report = exporter.run(thread_ids=["THREAD1", "THREAD2"])
+
+    assert report["exported"] == 1
+    assert report["failed"][0]["thread_id"] == "THREAD1"
+    manifest = json.loads((out / "manifest.json").read_text())
+    assert list(manifest["threads"]) == ["THREAD2"]
@@ -0,0 +1,166 @@
+import json
+import time
+import pytest
+from io import BytesIO
+from unittest.mock import patch
+from urllib.error import HTTPError
+from quipclient import QuipError, RequestMetrics
+from quipclient.base import endpoint_family
+from .test_data.threads import SIMPLE_THREAD
+
+
+def test_endpoint_family():
+    assert endpoint_family("threads/THREAD123") == "threads/{id}"
+    assert endpoint_family("2/threads/AbC12/html") == "2/threads/{id}/html"
+    assert endpoint_family("threads/edit-document") == \
+        "threads/edit-document"
+    assert endpoint_family("users/current") == "users/current"
+
+
+def test_hooks_report_cache_and_response(quip_client, mock_urlopen,
+                                         mock_response):
+    events = []
+    for event in quip_client.HOOK_EVENTS:
+        quip_client.add_hook(event, events.append)
+    mock_urlopen.return_value = mock_response(
+        json_data=SIMPLE_THREAD,
+        headers={"X-RateLimit-Remaining": "41"})
+
+    quip_client.get_thread("THREAD123")
+    quip_client.get_thread("THREAD123")
+
+    assert [e["event"] for e in events] == [
+        "cache_miss", "before_request", "after_response", "cache_hit"]
+    response = events[2]
+    assert response["endpoint"] == "threads/{id}"
+    assert response["status"] == 200
+    assert response["cache"] == "miss"
+    assert response["bytes"] == len(json.dumps(SIMPLE_THREAD))
+    assert response["rate_limit_remaining"] == 41
+    for timing in ("queue", "wait", "network", "decode"):
+        assert response[timing] >= 0
+    assert response["total"] >= response["network"]
+    assert events[3]["stale"] is False
+
+
+def test_hooks_report_bulk_and_html_cache(quip_client, mock_urlopen,
+                                          mock_response):
+    """Test cache events for `get_threads` and `get_thread_html_v2`"""
+    events = []
+    for event in ("cache_hit", "cache_miss", "before_request"):
+        quip_client.add_hook(event, events.append)
+
+    mock_urlopen.return_value = mock_response(
+        json_data={"T1": SIMPLE_THREAD})
+    quip_client.get_threads(["T1"])
+    quip_client.get_threads(["T1"])
+    mock_urlopen.return_value = mock_response(json_data={
+        "html": "<p>Hi</p>", "response_metadata": {"next_cursor": ""}})
+    quip_client.get_thread_html_v2("T1", cache=True)
+    quip_client.get_thread_html_v2("T1", cache=True)
+
+    assert [(e["event"], e["endpoint"], e.get("cache")) for e in events] == [
+        ("cache_miss", "threads/{id}", None),
+        ("before_request", "threads/", "miss"),
+        ("cache_hit", "threads/{id}", None),
+        ("cache_miss", "2/threads/{id}/html", None),
+        ("before_request", "2/threads/{id}/html", "miss"),
+        ("cache_hit", "2/threads/{id}/html", None)]
+
+
+def test_hooks_report_errors(quip_client, mock_urlopen):
+    events = []
+    quip_client.add_hook("after_response", events.append)
+    mock_urlopen.side_effect = HTTPError(
+        "url", 404, "Not Found", {},
+        BytesIO(json.dumps({"error_description": "Missing"}).encode()))
+
+    with pytest.raises(QuipError):
+        quip_client.get_thread("MISSING")
+    assert events[0]["status"] == 404
+
+
+def test_hook_errors_do_not_fail_requests(quip_client, mock_urlopen,
+                                          mock_response):
+    def broken(info):
+        raise RuntimeError("broken")
+
+    quip_client.add_hook("after_response", broken)
+    mock_urlopen.return_value = mock_response(json_data=SIMPLE_THREAD)
+    assert quip_client.get_thread("THREAD123") == SIMPLE_THREAD
+
+    with pytest.raises(ValueError):
+        quip_client.add_hook("unknown", broken)
+
+
+def test_rate_limit_wait_event(quip_client, mock_urlopen, mock_response):
+    events = []
+    quip_client.add_hook("rate_limit_wait", events.append)
+    quip_client._rate_limit_remaining = 0
+    quip_client._rate_limit_reset = time.time() + 5
+    mock_urlopen.return_value = mock_response(json_data=SIMPLE_THREAD)
+
+    with patch("quipclient.base.time.sleep"):
+        quip_client.get_thread("THREAD123", cache=False)
+    assert events[0]["scope"] == "user"
+    assert 0 < events[0]["seconds"] <= 5
+
+
+def test_retry_event(quip_client, mock_urlopen, mock_response):
+    events = []
+    quip_client.add_hook("retry", events.append)
+    error = HTTPError(
+        "url", 429, "Too Many Requests", {},
+        BytesIO(json.dumps({"error_description": "Busy"}).encode()))
+    mock_urlopen.side_effect = [error, mock_response(json_data={
+        "thread": {"id": "NEW1"}})]
+
+    with patch("quipclient.quip.time.sleep"):
+        quip_client.new_large_document("<p>Hello</p>", retry_delay=0)
+    assert events[0]["code"] == 429
+    assert events[0]["attempt"] == 1
+    assert events[0]["endpoint"] == "threads/new-document"
+
+
+def test_metrics_summary_and_prometheus(quip_client, mock_urlopen,
+                                        mock_response):
+    metrics = quip_client.enable_metrics(buckets=(0.5, 1.0))
+    assert quip_client.enable_metrics() is metrics
+    mock_urlopen.return_value = mock_response(
+        json_data=SIMPLE_THREAD,
+        headers={"X-RateLimit-Remaining": "12"})
+
+    quip_client.get_thread("THREAD123")
+    quip_client.get_thread("THREAD123")
+
+    stats = metrics.summary()["threads/{id}"]
+    assert stats["requests"] == 1
+    assert stats["cache_hits"] == 1
+    assert stats["cache_misses"] == 1
+    assert stats["p50"] == stats["p99"] >= 0
+
+    text = metrics.to_prometheus()
+    assert "# TYPE quip_client_request_duration_seconds histogram" in text
+    assert 'quip_client_request_duration_seconds_bucket' \
+        '{endpoint="threads/{id}",le="+Inf"} 1' in text
+    assert 'quip_client_cache_hits_total{endpoint="threads/{id}"} 1' in text
+    assert 'quip_client_rate_limit_remaining{scope="user"} 12' in text
+
+
+def test_metrics_percentiles():
+    metrics = RequestMetrics(buckets=(0.01, 0.1))
+    for i in range(1, 101):
+        metrics.record({
+            "event": "after_response", "endpoint": "threads/{id}",
+            "status": 200, "bytes": 10, "queue": 0.0, "wait": 0.0,
+            "network": i / 1000.0, "decode": 0.0, "total": i / 1000.0,
+            "rate_limit_remaining": None,
+            "company_rate_limit_remaining": None})
+
+    assert metrics.percentile("threads/{id}", 50) == 0.05
+    assert metrics.percentile("threads/{id}", 95) == 0.095
+    assert metrics.percentile("threads/{id}", 99) == 0.099
+    assert metrics.percentile("users/{id}", 50) is None
+    text = metrics.to_prometheus()
+    assert 'le="0.01"} 10' in text
+    assert 'le="0.1"} 100' in text
@@ -0,0 +1,172 @@
+import json
+import socket
+import pytest
+from io import BytesIO
+from urllib.error import HTTPError, URLError
+from urllib.parse import parse_qs
+from quipclient import QuipError
+from quipclient.documents import chunk_sections, iter_sections
+
+
+def _error(code):
+    return HTTPError("url", code, "Error", {}, BytesIO(
+        json.dumps({"error_description": "error %d" % code}).encode()))
+
+
+@pytest.fixture
+def document_endpoint(mock_urlopen, mock_response):
+    """Records create and edit requests, failing the queued status codes"""
+    calls = []
+    failures = []
+
+    def _route(request, timeout=None):
+        data = dict((k, v[0]) for k, v in
+                    parse_qs(request.data.decode()).items())
+        calls.append((request.get_full_url().rsplit("/", 1)[-1], data))
+        if failures:
+            raise _error(failures.pop(0))
+        return mock_response(json_data={"thread": {"id": "THREAD1"}})
+    mock_urlopen.side_effect = _route
+    return calls, failures
+
+
+def test_iter_sections_html():
+    """Test that HTML is split between top-level elements"""
+    html = ("<h1>Title</h1><p>One <b>two</b></p><br/><ul><li>a</li>"
+            "<li>b</li></ul><img src='x.png'>tail")
+    assert list(iter_sections(html)) == [
+        "<h1>Title</h1>", "<p>One <b>two</b></p>", "<br/>",
+        "<ul><li>a</li><li>b</li></ul>", "<img src='x.png'>", "tail"]
+
+
+def test_iter_sections_markdown():
+    """Test that markdown is split on blank lines outside code fences"""
+    markdown = "# Title\n\nPara\n\n```\ncode\n\nmore\n```\n\nEnd"
+    sections = list(iter_sections(markdown, "markdown"))
+    assert "".join(sections) == markdown
+    assert sections == ["# Title\n\n", "Para\n\n",
+                        "```\ncode\n\nmore\n```\n\n", "End"]
+
+
+def test_chunk_sections():
+    """Test that chunks stay under the size limit"""
+    html = "".join("<p>%03d</p>" % i for i in range(100))
+    chunks = list(chunk_sections(html, 100))
+    assert "".join(chunks) == html
+    assert all(len(c) <= 100 for c in chunks)
+    assert len(chunks) == 10
+
+
+def test_new_large_document(quip_client, document_endpoint):
+    """Test that the document is created and then appended to in order"""
+    calls, _ = document_endpoint
+    html = "".join("<p>%03d</p>" % i for i in range(30))
+    progress = []
+    response = quip_client.new_large_document(
+        html, title="Report", max_chunk_bytes=100,
+        on_progress=progress.append)
+
+    assert [c[0] for c in calls] == ["new-document"] + ["edit-document"] * 2
+    assert calls[0][1]["title"] == "Report"
+    assert all(c[1]["thread_id"] == "THREAD1" and
+               c[1]["location"] == str(quip_client.APPEND)
+               for c in calls[1:])
+    assert "".join(c[1]["content"] for c in calls) == html
+    assert [p["chunks"] for p in progress] == [1, 2, 3]
+    assert response["upload"]["bytes"] == len(html)
+    assert response["thread"]["id"] == "THREAD1"
+
+
+def test_new_large_document_retries(quip_client, document_endpoint,
+                                    monkeypatch):
+    """Test that failed chunks are retried and client errors are not"""
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+    calls, failures = document_endpoint
+    html = "".join("<p>%03d</p>" % i for i in range(20))
+
+    failures.extend([429, 429])
+    response = quip_client.new_large_document(html, max_chunk_bytes=100)
+    assert len(calls) == 4
+    assert response["upload"]["retries"] == 2
+
+    # A document created despite a 503 cannot be found, so is not retried
+    del calls[:]
+    failures.append(503)
+    with pytest.raises(QuipError):
+        quip_client.new_large_document(html, max_chunk_bytes=100)
+    assert len(calls) == 1
+
+    # Other server errors may have been applied, so are not retried
+    failures.append(500)
+    with pytest.raises(QuipError):
+        quip_client.new_large_document(html, max_chunk_bytes=100)
+
+    failures.append(400)
+    with pytest.raises(QuipError):
+        quip_client.new_large_document(html, max_chunk_bytes=100)
+
+
+def test_new_large_document_checks_failed_appends(quip_client, mock_urlopen,
+                                                  mock_response, monkeypatch):
+    """Test that timed out appends are retried unless they landed"""
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+    document = {"html": ""}
+    appends = []
+
+    def _route(request, timeout=None):
+        if not request.data:
+            return mock_response(json_data={
+                "thread": {"id": "THREAD1"}, "html": document["html"]})
+        data = dict((k, v[0]) for k, v in
+                    parse_qs(request.data.decode()).items())
+        if "thread_id" in data:
+            appends.append(data["content"])
+            if len(appends) == 1:
+                raise socket.timeout("timed out")
+        document["html"] += data["content"]
+        if len(appends) == 2:
+            raise URLError(socket.timeout("timed out"))
+        return mock_response(json_data={
+            "thread": {"id": "THREAD1"}, "html": document["html"]})
+    mock_urlopen.side_effect = _route
+
+    html = "".join("<p>%03d</p>" % i for i in range(30))
+    response = quip_client.new_large_document(html, max_chunk_bytes=100)
+
+    assert document["html"] == html
+    assert response["html"] == html
+    assert len(appends) == 3
+    assert appends[0] == appends[1]
+    assert response["upload"]["retries"] == 1
+
+
+def test_new_large_document_ignores_concurrent_edits(
+        quip_client, mock_urlopen, mock_response, monkeypatch):
+    """Test that a failed append is retried when someone else edited"""
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+    document = {"html": ""}
+    appends = []
+
+    def _route(request, timeout=None):
+        if not request.data:
+            return mock_response(json_data={
+                "thread": {"id": "THREAD1"}, "html": document["html"]})
+        data = dict((k, v[0]) for k, v in
+                    parse_qs(request.data.decode()).items())
+        if "thread_id" in data:
+            appends.append(data["content"])
+            if len(appends) == 1:
+                document["html"] += "<p>edit</p>"
+                raise socket.timeout("timed out")
+        document["html"] += data["content"]
+        return mock_response(json_data={
+            "thread": {"id": "THREAD1"}, "html": document["html"]})
+    mock_urlopen.side_effect = _route
+
+    html = "".join("<p>%03d</p>" % i for i in range(20))
+    response = quip_client.new_large_document(html, max_chunk_bytes=100)
+
+    assert len(appends) == 2
+    assert appends[0] == appends[1]
+    assert document["html"] == html[:100] + "<p>edit</p>" + html[100:]
+    assert response["upload"]["retries"] == 1
@@ -0,0 +1,80 @@
+import threading
+import pytest
+from urllib.parse import urlparse, parse_qs
+from quipclient import QuipError
+
+
+@pytest.fixture
+def users_endpoint(mock_urlopen, mock_response):
+    """Answers bulk users requests for every ID except MISSING"""
+    def _route(request, timeout=None):
+        query = parse_qs(urlparse(request.get_full_url()).query)
+        ids = query["ids"][0].split(",")
+        return mock_response(json_data=dict(
+            (i, {"id": i, "name": "User " + i}) for i in ids
+            if i != "MISSING"))
+    mock_urlopen.side_effect = _route
+    return mock_urlopen
+
+
+def test_loader_batches_and_dedupes(quip_client, users_endpoint):
+    """Test that single lookups inside the block become one request"""
+    author_ids = ["USER%d" % (i % 30) for i in range(150)]
+
+    with quip_client.batch_loader() as loader:
+        futures = [loader.get_user(i) for i in author_ids]
+        assert users_endpoint.call_count == 0
+
+    assert users_endpoint.call_count == 1
+    assert futures[0] is futures[30]
+    assert [f.result()["id"] for f in futures] == author_ids
+
+
+def test_loader_dispatches_full_batches(quip_client, users_endpoint):
+    """Test that a batch is sent as soon as it reaches the request maximum"""
+    with quip_client.batch_loader() as loader:
+        futures = loader.users.load_many(["USER%d" % i for i in range(250)])
+        assert users_endpoint.call_count == 2
+    assert users_endpoint.call_count == 3
+    assert futures[-1].result()["id"] == "USER249"
+
+
+def test_loader_result_inside_block(quip_client, users_endpoint):
+    """Test that reading a pending result dispatches instead of blocking"""
+    with quip_client.batch_loader() as loader:
+        first = loader.get_user("USER1")
+        second = loader.get_user("USER2")
+        assert first.result(timeout=1)["name"] == "User USER1"
+        assert second.done()
+        third = loader.get_user("USER3")
+        assert third.exception(timeout=1) is None
+    assert users_endpoint.call_count == 2
+
+
+def test_loader_missing_entity(quip_client, users_endpoint):
+    """Test that IDs missing from the response fail only their own future"""
+    with quip_client.batch_loader() as loader:
+        found = loader.get_user("USER1")
+        missing = loader.get_user("MISSING")
+    assert found.result()["name"] == "User USER1"
+    with pytest.raises(QuipError):
+        missing.result()
+
+
+def test_loader_wait_window(quip_client, users_endpoint):
+    """Test that concurrent lookups within the wait window share a request"""
+    loader = quip_client.batch_loader(wait=0.05)
+    results = {}
+
+    def lookup(user_id):
+        results[user_id] = loader.get_user(user_id).result(timeout=5)
+
+    workers = [threading.Thread(target=lookup, args=("USER%d" % i,))
+               for i in range(20)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(results) == 20
+    assert users_endpoint.call_count == 1
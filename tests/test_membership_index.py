@@ -0,0 +1,131 @@
+import pytest
+from quipclient import MembershipIndex, QuipClient
+from .test_data.folders import PRIVATE_FOLDER, SHARED_FOLDER
+
+
+def test_folder_tree_and_reverse_lookups():
+    """Test children, parents, members and recursive descendants"""
+    index = MembershipIndex()
+    index.set_folder("ROOT", thread_ids=["T1"], subfolder_ids=["SUB"],
+                     member_ids=["U1"])
+    index.set_folder("SUB", thread_ids=["T2", "T3"], subfolder_ids=["ROOT"])
+
+    assert index.get_children("ROOT") == {"T1", "SUB"}
+    assert index.get_parents("T2") == {"SUB"}
+    assert index.get_descendants("ROOT") == {"T1", "T2", "T3"}
+    assert index.get_descendants("ROOT", include_folders=True) == \
+        {"T1", "T2", "T3", "SUB"}
+    assert index.get_user_folders("U1") == {"ROOT"}
+
+    index.set_folder("SUB", thread_ids=["T3"], subfolder_ids=[])
+    assert index.get_parents("T2") == set()
+    assert index.get_descendants("ROOT") == {"T1", "T3"}
+
+
+def test_mutations():
+    index = MembershipIndex()
+    index.set_folder("F1", thread_ids=["T1"])
+    index.set_folder("F2", thread_ids=[], member_ids=["U1"])
+
+    # move_thread from F1 to F2
+    index.add_thread_members("T1", ["F2", "U2"])
+    index.remove_thread_members("T1", ["F1"])
+    assert index.get_parents("T1") == {"F2"}
+    assert index.get_user_folders("U2") == set()
+
+    index.add_folder_members("F1", ["U1"])
+    index.remove_folder_members("F2", ["U1"])
+    assert index.get_user_folders("U1") == {"F1"}
+
+    index.remove("T1")
+    assert index.get_children("F2") == set()
+
+
+def test_index_persisted(tmp_path):
+    path = str(tmp_path / "membership.json.z")
+    index = MembershipIndex(path)
+    index.set_folder("F1", thread_ids=["T1"], subfolder_ids=["F2"],
+                     member_ids=["U1"])
+    index.save()
+    loaded = MembershipIndex(path)
+    assert loaded.get_parents("F2") == {"F1"}
+    assert loaded.get_user_folders("U1") == {"F1"}
+    assert loaded.get_descendants("F1", include_folders=True) == {"T1", "F2"}
+
+
+def test_client_records_memberships(quip_client, mock_urlopen, mock_response):
+    """Test that responses and mutations passing through the client update
+    the index"""
+    def _route(request, timeout=None):
+        url = request.get_full_url()
+        if request.data:
+            return mock_response(json_data={})
+        if "folders/?ids=" in url or "folders/%3Fids" in url:
+            return mock_response(json_data={"PRIV_FOLD": PRIVATE_FOLDER,
+                                            "SHARE_FOLD": SHARED_FOLDER})
+        if "/folders" in url:
+            return mock_response(json_data={
+                "folders": [{"folder_id": "OTHER", "type": "SHARED"}],
+                "response_metadata": {"next_cursor": ""}})
+        if "users/" in url:
+            return mock_response(json_data={
+                "id": "USER123", "shared_folder_ids": ["SHARE_FOLD"]})
+        return mock_response(json_data={
+            "thread": {"id": "THREAD1"}, "shared_folder_ids": ["SHARE_FOLD"]})
+    mock_urlopen.side_effect = _route
+
+    assert quip_client.membership_index is None
+    index = quip_client.enable_membership_index()
+    quip_client.get_folders(["PRIV_FOLD", "SHARE_FOLD"])
+    quip_client.get_thread("THREAD1", cache=False)
+    quip_client.get_thread_folders_v2("THREAD1")
+    quip_client.get_user("USER123", cache=False)
+
+    assert index.get_parents("THREAD1") == {"PRIV_FOLD", "SHARE_FOLD", "OTHER"}
+    assert index.get_descendants("SHARE_FOLD") == \
+        {"THREAD1", "THREAD2", "THREAD3"}
+    assert index.get_members("SHARE_FOLD") == {"USER123", "USER456",
+                                               "USER789"}
+    assert index.get_user_folders("USER123") == {"SHARE_FOLD"}
+
+    quip_client.move_thread("THREAD2", "SHARE_FOLD", "PRIV_FOLD")
+    assert index.get_parents("THREAD2") == {"PRIV_FOLD"}
+
+
+def test_client_records_cached_memberships(quip_client, mock_urlopen,
+                                          mock_response):
+    """Test that folders and threads served from the cache are recorded"""
+    folder = dict(SHARED_FOLDER,
+                  member_ids=SHARED_FOLDER["member_ids"] + ["TEST_USER_ID"])
+
+    def _route(request, timeout=None):
+        if "ids=" in request.get_full_url():
+            return mock_response(json_data={"SHARE_FOLD": folder})
+        return mock_response(json_data={
+            "thread": {"id": "THREAD4"}, "shared_folder_ids": ["OTHER"]})
+    mock_urlopen.side_effect = _route
+
+    quip_client.get_folders(["SHARE_FOLD"])
+    quip_client.get_thread("THREAD4")
+    calls = mock_urlopen.call_count
+
+    index = quip_client.enable_membership_index()
+    quip_client.get_folders(["SHARE_FOLD"])
+    quip_client.get_thread("THREAD4")
+    assert mock_urlopen.call_count == calls
+
+    assert index.get_descendants("SHARE_FOLD") == {"THREAD2", "THREAD3"}
+    assert "TEST_USER_ID" in index.get_members("SHARE_FOLD")
+    assert index.get_parents("THREAD4") == {"OTHER"}
+
+
+def test_client_saves_index_on_close(tmp_path, mock_urlopen, mock_response):
+    """Test that memberships recorded by a short-lived client persist"""
+    mock_urlopen.return_value = mock_response(json_data={})
+    with QuipClient(cache_dir=str(tmp_path)) as client:
+        client.enable_membership_index()
+        client.add_folder_members("F1", ["U1"])
+
+    with QuipClient(cache_dir=str(tmp_path)) as client:
+        index = client.enable_membership_index()
+        assert index.get_user_folders("U1") == {"F1"}
@@ -0,0 +1,81 @@
+import pytest
+from urllib.parse import urlparse, parse_qs
+
+
+@pytest.fixture
+def chat_thread(mock_urlopen, mock_response):
+    """Serves a growing chat history from mocked get_messages requests"""
+    messages = [{"id": f"MSG{i}", "author_id": "USER1", "text": str(i),
+                 "created_usec": i * 10} for i in range(1, 26)]
+
+    def _route(request, timeout=None):
+        query = parse_qs(urlparse(request.get_full_url()).query)
+        count = int(query["count"][0])
+        newest_first = sorted(messages, key=lambda m: -m["created_usec"])
+        if "max_created_usec" in query:
+            boundary = int(query["max_created_usec"][0])
+            newest_first = [m for m in newest_first
+                            if m["created_usec"] <= boundary]
+        return mock_response(json_data=newest_first[:count])
+    mock_urlopen.side_effect = _route
+    return messages
+
+
+def test_message_history_reads_all_pages(quip_client, mock_urlopen,
+                                         chat_thread):
+    """Test that the iterator pages backwards through the full history"""
+    history = list(quip_client.iter_message_history("THREAD1", page_size=10))
+
+    assert [m["id"] for m in history] == \
+        [f"MSG{i}" for i in range(25, 0, -1)]
+    assert mock_urlopen.call_count == 3
+
+
+def test_message_history_only_refetches_newest_page(quip_client, mock_urlopen,
+                                                    chat_thread):
+    """Test that later runs reuse cached older pages"""
+    list(quip_client.iter_message_history("THREAD1", page_size=10))
+    mock_urlopen.reset_mock()
+
+    history = list(quip_client.iter_message_history("THREAD1", page_size=10))
+    assert len(history) == 25
+    # Newest page, plus the partial oldest page which is never cached
+    assert mock_urlopen.call_count == 2
+
+    chat_thread.extend({"id": f"MSG{i}", "author_id": "USER2",
+                        "text": str(i), "created_usec": i * 10}
+                       for i in range(26, 31))
+    mock_urlopen.reset_mock()
+
+    history = list(quip_client.iter_message_history("THREAD1", page_size=10))
+    assert [m["id"] for m in history] == \
+        [f"MSG{i}" for i in range(30, 0, -1)]
+    assert mock_urlopen.call_count == 2
+
+
+def test_message_history_without_cache(quip_client, mock_urlopen,
+                                       chat_thread):
+    """Test that cache=False fetches every page"""
+    list(quip_client.iter_message_history("THREAD1", page_size=10))
+    mock_urlopen.reset_mock()
+
+    history = list(quip_client.iter_message_history(
+        "THREAD1", page_size=10, cache=False))
+    assert len(history) == 25
+    assert mock_urlopen.call_count == 3
+
+
+def test_message_history_pages_back_to_cached_head(quip_client, mock_urlopen,
+                                                   chat_thread):
+    """Test that more than a page of new messages is read in full"""
+    list(quip_client.iter_message_history("THREAD1", page_size=10))
+    chat_thread.extend({"id": f"MSG{i}", "author_id": "USER2",
+                        "text": str(i), "created_usec": i * 10}
+                       for i in range(26, 51))
+    mock_urlopen.reset_mock()
+
+    history = list(quip_client.iter_message_history("THREAD1", page_size=10))
+    assert [m["id"] for m in history] == \
+        [f"MSG{i}" for i in range(50, 0, -1)]
+    # Three pages reach the previous head, then the partial oldest page
+    assert mock_urlopen.call_count == 4
@@ -0,0 +1,92 @@
+import pytest
+from quipclient import SQLiteMirror
+from .test_data.folders import SHARED_FOLDER
+from .test_data.messages import BASIC_MESSAGES
+from .test_data.threads import SIMPLE_THREAD
+from .test_data.users import AUTH_USER, EMAIL_USER
+
+
+def test_upserts_and_queries():
+    mirror = SQLiteMirror()
+    assert mirror.upsert_threads([SIMPLE_THREAD]) == 1
+    mirror.upsert_folders([SHARED_FOLDER])
+    mirror.upsert_users([AUTH_USER, EMAIL_USER])
+    mirror.upsert_messages("THREAD123", BASIC_MESSAGES)
+
+    assert mirror.get_thread("THREAD123")["title"] == "Project Notes"
+    assert mirror.get_thread("THREAD123")["is_template"] == 0
+    assert [t["id"] for t in mirror.get_folder_threads("FOLDER1")] == \
+        ["THREAD123"]
+    assert [m["id"] for m in mirror.get_thread_messages("THREAD123")] == \
+        ["MSG1", "MSG2"]
+    assert mirror.get_user_by_email("Jane.Doe@test.com")["id"] == "DOE456"
+    assert mirror.query(
+        "SELECT child_id FROM folder_children WHERE folder_id = ? "
+        "AND child_type = 'folder'", ("SHARE_FOLD",)) == \
+        [{"child_id": "SUBFOLD2"}]
+    assert mirror.counts() == {"threads": 1, "folders": 1, "users": 2,
+                               "messages": 2}
+
+
+def test_older_rows_do_not_overwrite_newer():
+    """Test that upserts only apply rows with a newer updated_usec"""
+    mirror = SQLiteMirror()
+    newer = {"thread": dict(SIMPLE_THREAD["thread"], title="New",
+                            updated_usec=20)}
+    older = {"thread": dict(SIMPLE_THREAD["thread"], title="Old",
+                            updated_usec=10)}
+    mirror.upsert_threads([newer])
+    mirror.upsert_threads([older])
+    assert mirror.get_thread("THREAD123")["title"] == "New"
+    assert [t["id"] for t in mirror.get_threads_updated_since(15)] == \
+        ["THREAD123"]
+
+
+def test_client_mirrors_responses(quip_client, mock_urlopen, mock_response,
+                                  tmp_path):
+    """Test that responses passing through the client are mirrored"""
+    def _route(request, timeout=None):
+        url = request.get_full_url()
+        if "threads/delete" in url:
+            return mock_response(json_data={})
+        if "messages/" in url:
+            return mock_response(json_data=BASIC_MESSAGES)
+        if "folders/" in url:
+            return mock_response(json_data={"SHARE_FOLD": SHARED_FOLDER})
+        if "users/" in url:
+            return mock_response(json_data={"DOE456": EMAIL_USER})
+        return mock_response(json_data={"THREAD123": SIMPLE_THREAD})
+    mock_urlopen.side_effect = _route
+    mirror = quip_client.enable_mirror(str(tmp_path / "mirror.sqlite3"))
+
+    quip_client.get_threads(["THREAD123"])
+    quip_client.get_folders(["SHARE_FOLD"])
+    quip_client.get_users(["DOE456"])
+    quip_client.get_messages("THREAD123")
+    assert mirror.counts() == {"threads": 1, "folders": 1, "users": 1,
+                               "messages": 2}
+
+    quip_client.delete_thread("THREAD123")
+    assert mirror.get_thread("THREAD123") is None
+    assert mirror.get_thread_messages("THREAD123") == []
+
+
+def test_client_mirrors_cached_responses(quip_client, mock_urlopen,
+                                         mock_response, tmp_path):
+    """Test that entities served from the cache are mirrored too"""
+    def _route(request, timeout=None):
+        if "users/" in request.get_full_url():
+            return mock_response(json_data={"DOE456": EMAIL_USER})
+        return mock_response(json_data={"THREAD123": SIMPLE_THREAD})
+    mock_urlopen.side_effect = _route
+
+    quip_client.get_threads(["THREAD123"])
+    quip_client.get_users(["DOE456"])
+    calls = mock_urlopen.call_count
+
+    mirror = quip_client.enable_mirror(str(tmp_path / "mirror.sqlite3"))
+    quip_client.get_threads(["THREAD123"])
+    quip_client.get_users(["DOE456"])
+    assert mock_urlopen.call_count == calls
+    assert mirror.counts() == {"threads": 1, "folders": 0, "users": 1,
+                               "messages": 0}
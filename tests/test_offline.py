@@ -0,0 +1,122 @@
+import json
+import time
+import zlib
+import pytest
+from quipclient import CacheMissError, QuipClient
+from .test_data.threads import SIMPLE_THREAD
+
+
+def _online(tmp_path, mock_urlopen, mock_response, **kwargs):
+    def respond(request, timeout=None):
+        url = request.full_url
+        if "users/current" in url:
+            return mock_response(json_data={"id": "TEST_USER_ID"})
+        if "/2/threads/" in url:
+            return mock_response(json_data={
+                "html": "<p>Body</p>",
+                "response_metadata": {"next_cursor": ""}})
+        if "threads/?ids=" in url:
+            return mock_response(json_data={
+                "T1": {"thread": {"id": "T1"}},
+                "T2": {"thread": {"id": "T2"}}})
+        if "users/?ids=" in url:
+            return mock_response(json_data={"U1": {"id": "U1", "name": "A"}})
+        return mock_response(json_data=SIMPLE_THREAD)
+
+    mock_urlopen.side_effect = respond
+    client = QuipClient(access_token="test_token",
+                        cache_dir=str(tmp_path / "cache"), **kwargs)
+    client.get_thread("THREAD123")
+    client.get_threads(["T1", "T2"])
+    client.get_users(["U1"])
+    client.get_thread_html_v2("THREAD123")
+    mock_urlopen.reset_mock()
+    return client
+
+
+def _offline(tmp_path):
+    return QuipClient(access_token="test_token",
+                      cache_dir=str(tmp_path / "cache"), offline=True)
+
+
+def test_serves_reads_from_cache(tmp_path, mock_urlopen, mock_response):
+    _online(tmp_path, mock_urlopen, mock_response)
+    client = _offline(tmp_path)
+
+    assert client._user_id == "TEST_USER_ID"
+    assert client.get_thread("THREAD123", cache=False) == SIMPLE_THREAD
+    assert sorted(client.get_threads(["T1", "T2"], cache=False)) == [
+        "T1", "T2"]
+    assert client.get_user("U1")["name"] == "A"
+    assert client.get_thread_html_v2("THREAD123")["html"] == "<p>Body</p>"
+    assert not mock_urlopen.called
+    assert client.offline_report() == {"misses": 0, "missing_keys": []}
+
+
+def test_reports_missing_keys(tmp_path, mock_urlopen, mock_response):
+    _online(tmp_path, mock_urlopen, mock_response)
+    client = _offline(tmp_path)
+
+    with pytest.raises(CacheMissError) as error:
+        client.get_threads(["T1", "T3", "T4"])
+    assert error.value.keys == ["TEST_USER_ID:threads/T3",
+                                "TEST_USER_ID:threads/T4"]
+    with pytest.raises(CacheMissError):
+        client.get_thread("OTHER")
+    with pytest.raises(CacheMissError):
+        client.get_thread("OTHER")
+    with pytest.raises(CacheMissError):
+        client.edit_document("THREAD123", "<p>New</p>")
+    with pytest.raises(CacheMissError):
+        client.get_blob("THREAD123", "BLOB")
+
+    report = client.offline_report()
+    assert report["misses"] == 6
+    assert report["missing_keys"][:3] == [
+        "TEST_USER_ID:threads/T3", "TEST_USER_ID:threads/T4",
+        "TEST_USER_ID:https://platform.quip.com/1/threads/OTHER"]
+    assert not mock_urlopen.called
+
+    client.reset_offline_report()
+    assert client.offline_report()["misses"] == 0
+
+
+def test_ignores_ttl_when_configured(tmp_path, mock_urlopen, mock_response):
+    mock_urlopen.return_value = mock_response(json_data=SIMPLE_THREAD)
+    online = _online(tmp_path, mock_urlopen, mock_response,
+                     offline_retention=True)
+    mock_urlopen.side_effect = None
+    mock_urlopen.return_value = mock_response(json_data=SIMPLE_THREAD)
+    online.get_thread("SHORT", cache_ttl=0.05)
+    mock_urlopen.reset_mock()
+    time.sleep(0.1)
+
+    client = _offline(tmp_path)
+    with pytest.raises(CacheMissError):
+        client.get_thread("SHORT")
+    client.set_offline(ignore_ttl=True)
+    assert client.get_thread("SHORT") == SIMPLE_THREAD
+    client.set_offline(False)
+    assert client.get_thread("SHORT") == SIMPLE_THREAD
+    assert mock_urlopen.call_count == 1
+
+
+def test_expiry_kept_in_tag(quip_client):
+    """Test that expired entries are culled unless retained for offline
+    reads, where they expire through their tag alone"""
+    key = quip_client._cache_key("threads/T1")
+    quip_client._cache_store(key, {"id": "T1"}, 60)
+    assert quip_client._cache.get(key, expire_time=True)[1] is not None
+
+    quip_client.offline_retention = True
+    quip_client._cache_store(key, {"id": "T1"}, 0.05)
+    assert quip_client._cache.get(key, expire_time=True)[1] is None
+    assert quip_client._cache_load(key) == {"id": "T1"}
+    time.sleep(0.1)
+    assert quip_client._cache_load(key) is None
+    assert key in quip_client._cache
+
+    # Entries written with a bare write time tag are still read
+    quip_client._cache.set(key, zlib.compress(json.dumps(
+        {"id": "T1"}).encode()), 60, tag=time.time())
+    assert quip_client._cache_load_entry(key)[0] == {"id": "T1"}
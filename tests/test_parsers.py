@@ -0,0 +1,87 @@
+import xml.etree.cElementTree
+import pytest
+from quipclient import QuipClient
+from quipclient.parsers import (
+    get_parser, lxml_available, parse_auto, parse_html, parse_lxml,
+    parse_xml)
+
+DOCUMENT_HTML = (
+    "<h1 id='H1'>Title</h1>"
+    "<p id='P1' class='line'>Some <b>bold</b> text<br/></p>"
+    "<ul id='L1'><li id='I1' class='checked'><span>One</span></li>"
+    "<li id='I2' class=''><span>Two\u200b</span></li></ul>"
+    "<table id='T1' title='Budget'><tbody><tr id='R1'>"
+    "<td id='C1' style='background-color:#FF0000;'>1</td></tr></tbody>"
+    "</table>"
+)
+
+MALFORMED_HTML = (
+    "<p id='P1'>One<br>two&nbsp;&amp; <b>three</p>"
+    "<ul id='L1'><li id='I1'>a<li id='I2'>b</ul></div>"
+)
+
+
+def _dump(tree):
+    return xml.etree.cElementTree.tostring(tree, encoding="unicode")
+
+
+def test_html_parser_matches_xml_parser():
+    """Test that the tolerant parser builds the same tree for valid HTML"""
+    assert _dump(parse_html(DOCUMENT_HTML)) == _dump(parse_xml(DOCUMENT_HTML))
+
+
+def test_html_parser_tolerates_malformed_html():
+    """Test that void, unclosed and stray tags and HTML entities parse"""
+    with pytest.raises(xml.etree.cElementTree.ParseError):
+        parse_xml(MALFORMED_HTML)
+    tree = parse_html(MALFORMED_HTML)
+    assert _dump(tree) == (
+        '<html><p id="P1">One<br />two\xa0&amp; <b>three</b></p>'
+        '<ul id="L1"><li id="I1">a</li><li id="I2">b</li></ul></html>')
+    assert _dump(parse_auto(MALFORMED_HTML)) == _dump(tree)
+
+
+@pytest.mark.skipif(not lxml_available(), reason="lxml is not installed")
+def test_lxml_parser():
+    """Test that the lxml backend returns standard library elements"""
+    tree = parse_lxml(MALFORMED_HTML)
+    assert isinstance(tree, xml.etree.cElementTree.Element)
+    assert [e.attrib["id"] for e in tree.iter("li")] == ["I1", "I2"]
+    assert _dump(parse_lxml(DOCUMENT_HTML)) == _dump(parse_xml(DOCUMENT_HTML))
+
+
+def test_get_parser():
+    assert get_parser() is parse_auto
+    assert get_parser("html") is parse_html
+    assert get_parser(len) is len
+    with pytest.raises(ValueError):
+        get_parser("regex")
+
+
+def test_client_parser_option(tmp_path, mock_urlopen):
+    """Test that the client helpers use the configured backend"""
+    client = QuipClient(cache_dir=str(tmp_path / "cache"), html_parser="html")
+    items = client.get_first_list(document_html=MALFORMED_HTML).iter("li")
+    assert [i.attrib["id"] for i in items] == ["I1", "I2"]
+
+    strict = QuipClient(cache_dir=str(tmp_path / "cache2"), html_parser="xml")
+    with pytest.raises(xml.etree.cElementTree.ParseError):
+        strict.get_first_list(document_html=MALFORMED_HTML)
+
+
+def test_client_parser_option_streams_spreadsheets(tmp_path, mock_urlopen):
+    """Test that the streaming spreadsheet helpers follow the backend"""
+    html = ("<p id='P1'>Totals<br></p><table id='T1'><tr id='H'>"
+            "<th id='H1'>Name</th><th id='H2'>Amount</th></tr>"
+            "<tr id='R1'><td id='A1'>a&nbsp;b</td><td id='B1'>2</td>"
+            "<tr id='R2'><td id='A2'>c</td><td id='B2'>3</td></table>")
+    for parser in ("html", "auto"):
+        client = QuipClient(cache_dir=str(tmp_path / parser),
+                            html_parser=parser)
+        columns = client.get_spreadsheet_columns(document_html=html)
+        assert columns.row_ids == ["R1", "R2"]
+        assert columns.columns["Amount"] == ["2", "3"]
+
+    strict = QuipClient(cache_dir=str(tmp_path / "xml"), html_parser="xml")
+    with pytest.raises(xml.etree.cElementTree.ParseError):
+        strict.get_spreadsheet_columns(document_html=html)
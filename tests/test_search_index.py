@@ -0,0 +1,129 @@
+import pytest
+from quipclient import QuipClient, SearchIndex
+
+
+def _thread(thread_id, title, html, updated_usec=1):
+    return {"thread": {"id": thread_id, "title": title,
+                       "updated_usec": updated_usec}, "html": html}
+
+
+ROADMAP = _thread(
+    "THREAD1", "Team Roadmap",
+    "<h1 id='S1'>Goals</h1><p id='S2'>Ship the export pipeline</p>"
+    "<ul id='L1'><li id='S3'>Export <b>pipeline</b> metrics</li></ul>")
+NOTES = _thread(
+    "THREAD2", "Meeting notes",
+    "<p id='N1'>Discussed the roadmap and export quotas</p>")
+
+
+def test_search_ranks_titles_and_sections():
+    """Test term intersection, title boosts and section postings"""
+    index = SearchIndex()
+    index.add_thread("THREAD1", ROADMAP["html"], "Team Roadmap")
+    index.add_thread("THREAD2", NOTES["html"], "Meeting notes")
+
+    results = index.search("export")
+    assert [r["thread_id"] for r in results] == ["THREAD1", "THREAD2"]
+    assert results[0]["section_ids"] == ["S2", "S3"]
+
+    results = index.search("Roadmap")
+    assert [r["thread_id"] for r in results] == ["THREAD1", "THREAD2"]
+    assert results[0]["section_ids"] == []
+    assert results[1]["section_ids"] == ["N1"]
+
+    assert [r["thread_id"] for r in index.search("export quotas")] == \
+        ["THREAD2"]
+    assert index.search("missing") == []
+
+
+def test_reindex_replaces_postings():
+    """Test that a changed thread is reindexed and the same one skipped"""
+    index = SearchIndex()
+    index.add_thread("THREAD1", "<p id='A'>alpha</p>", "Doc", 1)
+    index.add_thread("THREAD1", "<p id='A'>beta</p>", "Doc", 1)
+    assert index.search("alpha")
+    index.add_thread("THREAD1", "<p id='A'>beta</p>", None, 2)
+    assert index.search("alpha") == []
+    assert index.search("doc beta")[0]["section_ids"] == ["A"]
+    index.remove_thread("THREAD1")
+    assert len(index) == 0
+    assert index.search("beta") == []
+
+
+def test_index_persisted(tmp_path):
+    path = str(tmp_path / "index.json.z")
+    index = SearchIndex(path)
+    index.add_thread("THREAD1", ROADMAP["html"], "Team Roadmap")
+    index.save()
+    loaded = SearchIndex(path)
+    assert "THREAD1" in loaded
+    assert loaded.search("pipeline")[0]["section_ids"] == ["S2", "S3"]
+
+
+def test_client_indexes_fetched_threads(quip_client, mock_urlopen,
+                                        mock_response):
+    """Test that fetched, refreshed and deleted threads update the index"""
+    def _route(request, timeout=None):
+        url = request.get_full_url()
+        if "threads/delete" in url:
+            return mock_response(json_data={})
+        if "/html" in url:
+            return mock_response(json_data={
+                "html": "<p id='V1'>Quarterly budget</p>",
+                "response_metadata": {"next_cursor": ""}})
+        if "ids=" in url:
+            return mock_response(json_data={"THREAD1": ROADMAP,
+                                            "THREAD2": NOTES})
+        return mock_response(json_data=ROADMAP)
+    mock_urlopen.side_effect = _route
+
+    assert quip_client.search_index is None
+    quip_client.enable_search_index()
+    quip_client.get_threads(["THREAD1", "THREAD2"])
+    quip_client.get_thread_html_v2("THREAD3")
+    calls = mock_urlopen.call_count
+
+    assert [r["thread_id"] for r in quip_client.search_local("export")] == \
+        ["THREAD1", "THREAD2"]
+    assert quip_client.search_local("budget")[0]["section_ids"] == ["V1"]
+    assert mock_urlopen.call_count == calls
+
+    quip_client.delete_thread("THREAD2")
+    assert [r["thread_id"] for r in quip_client.search_local("export")] == \
+        ["THREAD1"]
+
+    cache_dir = quip_client._cache.directory
+    quip_client.close()
+    with QuipClient(cache_dir=cache_dir) as client:
+        assert client.search_index is None
+        assert client.search_local("budget")[0]["thread_id"] == "THREAD3"
+
+
+def test_client_indexes_cached_threads(quip_client, mock_urlopen,
+                                       mock_response):
+    """Test that threads served from the cache are indexed too"""
+    def _route(request, timeout=None):
+        url = request.get_full_url()
+        if "/html" in url:
+            return mock_response(json_data={
+                "html": "<p id='V1'>Quarterly budget</p>",
+                "response_metadata": {"next_cursor": ""}})
+        if "ids=" in url:
+            return mock_response(json_data={"THREAD2": NOTES})
+        return mock_response(json_data=ROADMAP)
+    mock_urlopen.side_effect = _route
+
+    quip_client.get_thread("THREAD1")
+    quip_client.get_threads(["THREAD2"])
+    quip_client.get_thread_html_v2("THREAD3", cache=True)
+    calls = mock_urlopen.call_count
+
+    quip_client.enable_search_index()
+    quip_client.get_thread("THREAD1")
+    quip_client.get_threads(["THREAD2"])
+    quip_client.get_thread_html_v2("THREAD3", cache=True)
+    assert mock_urlopen.call_count == calls
+
+    assert [r["thread_id"] for r in quip_client.search_local("export")] == \
+        ["THREAD1", "THREAD2"]
+    assert quip_client.search_local("budget")[0]["thread_id"] == "THREAD3"
@@ -0,0 +1,118 @@
+import json
+import pytest
+from io import BytesIO
+from urllib.error import HTTPError
+from urllib.parse import parse_qs
+from quipclient import QuipError
+from quipclient.spreadsheets import chunk_rows, find_inserted_row_id
+
+
+class FakeSpreadsheet:
+    """Applies row inserts to a spreadsheet and returns the new HTML"""
+
+    def __init__(self, fail_on=None):
+        self.rows = ["R1", "R2"]
+        self.edits = []
+        self.gets = 0
+        self.fail_on = fail_on
+
+    def html(self):
+        return ("<table id='TABLE1'><thead><tr id='HEAD'><th>A</th></tr>"
+                "</thead><tbody>%s</tbody></table>" % "".join(
+                    "<tr id='%s'><td id='%s-A'>x</td></tr>" % (r, r)
+                    for r in self.rows))
+
+    def route(self, mock_response):
+        def _route(request, timeout=None):
+            if not request.data:
+                self.gets += 1
+                return mock_response(json_data={
+                    "thread": {"id": "THREAD1"}, "html": self.html()})
+            edit = dict((k, v[0]) for k, v in
+                        parse_qs(request.data.decode()).items())
+            self.edits.append(edit)
+            if len(self.edits) == self.fail_on:
+                raise HTTPError("url", 400, "Bad Request", {}, BytesIO(
+                    json.dumps({"error_description": "failed"}).encode()))
+            count = edit["content"].count("<tr>")
+            new = ["N%d" % (len(self.edits) * 100 + i) for i in range(count)]
+            index = self.rows.index(edit["section_id"])
+            if edit["location"] == "2":
+                index += 1
+            self.rows[index:index] = new
+            return mock_response(json_data={
+                "thread": {"id": "THREAD1"}, "html": self.html()})
+        return _route
+
+
+@pytest.fixture
+def spreadsheet(mock_urlopen, mock_response):
+    fake = FakeSpreadsheet()
+    mock_urlopen.side_effect = fake.route(mock_response)
+    return fake
+
+
+def test_chunk_rows_by_size():
+    """Test that chunks stay under the byte limit, except single rows"""
+    rows = [["a" * 10]] * 5 + [["b" * 100]]
+    chunks = list(chunk_rows(rows, 60))
+    assert [len(c) for c, _ in chunks] == [2, 2, 1, 1]
+    assert all(len(content) <= 60 for c, content in chunks if len(c) > 1)
+
+
+def test_find_inserted_row_id():
+    """Test scanning edit responses for the last inserted row"""
+    html = ("<tr id='R1'></tr><tr id=\"N1\"></tr><tr class='x' id='N2'>"
+            "</tr><tr id='R2'></tr>")
+    assert find_inserted_row_id(html, "R1", 2) == "N2"
+    assert find_inserted_row_id(html, "R2", 2, before=True) == "N2"
+    assert find_inserted_row_id(html, "R1", 5) is None
+    assert find_inserted_row_id(html, "MISSING", 1) is None
+
+
+def test_bulk_append_chains_chunks(quip_client, spreadsheet):
+    """Test that each chunk is inserted after the previous chunk's rows"""
+    progress = []
+    rows = [["row %d" % i] for i in range(10)]
+    state = quip_client.bulk_add_to_spreadsheet(
+        "THREAD1", rows, max_chunk_bytes=60, on_progress=progress.append)
+
+    assert spreadsheet.gets == 1
+    assert [e["section_id"] for e in spreadsheet.edits] == \
+        ["R2", "N101", "N201", "N301", "N401"]
+    assert len(spreadsheet.rows) == 12
+    assert spreadsheet.rows[-1] == "N501"
+    assert [p["rows_committed"] for p in progress] == [2, 4, 6, 8, 10]
+    assert state["chunks_committed"] == 5
+    assert state["last_row_id"] == "N501"
+
+
+def test_bulk_append_to_top(quip_client, spreadsheet):
+    """Test that rows added to the top keep their order"""
+    quip_client.bulk_add_to_spreadsheet(
+        "THREAD1", [["a"], ["b"], ["c"]], add_to_top=True, max_chunk_bytes=20)
+    assert [(e["section_id"], e["location"]) for e in spreadsheet.edits] == \
+        [("R1", "3"), ("N100", "2"), ("N200", "2")]
+    assert spreadsheet.rows == ["N100", "N200", "N300", "R1", "R2"]
+
+
+def test_bulk_append_resume(quip_client, mock_urlopen, mock_response):
+    """Test resuming after a failed chunk skips the committed rows"""
+    spreadsheet = FakeSpreadsheet(fail_on=3)
+    mock_urlopen.side_effect = spreadsheet.route(mock_response)
+    rows = [["row %d" % i] for i in range(6)]
+    state = {}
+
+    with pytest.raises(QuipError):
+        quip_client.bulk_add_to_spreadsheet(
+            "THREAD1", rows, max_chunk_bytes=60, on_progress=state.update)
+    assert state["rows_committed"] == 4
+
+    spreadsheet.fail_on = None
+    quip_client.bulk_add_to_spreadsheet(
+        "THREAD1", rows, max_chunk_bytes=60, resume=state)
+    assert spreadsheet.gets == 1
+    assert spreadsheet.edits[-1]["section_id"] == "N201"
+    assert spreadsheet.edits[-1]["content"] == \
+        "<tr><td>row 4</td></tr><tr><td>row 5</td></tr>"
+    assert len(spreadsheet.rows) == 8
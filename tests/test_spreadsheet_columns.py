@@ -0,0 +1,83 @@
+import csv
+import io
+import pytest
+from quipclient.spreadsheets import SpreadsheetColumns
+
+SPREADSHEET_HTML = (
+    "<table id='TABLE1' title='Sales'><thead><tr id='HEAD'>"
+    "<th id='H1'>Region</th><th id='H2'>Amount</th><th id='H3'>Note</th>"
+    "</tr></thead><tbody>"
+    "<tr id='R1'><td id='A1'>North</td>"
+    "<td id='B1' style='background-color:#00FF00;'>10</td>"
+    "<td id='C1'>ok, \"fine\"</td></tr>"
+    "<tr id='R2'><td id='A2'>South</td><td id='B2'>32</td></tr>"
+    "<tr id='R3'><td id='A3'>East</td><td id='B3'>5</td>"
+    "<td id='C3'><img src='/blob/T/IMG'/></td></tr>"
+    "</tbody></table>"
+)
+
+
+def test_columns_match_row_dicts(quip_client):
+    """Test that columns hold the same values as parse_spreadsheet_contents"""
+    columns = quip_client.get_spreadsheet_columns(
+        document_html=SPREADSHEET_HTML)
+    rows = quip_client.parse_spreadsheet_contents(
+        quip_client.get_first_spreadsheet(
+            document_html=SPREADSHEET_HTML))["rows"]
+
+    assert columns.id == "TABLE1"
+    assert columns.headers == ["Region", "Amount", "Note"]
+    assert columns.row_ids == [r["id"] for r in rows]
+    for header in ("Region", "Amount"):
+        assert columns.columns[header] == \
+            [r["cells"][header]["content"] for r in rows]
+        assert columns.cell_ids[header] == \
+            [r["cells"][header]["id"] for r in rows]
+    assert columns.colors["Amount"] == ["00FF00", None, None]
+    assert columns.columns["Note"] == ['ok, "fine"', None, "/blob/T/IMG"]
+    assert len(columns) == 3
+
+
+def test_columns_to_csv(quip_client):
+    """Test CSV output with quoting and missing cells"""
+    columns = quip_client.get_spreadsheet_columns(
+        document_html=SPREADSHEET_HTML, name="Sales")
+    parsed = list(csv.reader(io.StringIO(columns.to_csv())))
+    assert parsed == [["Region", "Amount", "Note"],
+                      ["North", "10", 'ok, "fine"'],
+                      ["South", "32", ""],
+                      ["East", "5", "/blob/T/IMG"]]
+
+    out = io.StringIO()
+    columns.to_csv(out, include_header=False)
+    assert out.getvalue().count("\n") == 3
+
+
+def test_columns_to_numpy(quip_client):
+    """Test NumPy output when numpy is installed"""
+    numpy = pytest.importorskip("numpy")
+    columns = quip_client.get_spreadsheet_columns(
+        document_html=SPREADSHEET_HTML)
+    arrays = columns.to_numpy()
+    assert arrays["Amount"].astype(float).sum() == 47.0
+    assert isinstance(arrays["Region"], numpy.ndarray)
+
+
+def test_columns_to_numpy_blank_floats(quip_client):
+    """Test that empty cells become NaN in float arrays"""
+    numpy = pytest.importorskip("numpy")
+    html = SPREADSHEET_HTML.replace(
+        "</tbody>", "<tr id='R4'><td id='A4'>West</td>"
+        "<td id='B4'>\u200b</td></tr></tbody>")
+    columns = quip_client.get_spreadsheet_columns(document_html=html)
+    arrays = columns.to_numpy(float, headers=["Amount"])
+    assert list(arrays) == ["Amount"]
+    assert numpy.isnan(arrays["Amount"][3])
+    assert numpy.nansum(arrays["Amount"]) == 47.0
+
+
+def test_empty_columns():
+    """Test columns built from no rows"""
+    columns = SpreadsheetColumns.from_rows([], headers=["A"])
+    assert len(columns) == 0
+    assert columns.columns == {"A": []}
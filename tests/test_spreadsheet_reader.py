@@ -0,0 +1,113 @@
+import tracemalloc
+import xml.etree.cElementTree
+import pytest
+from quipclient.parsers import parse_html
+from quipclient.spreadsheets import SpreadsheetReader
+
+
+def _spreadsheet_html(rows, title="Tracker", table_id="TABLE1"):
+    cells = []
+    for r in range(rows):
+        cells.append(
+            "<tr id='ROW%d'><td id='A%d'>Item %d​</td>"
+            "<td id='B%d' style='background-color:#FF0000;'>%d</td>"
+            "<td id='C%d'><img src='/blob/T/IMG%d'/></td></tr>"
+            % (r, r, r, r, r, r, r))
+    return ("<table id='%s' title='%s'><thead><tr id='HEAD'>"
+            "<th id='H1'>Name</th><th id='H2'>Count</th>"
+            "<th id='H3'>Picture</th></tr></thead><tbody>%s</tbody></table>"
+            % (table_id, title, "".join(cells)))
+
+
+DOCUMENT_HTML = ("<h1 id='TITLE'>Doc</h1>"
+                 + _spreadsheet_html(3, "Other", "TABLE0")
+                 + "<p id='P1'>Between</p>"
+                 + _spreadsheet_html(50))
+
+
+def test_reader_matches_parse_spreadsheet_contents(quip_client):
+    """Test that streamed rows equal the tree-based representation"""
+    expected = quip_client.parse_spreadsheet_contents(
+        quip_client.get_named_spreadsheet(
+            "Tracker", document_html=DOCUMENT_HTML))
+
+    reader = quip_client.iter_spreadsheet_rows(
+        document_html=DOCUMENT_HTML, name="Tracker")
+    rows = list(reader)
+
+    assert rows == expected["rows"]
+    assert reader.headers == expected["headers"]
+    assert reader.id == "TABLE1"
+    assert rows[0]["cells"]["Count"]["color"] == "FF0000"
+    assert rows[0]["cells"]["Picture"]["content"] == "/blob/T/IMG0"
+    assert rows[0]["cells"]["Name"]["content"] == "Item 0"
+
+
+def test_reader_by_index_and_chunks(quip_client):
+    """Test selecting a table by index and feeding HTML in small chunks"""
+    chunks = [DOCUMENT_HTML[i:i + 7] for i in range(0, len(DOCUMENT_HTML), 7)]
+    rows = list(SpreadsheetReader(iter(chunks), index=1))
+    assert len(rows) == 50
+    assert rows[-1]["id"] == "ROW49"
+
+    first = SpreadsheetReader(DOCUMENT_HTML)
+    assert [r["id"] for r in first] == ["ROW0", "ROW1", "ROW2"]
+    assert first.id == "TABLE0"
+
+
+def test_reader_tolerant_parsers(quip_client):
+    """Test streaming HTML that is not well-formed XML"""
+    html = DOCUMENT_HTML.replace(
+        "<td id='A10'>Item 10\u200b</td>",
+        "<td id='A10'>Item 10\u200b<br></td>").replace(
+        "<td id='B20' ", "<td id='B20' title='a&nbsp;b' ")
+    table = [t for t in parse_html(html).iter("table")
+             if t.attrib.get("title") == "Tracker"][0]
+    expected = quip_client.parse_spreadsheet_contents(table)["rows"]
+
+    with pytest.raises(xml.etree.cElementTree.ParseError):
+        list(SpreadsheetReader(html, name="Tracker"))
+    assert list(SpreadsheetReader(html, name="Tracker",
+                                  parser="html")) == expected
+    reader = SpreadsheetReader(html, name="Tracker", parser="auto")
+    assert list(reader) == expected
+    assert reader.id == "TABLE1"
+    chunks = [html[i:i + 100] for i in range(0, len(html), 100)]
+    assert list(SpreadsheetReader(iter(chunks), name="Tracker",
+                                  parser="auto")) == expected
+    with pytest.raises(ValueError):
+        SpreadsheetReader(html, parser="lxml")
+
+
+def test_reader_drops_processed_rows(quip_client):
+    """Test that streaming keeps far less in memory than the full tree"""
+    html = _spreadsheet_html(5000)
+
+    tracemalloc.start()
+    tree = quip_client.parse_document_html(html)
+    tree_peak = tracemalloc.get_traced_memory()[1]
+    del tree
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    for row in SpreadsheetReader(html):
+        pass
+    stream_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    assert stream_peak < tree_peak / 4
+
+
+def test_reader_missing_spreadsheet(quip_client):
+    """Test that an unknown name yields no rows"""
+    missing = SpreadsheetReader(DOCUMENT_HTML, name="Nope")
+    assert list(missing) == []
+    assert not missing.found
+
+
+def test_reader_from_thread(quip_client, mock_urlopen, mock_response):
+    """Test streaming a spreadsheet from a fetched thread"""
+    mock_urlopen.return_value = mock_response(json_data={
+        "thread": {"id": "THREAD1"}, "html": DOCUMENT_HTML})
+    rows = list(quip_client.iter_spreadsheet_rows("THREAD1", name="Tracker"))
+    assert len(rows) == 50
@@ -0,0 +1,146 @@
+import pytest
+from urllib.parse import parse_qs
+from quipclient.spreadsheets import diff_spreadsheet
+
+SPREADSHEET_HTML = (
+    "<table id='TABLE1' title='Billing'><thead><tr id='HEAD'>"
+    "<th id='H0'>#</th><th id='H1'>Customer</th><th id='H2'>Billed</th>"
+    "</tr></thead><tbody>"
+    "<tr id='R1'><td id='N1'>1</td><td id='A1'>Acme</td>"
+    "<td id='B1'>6/1</td></tr>"
+    "<tr id='R2'><td id='N2'>2</td><td id='A2'>Initech</td>"
+    "<td id='B2'>6/2</td></tr>"
+    "<tr id='R3'><td id='N3'>3</td><td id='A3'>Hooli</td>"
+    "<td id='B3'>6/3</td></tr>"
+    "<tr id='R4'><td id='N4'>4</td><td id='A4'>\u200b</td>"
+    "<td id='B4'>\u200b</td></tr>"
+    "</tbody></table>"
+)
+
+DESIRED = [
+    {"customer": "Globex", "Billed": "5/1"},
+    {"Customer": "Acme", "Billed": "6/1"},
+    {"Customer": "Initech", "Billed": "7/2"},
+    {"Customer": "Umbrella", "Billed": "7/3"},
+    {"Customer": "Stark", "Billed": "7/4", "Region": "West"},
+]
+
+
+@pytest.fixture
+def spreadsheet(quip_client):
+    return quip_client.parse_spreadsheet_contents(
+        quip_client.get_first_spreadsheet(document_html=SPREADSHEET_HTML))
+
+
+def test_keyed_diff(spreadsheet):
+    """Test the minimal plan when rows are matched by key"""
+    patch = diff_spreadsheet(spreadsheet, DESIRED, key_header="Customer")
+
+    assert patch.replacements == [("B2", "7/2")]
+    assert [(w, s, [r["Customer"] for r in rows])
+            for w, s, rows in patch.inserts] == [
+        ("before", "R1", ["Globex"]),
+        ("after", "R2", ["Umbrella", "Stark"]),
+    ]
+    assert patch.deletes == ["R3"]
+    assert patch.unknown_headers == ["Region"]
+    assert patch.request_count() == 4
+    assert patch.request_count(max_rows_per_edit=1) == 5
+
+
+def test_positional_diff(spreadsheet):
+    """Test matching rows by position"""
+    patch = diff_spreadsheet(spreadsheet, [
+        {"Customer": "Acme", "Billed": "6/1"},
+        {"Customer": "Initech", "Billed": "6/2"},
+    ])
+    assert patch.replacements == []
+    assert patch.inserts == []
+    assert patch.deletes == ["R3", "R4"]
+
+    patch = diff_spreadsheet(spreadsheet, [{"Customer": "Acme"}] * 5)
+    assert patch.inserts[0][:2] == ("after", "R4")
+    assert len(patch.replacements) == 3
+
+
+def test_sync_dry_run(quip_client, mock_urlopen, mock_response):
+    """Test that a dry run reports the plan without editing"""
+    mock_urlopen.return_value = mock_response(json_data={
+        "thread": {"id": "THREAD1", "updated_usec": 1},
+        "html": SPREADSHEET_HTML})
+    patch = quip_client.sync_spreadsheet(
+        "THREAD1", DESIRED, key_header="Customer", dry_run=True)
+    assert patch.as_dict()["requests"] == 4
+    assert mock_urlopen.call_count == 1
+    assert patch.responses == []
+
+    patch = quip_client.sync_spreadsheet(
+        "THREAD1", DESIRED, key_header="Customer", dry_run=True,
+        max_rows_per_edit=1)
+    assert patch.max_rows_per_edit == 1
+    assert patch.as_dict()["requests"] == 5
+
+
+def test_sync_applies_edits(quip_client, mock_urlopen, mock_response):
+    """Test the edit requests sent to apply a plan"""
+    edits = []
+
+    def _route(request, timeout=None):
+        if request.data:
+            edits.append(dict((k, v[0]) for k, v in
+                              parse_qs(request.data.decode()).items()))
+            return mock_response(json_data={})
+        return mock_response(json_data={
+            "thread": {"id": "THREAD1", "updated_usec": 1},
+            "html": SPREADSHEET_HTML})
+    mock_urlopen.side_effect = _route
+
+    patch = quip_client.sync_spreadsheet(
+        "THREAD1", DESIRED, key_header="Customer")
+
+    assert len(patch.responses) == 4
+    assert [(e["location"], e.get("section_id")) for e in edits] == [
+        (str(quip_client.REPLACE_SECTION), "B2"),
+        (str(quip_client.BEFORE_SECTION), "R1"),
+        (str(quip_client.AFTER_SECTION), "R2"),
+        (str(quip_client.DELETE_SECTION), "R3"),
+    ]
+    assert edits[2]["content"] == (
+        "<tr><td></td><td>Umbrella</td><td>7/3</td></tr>"
+        "<tr><td></td><td>Stark</td><td>7/4</td></tr>")
+
+
+def test_sync_twice_reads_current_document(quip_client, mock_urlopen,
+                                           mock_response):
+    """Test that a repeated sync does not insert the same rows again"""
+    document = {"html": SPREADSHEET_HTML, "updated_usec": 1}
+
+    def _route(request, timeout=None):
+        if request.data:
+            edit = parse_qs(request.data.decode())
+            if "Globex" in edit["content"][0]:
+                document["html"] = document["html"].replace(
+                    "<tr id='R4'>", "<tr id='R5'><td id='N5'>5</td>"
+                    "<td id='A5'>Globex</td><td id='B5'>6/5</td></tr>"
+                    "<tr id='R4'>")
+                document["updated_usec"] += 1
+            return mock_response(json_data={})
+        return mock_response(json_data={
+            "thread": {"id": "THREAD1",
+                       "updated_usec": document["updated_usec"]},
+            "html": document["html"]})
+    mock_urlopen.side_effect = _route
+    quip_client.get_thread("THREAD1")
+
+    desired = [{"Customer": "Acme", "Billed": "6/1"},
+               {"Customer": "Initech", "Billed": "6/2"},
+               {"Customer": "Hooli", "Billed": "6/3"},
+               {"Customer": "Globex", "Billed": "6/5"}]
+    first = quip_client.sync_spreadsheet("THREAD1", desired,
+                                         key_header="Customer")
+    second = quip_client.sync_spreadsheet("THREAD1", desired,
+                                          key_header="Customer")
+
+    assert len(first.inserts) == 1
+    assert second.inserts == []
+    assert quip_client.get_thread("THREAD1")["html"].count("Globex") == 1
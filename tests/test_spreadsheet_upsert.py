@@ -0,0 +1,105 @@
+import pytest
+from urllib.parse import parse_qs
+
+SPREADSHEET_HTML = (
+    "<table id='TABLE1' title='Billing'><thead><tr id='HEAD'>"
+    "<th id='H0'>#</th><th id='H1'>Customer</th><th id='H2'>Billed</th>"
+    "<th id='H3'>Owner</th></tr></thead><tbody>"
+    "<tr id='R1'><td id='N1'>1</td><td id='A1'>Acme</td>"
+    "<td id='B1'>6/1/2015</td><td id='C1'>Ann</td></tr>"
+    "<tr id='R2'><td id='N2'>2</td><td id='A2'>Initech</td>"
+    "<td id='B2'>6/2/2015\u200b</td><td id='C2'>Bob</td></tr>"
+    "</tbody></table>"
+)
+
+
+@pytest.fixture
+def spreadsheet_thread(mock_urlopen, mock_response):
+    """Serves one spreadsheet thread and records edit requests"""
+    edits = []
+
+    def _route(request, timeout=None):
+        if request.data:
+            edits.append(dict((k, v[0]) for k, v in
+                              parse_qs(request.data.decode()).items()))
+            return mock_response(json_data={"thread": {"id": "THREAD1"}})
+        return mock_response(json_data={
+            "thread": {"id": "THREAD1", "updated_usec": 1},
+            "html": SPREADSHEET_HTML})
+    mock_urlopen.side_effect = _route
+    return edits
+
+
+def test_bulk_upsert(quip_client, mock_urlopen, spreadsheet_thread):
+    """Test that updates, no-ops and inserts use the fewest edits"""
+    result = quip_client.update_spreadsheet_rows("THREAD1", "Customer", [
+        {"Customer": "acme", "Billed": "7/1/2015"},
+        {"Customer": "Acme", "Owner": "Zed"},
+        {"Customer": "Initech", "Billed": "6/2/2015"},
+        {"Customer": "Globex", "Billed": "8/1/2015"},
+        {"Customer": "Hooli", "Owner": "Cy"},
+    ])
+
+    assert result["updated"] == 1
+    assert result["unchanged"] == 1
+    assert result["inserted"] == 2
+    assert result["requests"] == 3
+    assert mock_urlopen.call_count == 4
+
+    replaced = [e for e in spreadsheet_thread
+                if e["location"] == str(quip_client.REPLACE_SECTION)]
+    assert [(e["section_id"], e["content"]) for e in replaced] == \
+        [("B1", "7/1/2015"), ("C1", "Zed")]
+
+    inserted = [e for e in spreadsheet_thread
+                if e["location"] == str(quip_client.AFTER_SECTION)]
+    assert len(inserted) == 1
+    assert inserted[0]["section_id"] == "R2"
+    assert inserted[0]["content"] == (
+        "<tr><td></td><td>Globex</td><td>8/1/2015</td></tr>"
+        "<tr><td></td><td>Hooli</td><td></td><td>Cy</td></tr>")
+
+
+def test_bulk_insert_chunks_keep_order(quip_client, spreadsheet_thread):
+    """Test that chunked inserts are sent so rows end up in record order"""
+    records = [{"Customer": "New%d" % i} for i in range(5)]
+    result = quip_client.update_spreadsheet_rows(
+        "THREAD1", "Customer", records, max_rows_per_edit=2)
+
+    assert result["inserted"] == 5
+    assert result["requests"] == 3
+    assert [e["content"].count("<tr>") for e in spreadsheet_thread] == \
+        [1, 2, 2]
+    assert "New4" in spreadsheet_thread[0]["content"]
+    assert "New0" in spreadsheet_thread[-1]["content"]
+
+
+def test_bulk_upsert_reads_current_document(quip_client, mock_urlopen,
+                                            mock_response):
+    """Test that rows added by an earlier call are not appended again"""
+    document = {"html": SPREADSHEET_HTML, "updated_usec": 1}
+
+    def _route(request, timeout=None):
+        if request.data:
+            # The server inserts the row after the last one
+            document["html"] = document["html"].replace(
+                "</tbody>", "<tr id='R3'><td id='N3'>3</td>"
+                "<td id='A3'>Globex</td><td id='B3'></td>"
+                "<td id='C3'></td></tr></tbody>")
+            document["updated_usec"] += 1
+            return mock_response(json_data={"thread": {"id": "THREAD1"}})
+        return mock_response(json_data={
+            "thread": {"id": "THREAD1",
+                       "updated_usec": document["updated_usec"]},
+            "html": document["html"]})
+    mock_urlopen.side_effect = _route
+    quip_client.get_thread("THREAD1")
+
+    records = [{"Customer": "Globex"}]
+    first = quip_client.update_spreadsheet_rows("THREAD1", "Customer", records)
+    second = quip_client.update_spreadsheet_rows("THREAD1", "Customer", records)
+
+    assert first["inserted"] == 1
+    assert second["inserted"] == 0
+    assert second["unchanged"] == 1
+    assert "Globex" in quip_client.get_thread("THREAD1")["html"]
@@ -0,0 +1,89 @@
+import time
+import pytest
+from quipclient.base import _parse_cache_tag
+
+
+def test_stale_folder_served_then_refreshed(quip_client, mock_urlopen,
+                                            mock_response):
+    """Test that a stale cached folder is returned and refreshed in the
+    background"""
+    mock_urlopen.return_value = mock_response(json_data={
+        "folder": {"id": "FOLDER1", "title": "Old"},
+        "member_ids": ["TEST_USER_ID"]})
+    quip_client.get_folder("FOLDER1")
+
+    mock_urlopen.return_value = mock_response(json_data={
+        "folder": {"id": "FOLDER1", "title": "New"},
+        "member_ids": ["TEST_USER_ID"]})
+    stale = quip_client.get_folder("FOLDER1", soft_ttl=0)
+    assert stale["folder"]["title"] == "Old"
+
+    quip_client.wait_for_refreshes()
+    assert mock_urlopen.call_count == 2
+    fresh = quip_client.get_folder("FOLDER1")
+    assert fresh["folder"]["title"] == "New"
+    assert mock_urlopen.call_count == 2
+
+
+def test_fresh_entry_not_refreshed(quip_client, mock_urlopen, mock_response):
+    """Test that entries younger than the soft TTL are not refreshed"""
+    mock_urlopen.return_value = mock_response(json_data={"data": "test"})
+    quip_client._fetch_json("test", cache_ttl=3600)
+    quip_client._fetch_json("test", cache_ttl=3600, soft_ttl=60)
+    quip_client.wait_for_refreshes()
+    assert mock_urlopen.call_count == 1
+
+
+def test_per_endpoint_soft_ttl_for_batches(quip_client, mock_urlopen,
+                                           mock_response):
+    """Test that soft TTL rules by path prefix apply to get_threads"""
+    mock_urlopen.return_value = mock_response(json_data={
+        "T1": {"thread": {"id": "T1", "title": "Old"}},
+        "T2": {"thread": {"id": "T2", "title": "Old"}},
+    })
+    quip_client.get_threads(["T1", "T2"])
+
+    quip_client.set_soft_ttl("threads/", 0)
+    mock_urlopen.return_value = mock_response(json_data={
+        "T1": {"thread": {"id": "T1", "title": "New"}},
+        "T2": {"thread": {"id": "T2", "title": "New"}},
+    })
+    result = quip_client.get_threads(["T1", "T2"])
+    assert result["T1"]["thread"]["title"] == "Old"
+
+    quip_client.wait_for_refreshes()
+    assert mock_urlopen.call_count == 2
+    quip_client.set_soft_ttl("threads/", None)
+    result = quip_client.get_threads(["T1", "T2"])
+    assert result["T2"]["thread"]["title"] == "New"
+    assert mock_urlopen.call_count == 2
+
+
+def test_stale_thread_html_refreshed(quip_client, mock_urlopen,
+                                     mock_response):
+    """Test that get_thread_html_v2 refreshes all pages in the background"""
+    mock_urlopen.return_value = mock_response(json_data={
+        "html": "<p>Old</p>", "response_metadata": {"next_cursor": ""}})
+    quip_client.get_thread_html_v2("THREAD1")
+
+    mock_urlopen.return_value = mock_response(json_data={
+        "html": "<p>New</p>", "response_metadata": {"next_cursor": ""}})
+    assert quip_client.get_thread_html_v2(
+        "THREAD1", soft_ttl=0)["html"] == "<p>Old</p>"
+    quip_client.wait_for_refreshes()
+    assert quip_client.get_thread_html_v2("THREAD1")["html"] == "<p>New</p>"
+
+
+def test_cache_ttl_jitter(quip_client):
+    """Test that TTLs are shortened by at most cache_ttl_jitter"""
+    quip_client.cache_ttl_jitter = 0.5
+    now = time.time()
+    expires = []
+    for i in range(20):
+        key = quip_client._cache_key(f"jitter/{i}")
+        quip_client._cache_store(key, {"i": i}, 1000)
+        tag = quip_client._cache.get(key, tag=True)[1]
+        expires.append(_parse_cache_tag(tag)[1])
+
+    assert all(now + 500 <= e <= now + 1001 for e in expires)
+    assert len(set(int(e) for e in expires)) > 1
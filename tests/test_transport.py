@@ -0,0 +1,123 @@
+import gzip
+import json
+import pytest
+from io import BytesIO
+from urllib.error import HTTPError
+from quipclient import QuipClient, QuipError
+from quipclient.transport import (
+    RecordingTransport, ReplayMissError, ReplayTransport, read_log)
+from .test_data.threads import SIMPLE_THREAD
+
+USER = {"id": "TEST_USER_ID", "name": "Test User"}
+
+
+def _record(tmp_path, mock_urlopen, mock_response, path):
+    def respond(request, timeout=None):
+        if "users/current" in request.full_url:
+            return mock_response(json_data=USER)
+        if "MISSING" in request.full_url:
+            raise HTTPError(
+                request.full_url, 404, "Not Found", {},
+                BytesIO(json.dumps({"error_description": "Gone"}).encode()))
+        return mock_response(json_data=SIMPLE_THREAD,
+                             headers={"X-RateLimit-Remaining": "7"})
+
+    mock_urlopen.side_effect = respond
+    with RecordingTransport(path) as recorder:
+        client = QuipClient(access_token="secret-token",
+                            cache_dir=str(tmp_path / "record"),
+                            transport=recorder)
+        client.get_thread("THREAD123", cache=False)
+        with pytest.raises(QuipError):
+            client.get_thread("MISSING", cache=False)
+    mock_urlopen.reset_mock()
+    return recorder
+
+
+def test_records_exchanges(tmp_path, mock_urlopen, mock_response):
+    path = str(tmp_path / "traffic.jsonl.gz")
+    recorder = _record(tmp_path, mock_urlopen, mock_response, path)
+    assert recorder.records == 3
+
+    records = list(read_log(path))
+    assert [r["status"] for r in records] == [200, 200, 404]
+    assert records[1]["url"].endswith("/1/threads/THREAD123")
+    assert json.loads(records[1]["response"]) == SIMPLE_THREAD
+    assert records[1]["headers"] == {"X-RateLimit-Remaining": "7"}
+    with gzip.open(path, "rb") as f:
+        assert b"secret-token" not in f.read()
+
+
+def test_replays_exchanges(tmp_path, mock_urlopen, mock_response):
+    path = str(tmp_path / "traffic.jsonl.gz")
+    _record(tmp_path, mock_urlopen, mock_response, path)
+
+    replay = ReplayTransport(path, speed=None)
+    client = QuipClient(access_token="other-token",
+                        cache_dir=str(tmp_path / "replay"), transport=replay)
+    assert client._user_id == "TEST_USER_ID"
+    assert client.get_thread("THREAD123", cache=False) == SIMPLE_THREAD
+    assert client._rate_limit_remaining == 7
+    with pytest.raises(QuipError) as error:
+        client.get_thread("MISSING", cache=False)
+    assert error.value.code == 404
+    with pytest.raises(ReplayMissError):
+        client.get_thread("UNKNOWN", cache=False)
+
+    assert not mock_urlopen.called
+    assert replay.requests["/1/threads/THREAD123"] == 1
+    assert replay.misses == [
+        ("GET", "https://platform.quip.com/1/threads/UNKNOWN")]
+
+
+def test_redacts_credentials(tmp_path, mock_urlopen, mock_response):
+    path = str(tmp_path / "oauth.jsonl")
+    mock_urlopen.return_value = mock_response(json_data={
+        "access_token": "new-token", "refresh_token": "refresh-secret",
+        "token_type": "Bearer"})
+    with RecordingTransport(path) as recorder:
+        client = QuipClient(client_id="id", client_secret="shh",
+                            cache_dir=str(tmp_path / "cache"),
+                            transport=recorder)
+        client.get_access_token("https://example.com/cb", "the-code")
+
+    with open(path, "rb") as f:
+        log = f.read()
+    for secret in (b"shh", b"the-code", b"new-token", b"refresh-secret"):
+        assert secret not in log
+    record = list(read_log(path))[0]
+    assert "client_secret=REDACTED" in record["url"]
+    assert json.loads(record["response"])["token_type"] == "Bearer"
+
+    # Replayed requests are matched with their credentials redacted
+    replay = ReplayTransport(path, speed=None)
+    client = QuipClient(client_id="id", client_secret="other",
+                        cache_dir=str(tmp_path / "replay"), transport=replay)
+    assert client.get_access_token(
+        "https://example.com/cb", "another-code")["token_type"] == "Bearer"
+
+
+def test_keeps_code_fields_in_responses(tmp_path, mock_urlopen,
+                                        mock_response):
+    """Test that only the OAuth parameter named code is redacted"""
+    path = str(tmp_path / "traffic.jsonl")
+    mock_urlopen.return_value = mock_response(json_data={
+        "code": 42, "html": "<pre>code</pre>"})
+    with RecordingTransport(path) as recorder:
+        client = QuipClient(cache_dir=str(tmp_path / "cache"),
+                            transport=recorder)
+        client._fetch_json("threads/T1", code="secret")
+
+    record = list(read_log(path))[0]
+    assert "code=REDACTED" in record["url"]
+    assert json.loads(record["response"])["code"] == 42
+
+
+def test_reads_truncated_logs(tmp_path, mock_urlopen, mock_response):
+    path = str(tmp_path / "traffic.jsonl")
+    _record(tmp_path, mock_urlopen, mock_response, path)
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:-10])
+    assert len(list(read_log(path))) == 2